@@ -0,0 +1,111 @@
+"""
+Servicio de checkout
+
+Convierte un carrito en un pedido con un número constante de consultas:
+los totales se calculan una sola vez con ``CartPricing``, el pedido y sus
+items se crean dentro de ``transaction.atomic`` (items con ``bulk_create``),
+el uso del cupón se incrementa con ``F()`` respetando ``max_uses`` y el stock
+se reserva con ``shop.stock``. Las notificaciones del pedido se envían
+recién después del commit (ver ``notifications.signals``).
+"""
+from django.db import transaction
+from django.db.models import F, Q
+
+from orders.sequences import next_order_number
+from shop import stock
+from shop.models import DiscountCoupon
+
+
+class CheckoutError(Exception):
+    """Error de negocio al confirmar un pedido (mensaje apto para el usuario)"""
+
+
+SHIPPING_FIELDS = (
+    'first_name',
+    'last_name',
+    'email',
+    'phone',
+    'address',
+    'city',
+    'region',
+    'postal_code',
+)
+
+
+def claim_coupon_use(coupon):
+    """
+    Incrementa ``current_uses`` de forma atómica sin superar ``max_uses``.
+
+    Retorna False si el cupón se agotó (otro checkout usó el último cupo).
+    """
+    updated = DiscountCoupon.objects.filter(pk=coupon.pk).filter(
+        Q(max_uses__isnull=True) | Q(current_uses__lt=F('max_uses'))
+    ).update(current_uses=F('current_uses') + 1)
+    return updated == 1
+
+
+def place_order(cart, user, shipping_data, payment_method='transfer', notes=''):
+    """
+    Crea el pedido a partir del carrito y lo vacía.
+
+    ``shipping_data`` es un dict con los campos de ``SHIPPING_FIELDS``.
+    Lanza ``CheckoutError`` si el carrito está vacío o el cupón se agotó.
+    """
+    from orders import analytics
+    from orders.models import Order, OrderItem
+
+    pricing = cart.pricing
+    if not pricing.lines:
+        raise CheckoutError('Tu carrito está vacío')
+
+    coupon = cart.coupon if cart.coupon_id else None
+
+    # Fuera de la transacción para usar el bloque de números pre-asignado del worker
+    order_number = next_order_number()
+
+    with transaction.atomic():
+        if coupon is not None and not claim_coupon_use(coupon):
+            raise CheckoutError('Este cupón ya no está disponible')
+
+        order = Order(
+            order_number=order_number,
+            user=user,
+            notes=notes,
+            coupon=coupon,
+            coupon_code=coupon.code if coupon else '',
+            subtotal=pricing.subtotal,
+            discount_amount=pricing.discount,
+            shipping_cost=pricing.shipping,
+            total=pricing.total,
+            payment_method=payment_method,
+            status='pending',
+            **{field: shipping_data.get(field, '') for field in SHIPPING_FIELDS}
+        )
+        # Los items aún no existen al guardar: el stock se reserva abajo
+        order._defer_stock_reservation = True
+        order.save()
+
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=line.product,
+                quantity=line.quantity,
+                price=line.unit_price
+            )
+            for line in pricing.lines
+        ])
+        # bulk_create no envía señales: los items se suman al resumen de ventas aquí
+        analytics.record_order_items(order, items)
+
+        quantities = {}
+        for line in pricing.lines:
+            quantities[line.product.id] = quantities.get(line.product.id, 0) + line.quantity
+        stock.reserve_stock_for_order(order, quantities=quantities)
+
+        # Vaciar el carrito (incluyendo el cupón)
+        cart.items.all().delete()
+        cart.coupon = None
+        cart.save(update_fields=['coupon', 'updated_at'])
+        cart.reset_pricing()
+
+    return order
@@ -19,85 +19,70 @@ class Cart(models.Model):
     def __str__(self):
         return f"Carrito de {self.user.username}"
     
+    @property
+    def pricing(self):
+        """
+        Desglose de precios del carrito (ver ``cart.pricing.CartPricing``).
+
+        Se calcula una sola vez por instancia con una única consulta de items;
+        usar ``reset_pricing()`` después de modificar items o cupón.
+        """
+        if getattr(self, '_pricing', None) is None:
+            from .pricing import CartPricing
+            self._pricing = CartPricing(self).calculate()
+        return self._pricing
+    
+    def reset_pricing(self):
+        """Descarta el desglose calculado para que se recalcule en el próximo acceso"""
+        self._pricing = None
+    
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.pricing.total_items
     
     @property
     def total_price(self):
-        return sum(item.get_total_price() for item in self.items.all())
+        return self.pricing.subtotal
     
     @property
     def discount_amount(self):
         """Calcula el monto de descuento aplicado por el cupón"""
-        if not self.coupon or not self.coupon.is_valid:
-            return Decimal('0')
-        
-        subtotal = self.total_price
-        
-        # Verificar monto mínimo
-        if subtotal < self.coupon.minimum_order_amount:
-            return Decimal('0')
-        
-        # Calcular descuento según el tipo
-        if self.coupon.discount_type == 'percentage':
-            discount = subtotal * (self.coupon.discount_value / Decimal('100'))
-            # Aplicar límite máximo si existe
-            if self.coupon.maximum_discount_amount:
-                discount = min(discount, self.coupon.maximum_discount_amount)
-        elif self.coupon.discount_type == 'fixed_amount':
-            discount = self.coupon.discount_value
-        else:  # free_shipping
-            discount = Decimal('0')  # El descuento se aplica al envío
-        
-        # No puede ser mayor al subtotal
-        return min(discount, subtotal)
+        return self.pricing.discount
     
     @property
     def subtotal_after_discount(self):
         """Subtotal después de aplicar el descuento del cupón"""
-        return self.total_price - self.discount_amount
+        return self.pricing.subtotal_after_discount
     
     @property
     def formatted_discount_amount(self):
-        discount = self.discount_amount
-        if discount > 0:
-            return f"-${int(discount):,}".replace(',', '.')
-        return "$0"
+        return self.pricing.formatted_discount
     
     @property
     def formatted_total_price(self):
-        total = self.total_price
-        return f"${int(total):,}".replace(',', '.')
+        return self.pricing.formatted_subtotal
     
     @property
     def shipping_cost(self):
         """Envío gratis para compras mayores a $15,000 o con cupón de envío gratis"""
-        # Si hay cupón de envío gratis
-        if self.coupon and self.coupon.is_valid and self.coupon.discount_type == 'free_shipping':
-            # Verificar monto mínimo del cupón
-            if self.total_price >= self.coupon.minimum_order_amount:
-                return 0
-        
-        # Envío gratis para compras mayores a $15,000
-        if self.total_price >= 15000:
-            return 0
-        return 3000  # Costo de envío estándar
+        return self.pricing.shipping
     
     @property
     def formatted_shipping_cost(self):
-        if self.shipping_cost == 0:
-            return "GRATIS"
-        return f"${int(self.shipping_cost):,}".replace(',', '.')
+        return self.pricing.formatted_shipping
+    
+    @property
+    def tax_amount(self):
+        """IVA incluido en los precios del carrito"""
+        return self.pricing.tax
     
     @property
     def final_total(self):
-        return self.subtotal_after_discount + self.shipping_cost
+        return self.pricing.total
     
     @property
     def formatted_final_total(self):
-        total = self.final_total
-        return f"${int(total):,}".replace(',', '.')
+        return self.pricing.formatted_total
     
     def apply_coupon(self, coupon_code):
         """Aplica un cupón al carrito"""
@@ -121,6 +106,7 @@ class Cart(models.Model):
             # Aplicar cupón
             self.coupon = coupon
             self.save()
+            self.reset_pricing()
             
             return True, f"Cupón '{coupon.code}' aplicado exitosamente"
             
@@ -131,6 +117,7 @@ class Cart(models.Model):
         """Remueve el cupón del carrito"""
         self.coupon = None
         self.save()
+        self.reset_pricing()
         return True, "Cupón removido exitosamente"
 
 
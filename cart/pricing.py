@@ -0,0 +1,188 @@
+"""
+Motor de precios del carrito
+
+Calcula en una sola pasada el desglose completo de un carrito (subtotal,
+descuento por cupón, envío, IVA incluido y total) a partir de una única
+consulta de los items con sus productos. Las propiedades de ``Cart`` y las
+vistas del carrito leen este resultado en lugar de recorrer
+``cart.items.all()`` una y otra vez.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from .summary import FREE_SHIPPING_THRESHOLD, STANDARD_SHIPPING_COST, format_clp
+
+
+@dataclass(frozen=True)
+class PricedLine:
+    """Línea del carrito con su precio ya calculado"""
+    item: object
+    product: object
+    quantity: int
+    unit_price: Decimal
+    total: Decimal
+    tax: Decimal
+
+    @property
+    def formatted_unit_price(self):
+        return format_clp(self.unit_price)
+
+    @property
+    def formatted_total(self):
+        return format_clp(self.total)
+
+
+@dataclass(frozen=True)
+class PriceBreakdown:
+    """Desglose inmutable de precios de un carrito"""
+    lines: tuple
+    total_items: int
+    subtotal: Decimal
+    discount: Decimal
+    shipping: Decimal
+    tax: Decimal
+    total: Decimal
+
+    @property
+    def items(self):
+        """CartItems con el producto ya cargado (para templates)"""
+        return [line.item for line in self.lines]
+
+    @property
+    def subtotal_after_discount(self):
+        return self.subtotal - self.discount
+
+    @property
+    def qualifies_free_shipping(self):
+        return self.subtotal >= FREE_SHIPPING_THRESHOLD
+
+    @property
+    def missing_for_free_shipping(self):
+        return max(Decimal('0'), FREE_SHIPPING_THRESHOLD - self.subtotal)
+
+    @property
+    def formatted_subtotal(self):
+        return format_clp(self.subtotal)
+
+    @property
+    def formatted_discount(self):
+        if self.discount > 0:
+            return f"-{format_clp(self.discount)}"
+        return "$0"
+
+    @property
+    def formatted_subtotal_after_discount(self):
+        return format_clp(self.subtotal_after_discount)
+
+    @property
+    def formatted_shipping(self):
+        if self.shipping == 0:
+            return "GRATIS"
+        return format_clp(self.shipping)
+
+    @property
+    def formatted_tax(self):
+        return format_clp(self.tax)
+
+    @property
+    def formatted_total(self):
+        return format_clp(self.total)
+
+
+class CartPricing:
+    """
+    Calcula el desglose de precios de un carrito.
+
+    Uso:
+        breakdown = CartPricing(cart).calculate()
+    """
+
+    def __init__(self, cart, items=None):
+        self.cart = cart
+        self._items = items
+
+    def get_items(self):
+        if self._items is not None:
+            return list(self._items)
+        return list(
+            self.cart.items.select_related('product__tax_configuration', 'product__category').order_by('added_at', 'pk')
+        )
+
+    def calculate(self):
+        lines = tuple(self.price_line(item) for item in self.get_items())
+
+        subtotal = sum((line.total for line in lines), Decimal('0'))
+        total_items = sum(line.quantity for line in lines)
+        tax = sum((line.tax for line in lines), Decimal('0'))
+
+        coupon = self.get_valid_coupon(subtotal)
+        discount = self.calculate_discount(coupon, subtotal)
+        shipping = self.calculate_shipping(coupon, subtotal)
+
+        return PriceBreakdown(
+            lines=lines,
+            total_items=total_items,
+            subtotal=subtotal,
+            discount=discount,
+            shipping=shipping,
+            tax=tax,
+            total=subtotal - discount + shipping,
+        )
+
+    @staticmethod
+    def price_line(item):
+        product = item.product
+        unit_price = product.current_price
+        total = unit_price * item.quantity
+
+        # Los precios incluyen IVA: se informa la porción de impuesto contenida
+        tax = Decimal('0')
+        tax_configuration = product.tax_configuration
+        if not product.is_tax_exempt and tax_configuration:
+            tax = total - total / (1 + tax_configuration.rate / 100)
+
+        return PricedLine(
+            item=item,
+            product=product,
+            quantity=item.quantity,
+            unit_price=unit_price,
+            total=total,
+            tax=tax,
+        )
+
+    def get_valid_coupon(self, subtotal):
+        """Retorna el cupón si es válido y se alcanza el monto mínimo"""
+        coupon = self.cart.coupon if self.cart.coupon_id else None
+        if not coupon or not coupon.is_valid:
+            return None
+        if subtotal < coupon.minimum_order_amount:
+            return None
+        return coupon
+
+    @staticmethod
+    def calculate_discount(coupon, subtotal):
+        """Calcula el monto de descuento aplicado por el cupón"""
+        if coupon is None:
+            return Decimal('0')
+
+        if coupon.discount_type == 'percentage':
+            discount = subtotal * (coupon.discount_value / Decimal('100'))
+            # Aplicar límite máximo si existe
+            if coupon.maximum_discount_amount:
+                discount = min(discount, coupon.maximum_discount_amount)
+        elif coupon.discount_type == 'fixed_amount':
+            discount = coupon.discount_value
+        else:  # free_shipping
+            discount = Decimal('0')  # El descuento se aplica al envío
+
+        # No puede ser mayor al subtotal
+        return min(discount, subtotal)
+
+    @staticmethod
+    def calculate_shipping(coupon, subtotal):
+        """Envío gratis para compras mayores a $15,000 o con cupón de envío gratis"""
+        if coupon is not None and coupon.discount_type == 'free_shipping':
+            return Decimal('0')
+        if subtotal >= FREE_SHIPPING_THRESHOLD:
+            return Decimal('0')
+        return Decimal(STANDARD_SHIPPING_COST)
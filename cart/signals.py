@@ -0,0 +1,40 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from orders.models import Order
+from shop.models import Product
+from .models import Cart, CartItem
+from .summary import invalidate_cart_summary
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_summary_on_cart_item_change(sender, instance, **kwargs):
+    """
+    Invalida el resumen del carrito cuando se agrega, modifica o elimina un item
+    """
+    # Normalmente el carrito ya está cargado en la instancia (get_or_create, cart.items...)
+    if CartItem.cart.is_cached(instance):
+        user_id = instance.cart.user_id
+    else:
+        user_id = Cart.objects.filter(pk=instance.cart_id).values_list('user_id', flat=True).first()
+    invalidate_cart_summary(user_id)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_summary_on_order_change(sender, instance, **kwargs):
+    """
+    Invalida las estadísticas de pedidos del usuario cuando cambia una orden
+    """
+    invalidate_cart_summary(instance.user_id)
+
+
+@receiver(post_save, sender=Product)
+def invalidate_summary_on_product_change(sender, instance, created, **kwargs):
+    """
+    Un cambio de precio u oferta altera el total de los carritos que contienen el producto
+    """
+    if created:
+        return
+    user_ids = CartItem.objects.filter(product=instance).values_list('cart__user_id', flat=True)
+    invalidate_cart_summary(*user_ids)
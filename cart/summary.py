@@ -0,0 +1,118 @@
+"""
+Resumen cacheado del carrito y estadísticas del usuario
+
+El context processor ``cart.context_processors.cart`` se ejecuta en cada página
+renderizada. En vez de recorrer ``cart.items.all()`` y lanzar una consulta por
+cada estadística de pedidos, aquí se calcula todo con dos consultas agregadas,
+se guarda en cache por usuario y se invalida desde ``cart.signals``.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from dulce_bias_project.cache import cache
+
+FREE_SHIPPING_THRESHOLD = 15000
+STANDARD_SHIPPING_COST = 3000
+
+CACHE_KEY_PREFIX = 'cart_summary'
+CACHE_TIMEOUT = getattr(settings, 'CART_SUMMARY_CACHE_TIMEOUT', 300)
+
+PENDING_ORDER_STATUSES = ['pending', 'confirmed', 'processing', 'shipped']
+
+
+def format_clp(value):
+    """Formatea un monto en pesos chilenos ($12.345)"""
+    return f"${int(value):,}".replace(',', '.')
+
+
+def current_price_expression(prefix=''):
+    """
+    Expresión SQL equivalente a ``Product.current_price``.
+
+    ``prefix`` permite usarla desde modelos relacionados (ej: 'product__').
+    """
+    price = F(f'{prefix}price')
+    discounted_by_percentage = ExpressionWrapper(
+        price - price * F(f'{prefix}discount_percentage') / Value(Decimal('100')),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    return Case(
+        When(
+            Q(**{f'{prefix}is_on_sale': True})
+            & Q(**{f'{prefix}discount_price__isnull': False})
+            & ~Q(**{f'{prefix}discount_price': 0}),
+            then=F(f'{prefix}discount_price'),
+        ),
+        When(
+            Q(**{f'{prefix}is_on_sale': True}) & Q(**{f'{prefix}discount_percentage__gt': 0}),
+            then=discounted_by_percentage,
+        ),
+        default=price,
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def get_cache_key(user_id):
+    return f'{CACHE_KEY_PREFIX}:{user_id}'
+
+
+def compute_cart_summary(user_id):
+    """Calcula el resumen del carrito y de pedidos del usuario (2 consultas)"""
+    from orders.models import Order
+    from .models import CartItem
+
+    cart_totals = CartItem.objects.filter(cart__user_id=user_id).aggregate(
+        items_count=Coalesce(Sum('quantity'), 0),
+        total_price=Sum(
+            ExpressionWrapper(
+                current_price_expression('product__') * F('quantity'),
+                output_field=DecimalField(max_digits=14, decimal_places=2),
+            )
+        ),
+    )
+
+    order_stats = Order.objects.filter(user_id=user_id).aggregate(
+        total_orders=Count('id'),
+        pending_orders=Count('id', filter=Q(status__in=PENDING_ORDER_STATUSES)),
+        delivered_orders=Count('id', filter=Q(status='delivered')),
+        total_spent=Sum('total', filter=Q(status='delivered')),
+    )
+
+    total_price = cart_totals['total_price'] or Decimal('0')
+    total_spent = order_stats['total_spent'] or 0
+    delivered_orders = order_stats['delivered_orders']
+    avg_order_value = (total_spent / delivered_orders) if delivered_orders > 0 else 0
+
+    qualifies_free_shipping = total_price >= FREE_SHIPPING_THRESHOLD
+    shipping_savings = STANDARD_SHIPPING_COST if qualifies_free_shipping else 0
+
+    return {
+        'cart_items_count': cart_totals['items_count'],
+        'cart_total': format_clp(total_price),
+        'user_total_spent': format_clp(total_spent),
+        'user_total_orders': order_stats['total_orders'],
+        'user_pending_orders': order_stats['pending_orders'],
+        'user_avg_order': format_clp(avg_order_value),
+        'shipping_savings': f"${shipping_savings:,}".replace(',', '.'),
+        'qualifies_free_shipping': qualifies_free_shipping,
+    }
+
+
+def get_cart_summary(user_id):
+    """Obtiene el resumen desde cache o lo recalcula si no existe"""
+    key = get_cache_key(user_id)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_cart_summary(user_id)
+        cache.set(key, summary, CACHE_TIMEOUT)
+    return summary
+
+
+def invalidate_cart_summary(*user_ids):
+    """Elimina el resumen cacheado de uno o más usuarios"""
+    keys = [get_cache_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
@@ -1,3 +1,101 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+
+from orders.models import Order
+from shop.models import Category, DiscountCoupon, Product
+
+from .checkout import CheckoutError, place_order
+from .models import Cart, CartItem
+
+SHIPPING_DATA = {
+    'first_name': 'Ana',
+    'last_name': 'Pérez',
+    'email': 'ana@example.com',
+    'phone': '912345678',
+    'address': 'Calle 1',
+    'city': 'Santiago',
+    'region': 'rm',
+}
+
+
+def create_product(category, name, **kwargs):
+    kwargs.setdefault('slug', name.lower().replace(' ', '-'))
+    kwargs.setdefault('description', '')
+    kwargs.setdefault('ingredients', '')
+    kwargs.setdefault('price', Decimal('1000'))
+    kwargs.setdefault('stock', 10)
+    kwargs.setdefault('image', 'products/test.jpg')
+    return Product.objects.create(category=category, name=name, **kwargs)
+
+
+class CheckoutTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='cliente', email='cliente@example.com')
+        category = Category.objects.create(name='Galletas', slug='galletas')
+        cls.product = create_product(category, 'Galleta avena', price=Decimal('2000'))
+        cls.on_sale = create_product(
+            category, 'Galleta chocolate', price=Decimal('3000'), is_on_sale=True, discount_price=Decimal('2500')
+        )
+        now = timezone.now()
+        cls.coupon = DiscountCoupon.objects.create(
+            code='DULCE10', name='10%', discount_type='percentage', discount_value=Decimal('10'),
+            max_uses=1, valid_from=now - timedelta(days=1), valid_until=now + timedelta(days=1)
+        )
+
+    def setUp(self):
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.on_sale, quantity=3)
+
+    def test_creates_items_at_the_cart_unit_price(self):
+        self.cart.coupon = self.coupon
+        self.cart.save()
+        pricing = self.cart.pricing
+
+        order = place_order(self.cart, self.user, SHIPPING_DATA)
+
+        order = Order.objects.get(pk=order.pk)
+        self.assertEqual(
+            sorted(order.items.values_list('product_id', 'quantity', 'price')),
+            [(self.product.pk, 2, Decimal('2000')), (self.on_sale.pk, 3, Decimal('2500'))]
+        )
+        self.assertEqual(
+            (order.subtotal, order.discount_amount, order.total),
+            (pricing.subtotal, pricing.discount, pricing.total)
+        )
+        self.assertEqual(order.city, 'Santiago')
+        self.assertEqual(
+            dict(Product.objects.filter(pk__in=[self.product.pk, self.on_sale.pk]).values_list('pk', 'stock')),
+            {self.product.pk: 8, self.on_sale.pk: 7}
+        )
+        self.coupon.refresh_from_db()
+        self.assertEqual(self.coupon.current_uses, 1)
+        self.assertFalse(self.cart.items.exists())
+        self.assertIsNone(Cart.objects.get(pk=self.cart.pk).coupon)
+
+    def test_exhausted_coupon_rolls_back_the_order(self):
+        self.cart.coupon = self.coupon
+        self.cart.save()
+        self.assertEqual(self.cart.pricing.discount, Decimal('1150'))
+        # Otro checkout usó el último cupo después de calcular el carrito
+        DiscountCoupon.objects.filter(pk=self.coupon.pk).update(current_uses=1)
+
+        with self.assertRaisesMessage(CheckoutError, 'Este cupón ya no está disponible'):
+            place_order(self.cart, self.user, SHIPPING_DATA)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 10)
+
+    def test_empty_cart_is_rejected(self):
+        self.cart.items.all().delete()
+        self.cart.reset_pricing()
 
-# Create your tests here.
+        with self.assertRaisesMessage(CheckoutError, 'Tu carrito está vacío'):
+            place_order(self.cart, self.user, SHIPPING_DATA)
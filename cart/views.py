@@ -10,6 +10,7 @@ import json
 
 from shop.models import Product
 from .models import Cart, CartItem, SessionCart
+from .checkout import CheckoutError, place_order
 
 
 class CartDetailView(TemplateView):
@@ -20,17 +21,17 @@ class CartDetailView(TemplateView):
         
         if self.request.user.is_authenticated:
             # Carrito de usuario autenticado
-            cart, created = Cart.objects.get_or_create(user=self.request.user)
+            cart, created = Cart.objects.select_related('coupon').get_or_create(user=self.request.user)
             
             # Limpiar items con productos no disponibles o eliminados
             self.clean_invalid_cart_items(cart)
             
             context['cart'] = cart
-            context['cart_items'] = cart.items.all()
+            context['cart_items'] = cart.pricing.items
             context['is_authenticated_cart'] = True
             
             # Productos recomendados (excluir los que ya están en el carrito)
-            cart_product_ids = cart.items.values_list('product_id', flat=True)
+            cart_product_ids = [line.product.id for line in cart.pricing.lines]
             recommended_products = Product.objects.filter(available=True).exclude(id__in=cart_product_ids)[:4]
         else:
             # Carrito de sesión para usuarios no autenticados
@@ -59,24 +60,9 @@ class CartDetailView(TemplateView):
     
     def clean_invalid_cart_items(self, cart):
         """Limpiar items del carrito que tienen productos no disponibles o eliminados"""
-        invalid_items = []
-        
-        for item in cart.items.all():
-            try:
-                product = item.product
-                # Verificar si el producto existe y está disponible
-                if not Product.objects.filter(id=product.id, available=True).exists():
-                    invalid_items.append(item)
-            except Product.DoesNotExist:
-                invalid_items.append(item)
-        
-        # Eliminar items inválidos silenciosamente
-        if invalid_items:
-            for item in invalid_items:
-                item.delete()
-            
-            # Log para debugging sin mostrar mensaje al usuario
-            # Se eliminaron items no disponibles silenciosamente para evitar recargas
+        # Eliminar items inválidos silenciosamente (una sola consulta)
+        cart.items.filter(product__available=False).delete()
+        cart.reset_pricing()
 
 
 class MyCartView(TemplateView):
@@ -88,21 +74,20 @@ class MyCartView(TemplateView):
         
         if self.request.user.is_authenticated:
             # Carrito de usuario autenticado
-            cart, created = Cart.objects.get_or_create(user=self.request.user)
+            cart, created = Cart.objects.select_related('coupon').get_or_create(user=self.request.user)
             
             # Limpiar items con productos no disponibles o eliminados
             self.clean_invalid_cart_items(cart)
             
             context['cart'] = cart
-            context['cart_items'] = cart.items.all()
+            context['cart_items'] = cart.pricing.items
             context['is_authenticated_cart'] = True
             
             # Calcular cantidad faltante para envío gratis
-            missing_for_free_shipping = max(0, 15000 - cart.total_price) if cart.total_price < 15000 else 0
-            context['missing_for_free_shipping'] = missing_for_free_shipping
+            context['missing_for_free_shipping'] = cart.pricing.missing_for_free_shipping
             
             # Productos recomendados (excluir los que ya están en el carrito)
-            cart_product_ids = cart.items.values_list('product_id', flat=True)
+            cart_product_ids = [line.product.id for line in cart.pricing.lines]
             recommended_products = Product.objects.filter(available=True).exclude(id__in=cart_product_ids)[:4]
         else:
             # Carrito de sesión para usuarios no autenticados
@@ -133,21 +118,9 @@ class MyCartView(TemplateView):
     
     def clean_invalid_cart_items(self, cart):
         """Limpiar items del carrito que tienen productos no disponibles o eliminados"""
-        invalid_items = []
-        
-        for item in cart.items.all():
-            try:
-                product = item.product
-                # Verificar si el producto existe y está disponible
-                if not Product.objects.filter(id=product.id, available=True).exists():
-                    invalid_items.append(item)
-            except Product.DoesNotExist:
-                invalid_items.append(item)
-        
-        # Eliminar items inválidos silenciosamente
-        if invalid_items:
-            for item in invalid_items:
-                item.delete()
+        # Eliminar items inválidos silenciosamente (una sola consulta)
+        cart.items.filter(product__available=False).delete()
+        cart.reset_pricing()
 
 
 @require_POST
@@ -430,8 +403,9 @@ def clear_cart(request):
 def checkout(request):
     """Vista de checkout - procesar el pedido"""
     try:
-        cart = Cart.objects.get(user=request.user)
-        if not cart.items.exists():
+        cart = Cart.objects.select_related('coupon').get(user=request.user)
+        pricing = cart.pricing
+        if not pricing.lines:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({
                     'success': False,
@@ -441,9 +415,6 @@ def checkout(request):
             return redirect('cart:cart_detail')
         
         if request.method == 'POST':
-            # Importar aquí para evitar imports circulares
-            from orders.models import Order, OrderItem
-            
             # Obtener datos del formulario
             first_name = request.POST.get('first_name', '').strip()
             last_name = request.POST.get('last_name', '').strip()
@@ -477,49 +448,35 @@ def checkout(request):
                 messages.error(request, 'Por favor completa todos los campos requeridos')
                 return render(request, 'cart/checkout.html', {
                     'cart': cart,
-                    'cart_items': cart.items.all()
+                    'cart_items': pricing.items
                 })
             
-            # Crear el pedido
-            order = Order.objects.create(
-                user=request.user,
-                first_name=first_name,
-                last_name=last_name,
-                email=email,
-                phone=phone,
-                address=address,
-                city=city,
-                region=region,
-                postal_code=postal_code,
-                notes=delivery_notes,
-                coupon=cart.coupon,
-                coupon_code=cart.coupon.code if cart.coupon else '',
-                subtotal=cart.total_price,
-                discount_amount=cart.discount_amount,
-                shipping_cost=cart.shipping_cost,
-                total=cart.final_total,
-                payment_method=payment_method,
-                status='pending'
-            )
-            
-            # Crear los items del pedido
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price=cart_item.product.price
+            # Crear el pedido (transacción única, ver cart.checkout)
+            try:
+                order = place_order(
+                    cart,
+                    request.user,
+                    shipping_data={
+                        'first_name': first_name,
+                        'last_name': last_name,
+                        'email': email,
+                        'phone': phone,
+                        'address': address,
+                        'city': city,
+                        'region': region,
+                        'postal_code': postal_code,
+                    },
+                    payment_method=payment_method,
+                    notes=delivery_notes,
                 )
-            
-            # Actualizar uso del cupón si existe
-            if cart.coupon:
-                cart.coupon.current_uses += 1
-                cart.coupon.save()
-            
-            # Vaciar el carrito (incluyendo el cupón)
-            cart.coupon = None
-            cart.items.all().delete()
-            cart.save()
+            except CheckoutError as e:
+                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                    return JsonResponse({
+                        'success': False,
+                        'message': str(e)
+                    })
+                messages.error(request, str(e))
+                return redirect('cart:cart_detail')
             
             # Redirigir según método de pago
             if payment_method == 'transfer':
@@ -558,7 +515,7 @@ def checkout(request):
         # GET request - mostrar formulario
         return render(request, 'cart/checkout.html', {
             'cart': cart,
-            'cart_items': cart.items.all()
+            'cart_items': pricing.items
         })
         
     except Cart.DoesNotExist:
@@ -612,26 +569,27 @@ def cart_summary(request):
     """Obtener resumen del carrito para modal/dropdown"""
     if request.user.is_authenticated:
         try:
-            cart = Cart.objects.get(user=request.user)
+            cart = Cart.objects.select_related('coupon').get(user=request.user)
+            pricing = cart.pricing
             items = []
-            for item in cart.items.all()[:5]:  # Mostrar solo los primeros 5
+            for line in pricing.lines[:5]:  # Mostrar solo los primeros 5
                 items.append({
-                    'id': item.product.id,
-                    'name': item.product.name,
-                    'quantity': item.quantity,
-                    'price': f"${int(item.product.price):,}".replace(',', '.'),
-                    'total': item.formatted_total_price,
-                    'image': item.product.image.url if item.product.image else None
+                    'id': line.product.id,
+                    'name': line.product.name,
+                    'quantity': line.quantity,
+                    'price': line.product.formatted_price,
+                    'total': line.formatted_total,
+                    'image': line.product.image.url if line.product.image else None
                 })
             
             return JsonResponse({
                 'success': True,
                 'items': items,
-                'total_items': cart.total_items,
-                'total_price': cart.formatted_total_price,
-                'shipping_cost': cart.formatted_shipping_cost,
-                'final_total': cart.formatted_final_total,
-                'has_more': cart.items.count() > 5
+                'total_items': pricing.total_items,
+                'total_price': pricing.formatted_subtotal,
+                'shipping_cost': pricing.formatted_shipping,
+                'final_total': pricing.formatted_total,
+                'has_more': len(pricing.lines) > 5
             })
         except Cart.DoesNotExist:
             return JsonResponse({
@@ -714,11 +672,11 @@ def apply_coupon(request):
                         'discount_amount': cart.formatted_discount_amount,
                     },
                     'cart_totals': {
-                        'subtotal': cart.formatted_total_price,
-                        'discount': cart.formatted_discount_amount,
-                        'subtotal_after_discount': f"${int(cart.subtotal_after_discount):,}".replace(',', '.'),
-                        'shipping': cart.formatted_shipping_cost,
-                        'final_total': cart.formatted_final_total
+                        'subtotal': cart.pricing.formatted_subtotal,
+                        'discount': cart.pricing.formatted_discount,
+                        'subtotal_after_discount': cart.pricing.formatted_subtotal_after_discount,
+                        'shipping': cart.pricing.formatted_shipping,
+                        'final_total': cart.pricing.formatted_total
                     }
                 })
             messages.success(request, message)
@@ -0,0 +1,473 @@
+"""
+Cache compartido del proyecto
+
+Gunicorn corre varios workers; un cache en memoria (``LocMemCache``) sería
+uno por proceso, así que los contadores del rate limiting y los datos
+cacheados no se compartirían. ``settings.CACHES`` usa uno de estos backends
+según ``CACHE_BACKEND``:
+
+- ``redis``: ``RedisCache`` (cuando hay ``REDIS_URL``)
+- ``sqlite``: ``SQLiteCache``, un archivo SQLite en modo WAL compartido por
+  todos los workers del servidor, sin servicios externos
+- ``locmem``: ``LocMemCache`` (desarrollo y tests)
+
+Los tres registran aciertos y fallos de lectura (``get_cache_stats``), que
+se muestran en ``/health/cache/``.
+
+El resto del proyecto usa el cache desde este módulo:
+
+    from dulce_bias_project.cache import cache, incr
+
+``incr`` es un contador atómico entre workers que crea la llave si no existe,
+``incr_many`` suma varios contadores en una sola escritura y
+``atomic_update`` lee y reescribe un número sin carreras (ej: token bucket).
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache as DjangoLocMemCache
+from django.core.cache.backends.redis import RedisCache as DjangoRedisCache
+
+__all__ = ['cache', 'incr', 'incr_many', 'atomic_update', 'get_cache_stats', 'check_cache']
+
+STATS_KEY = 'cache:stats:{}'
+STATS_FLUSH_SECONDS = 10
+
+_MISSING = object()
+
+
+# Estadísticas de aciertos
+
+class CacheStats:
+    """
+    Contadores de aciertos y fallos del proceso.
+
+    Se suman cada ``STATS_FLUSH_SECONDS`` a contadores en el mismo cache, de
+    modo que ``get_cache_stats`` muestra el total de todos los workers.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.flushed_at = time.monotonic()
+
+    def record(self, backend, hits, misses):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            if time.monotonic() - self.flushed_at < STATS_FLUSH_SECONDS:
+                return
+            pending = {'hits': self.hits, 'misses': self.misses}
+            self.hits = self.misses = 0
+            self.flushed_at = time.monotonic()
+        self.flush(backend, pending)
+
+    @staticmethod
+    def flush(backend, pending):
+        for name, value in pending.items():
+            if value:
+                backend.incr_or_create(STATS_KEY.format(name), value)
+
+    def pending(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+class CacheStatsMixin:
+    """Cuenta aciertos y fallos de ``get`` y ``get_many``"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = CacheStats()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, _MISSING, version)
+        if value is _MISSING:
+            self.stats.record(self, 0, 1)
+            return default
+        self.stats.record(self, 1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        self.stats.record(self, len(found), len(keys) - len(found))
+        return found
+
+    def incr_or_create(self, key, delta=1, timeout=DEFAULT_TIMEOUT, version=None):
+        """Incrementa ``key`` creándola con ``delta`` si no existe"""
+        if self.add(key, delta, timeout, version):
+            return delta
+        try:
+            return self.incr(key, delta, version)
+        except ValueError:
+            # La llave expiró entre add() e incr()
+            self.set(key, delta, timeout, version)
+            return delta
+
+
+class RedisCache(CacheStatsMixin, DjangoRedisCache):
+
+    def atomic_update(self, key, function, timeout=DEFAULT_TIMEOUT, version=None):
+        """Lectura y escritura de un número con WATCH/MULTI (se reintenta si otro worker escribió)"""
+        key = self.make_and_validate_key(key, version=version)
+        timeout = self.get_backend_timeout(timeout)
+        client = self._cache.get_client(key, write=True)
+
+        def update(pipe):
+            raw = pipe.get(key)
+            new_value, result = function(float(raw) if raw is not None else None)
+            pipe.multi()
+            if new_value is not None:
+                pipe.set(key, repr(float(new_value)), ex=timeout or None)
+            return result
+
+        return client.transaction(update, key, value_from_callable=True)
+
+    def incr_many(self, deltas, timeout=DEFAULT_TIMEOUT, version=None):
+        """Suma varios contadores en un solo pipeline (SET NX crea los que no existen)"""
+        timeout = self.get_backend_timeout(timeout)
+        client = self._cache.get_client(None, write=True)
+        pipe = client.pipeline(transaction=False)
+        for key, delta in deltas.items():
+            key = self.make_and_validate_key(key, version=version)
+            pipe.set(key, 0, ex=timeout or None, nx=True)
+            pipe.incrby(key, delta)
+        pipe.execute()
+
+
+class LocMemCache(CacheStatsMixin, DjangoLocMemCache):
+    _update_lock = threading.Lock()
+
+    def atomic_update(self, key, function, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._update_lock:
+            new_value, result = function(self.get(key, version=version))
+            if new_value is not None:
+                self.set(key, new_value, timeout, version=version)
+        return result
+
+
+class BaseSQLiteCache(BaseCache):
+    """
+    Cache en un archivo SQLite compartido entre procesos.
+
+    Los enteros se guardan como INTEGER para que ``incr`` sea un solo UPDATE
+    atómico; el resto se guarda serializado con pickle. Cada proceso y
+    thread usa su propia conexión (se reabre después de un fork).
+
+    Opciones: ``MAX_ENTRIES`` y ``CULL_FREQUENCY`` como en los backends de
+    Django; ``CULL_EVERY`` escrituras por proceso se eliminan las llaves
+    vencidas y, si hay más de ``MAX_ENTRIES``, las que vencen antes.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = str(location)
+        options = params.get('OPTIONS', {})
+        self.cull_every = int(options.get('CULL_EVERY', 200))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._writes = 0
+
+    # Conexión
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entry ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS cache_entry_expires ON cache_entry (expires)')
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return sqlite3.Binary(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _expires(self, timeout):
+        """Timestamp de expiración (None = no expira, 0 = ya expiró)"""
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return None
+        return max(timeout, 0)
+
+    def _write(self, sql, params):
+        connection = self._connection()
+        cursor = connection.execute(sql, params)
+        self._after_write(connection)
+        return cursor.rowcount
+
+    def _after_write(self, connection):
+        self._writes += 1
+        if self.cull_every and self._writes % self.cull_every == 0:
+            self._cull(connection)
+
+    def _cull(self, connection):
+        connection.execute('DELETE FROM cache_entry WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache_entry').fetchone()[0]
+        if count > self._max_entries:
+            excess = count - self._max_entries
+            if self._cull_frequency:
+                excess = max(excess, count // self._cull_frequency)
+            # Primero las que vencen antes; las que no vencen al final
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN ('
+                'SELECT key FROM cache_entry ORDER BY expires IS NULL, expires LIMIT ?)',
+                (excess,)
+            )
+
+    # API del cache
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self._expires(timeout)
+        # Reemplaza solo si la llave existente ya venció
+        return bool(self._write(
+            'INSERT INTO cache_entry (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache_entry.expires IS NOT NULL AND cache_entry.expires <= ?',
+            (key, self._encode(value), expires, time.time())
+        ))
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone()
+        return default if row is None else self._decode(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write(
+            'INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._encode(value), self._expires(timeout))
+        )
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self._write(
+            'UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time())
+        ))
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self._write('DELETE FROM cache_entry WHERE key = ?', (key,)))
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT key, value FROM cache_entry WHERE key IN ({', '.join('?' * len(key_map))}) "
+            f"AND (expires IS NULL OR expires > ?)",
+            [*key_map, time.time()]
+        ).fetchall()
+        return {key_map[key]: self._decode(value) for key, value in rows}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), self._encode(value), expires)
+            for key, value in data.items()
+        ]
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)', rows
+            )
+        self._after_write(connection)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self._write(f"DELETE FROM cache_entry WHERE key IN ({', '.join('?' * len(keys))})", keys)
+
+    def incr(self, key, delta=1, version=None):
+        """Incremento atómico (un solo UPDATE); ValueError si la llave no existe"""
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            updated = connection.execute(
+                "UPDATE cache_entry SET value = value + ? WHERE key = ? "
+                "AND typeof(value) = 'integer' AND (expires IS NULL OR expires > ?)",
+                (delta, key, time.time())
+            ).rowcount
+            if not updated:
+                raise ValueError(f"Key '{key}' not found")
+            value = connection.execute('SELECT value FROM cache_entry WHERE key = ?', (key,)).fetchone()[0]
+        return value
+
+    def incr_many(self, deltas, timeout=DEFAULT_TIMEOUT, version=None):
+        """Suma varios contadores en una sola transacción; crea los que no existen o vencieron"""
+        expires = self._expires(timeout)
+        now = time.time()
+        rows = [
+            {'key': self.make_and_validate_key(key, version=version), 'delta': delta, 'expires': expires, 'now': now}
+            for key, delta in deltas.items()
+        ]
+        if not rows:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany(
+                "INSERT INTO cache_entry (key, value, expires) VALUES (:key, :delta, :expires) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "value = CASE WHEN (cache_entry.expires IS NOT NULL AND cache_entry.expires <= :now) "
+                "OR typeof(cache_entry.value) != 'integer' THEN excluded.value "
+                "ELSE cache_entry.value + excluded.value END, "
+                "expires = CASE WHEN (cache_entry.expires IS NOT NULL AND cache_entry.expires <= :now) "
+                "OR typeof(cache_entry.value) != 'integer' THEN excluded.expires "
+                "ELSE cache_entry.expires END",
+                rows
+            )
+        self._after_write(connection)
+
+    def atomic_update(self, key, function, timeout=DEFAULT_TIMEOUT, version=None):
+        """Lectura y escritura dentro de una transacción con bloqueo de escritura"""
+        key = self.make_and_validate_key(key, version=version)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT value FROM cache_entry WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time())
+            ).fetchone()
+            new_value, result = function(self._decode(row[0]) if row else None)
+            if new_value is not None:
+                connection.execute(
+                    'INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)',
+                    (key, self._encode(new_value), self._expires(timeout))
+                )
+        return result
+
+    def clear(self):
+        self._write('DELETE FROM cache_entry', ())
+
+    def close(self, **kwargs):
+        # Las conexiones se mantienen abiertas entre requests (una por thread)
+        pass
+
+
+class SQLiteCache(CacheStatsMixin, BaseSQLiteCache):
+    pass
+
+
+def _backend():
+    return caches['default']
+
+
+def _read(backend, method, *args):
+    """Lectura que no se cuenta en las estadísticas de aciertos"""
+    if isinstance(backend, CacheStatsMixin):
+        return getattr(super(CacheStatsMixin, backend), method)(*args)
+    return getattr(backend, method)(*args)
+
+
+def incr(key, delta=1, timeout=DEFAULT_TIMEOUT):
+    """Contador atómico compartido entre workers; crea la llave si no existe"""
+    backend = _backend()
+    if isinstance(backend, CacheStatsMixin):
+        return backend.incr_or_create(key, delta, timeout)
+    return CacheStatsMixin.incr_or_create(backend, key, delta, timeout)
+
+
+def incr_many(deltas, timeout=DEFAULT_TIMEOUT):
+    """Suma varios contadores compartidos (``{llave: delta}``), en una sola escritura si el backend lo permite"""
+    backend = _backend()
+    if hasattr(backend, 'incr_many'):
+        return backend.incr_many(deltas, timeout)
+    for key, delta in deltas.items():
+        incr(key, delta, timeout)
+
+
+def atomic_update(key, function, timeout=DEFAULT_TIMEOUT):
+    """
+    Lee y reescribe un valor numérico de forma atómica entre workers.
+
+    ``function(valor_actual_o_None)`` retorna ``(nuevo_valor_o_None, resultado)``;
+    si el nuevo valor es None no se escribe nada. Retorna ``resultado``.
+    """
+    backend = _backend()
+    if hasattr(backend, 'atomic_update'):
+        return backend.atomic_update(key, function, timeout)
+    # Backend sin operación atómica: mejor esfuerzo
+    new_value, result = function(backend.get(key))
+    if new_value is not None:
+        backend.set(key, new_value, timeout)
+    return result
+
+
+def get_cache_stats():
+    """Aciertos, fallos y tasa de aciertos (todos los workers)"""
+    backend = _backend()
+    totals = {'hits': 0, 'misses': 0}
+    stats = getattr(backend, 'stats', None)
+    if stats is not None:
+        totals = stats.pending()
+        shared = _read(backend, 'get_many', [STATS_KEY.format(name) for name in totals])
+        for name in totals:
+            totals[name] += shared.get(STATS_KEY.format(name), 0)
+
+    lookups = totals['hits'] + totals['misses']
+    totals['hit_rate'] = round(totals['hits'] / lookups, 4) if lookups else None
+    return totals
+
+
+def check_cache():
+    """Escribe, lee y borra una llave de prueba; retorna el estado y la latencia"""
+    backend = _backend()
+    key = f'cache:health:{os.getpid()}:{random.getrandbits(32)}'
+    started = time.perf_counter()
+    try:
+        backend.set(key, 'ok', 10)
+        ok = _read(backend, 'get', key) == 'ok'
+        backend.delete(key)
+        error = None
+    except Exception as e:
+        ok = False
+        error = str(e)
+    return {
+        'backend': type(backend).__name__,
+        'ok': ok,
+        'latency_ms': round((time.perf_counter() - started) * 1000, 2),
+        'error': error,
+    }
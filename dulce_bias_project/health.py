@@ -1,10 +1,16 @@
 """
 URL Configuration for Railway deployment health checks
 """
-from django.http import JsonResponse
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
 
+from .cache import check_cache, get_cache_stats
+from .metrics import render_prometheus
+
 @never_cache
 @csrf_exempt
 def health_check(request):
@@ -17,3 +23,33 @@ def health_check(request):
         'service': 'Dulce Bias E-commerce',
         'message': 'Galletas Kati online! 🍪'
     })
+
+
+@never_cache
+@csrf_exempt
+def cache_health_check(request):
+    """
+    Estado del cache compartido: backend, latencia de una escritura/lectura
+    y tasa de aciertos de todos los workers. Status 503 si el cache no responde.
+    """
+    health = check_cache()
+    if health['ok']:
+        health.update(get_cache_stats())
+    health['status'] = 'healthy' if health['ok'] else 'unhealthy'
+    return JsonResponse(health, status=200 if health['ok'] else 503)
+
+
+@never_cache
+def prometheus_metrics(request):
+    """
+    Métricas por vista en formato de texto de Prometheus. Acceso para staff
+    o con ``Authorization: Bearer <METRICS_TOKEN>`` (para el scraper).
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    authorized = request.user.is_authenticated and request.user.is_staff
+    if not authorized and token:
+        authorized = hmac.compare_digest(authorization.encode(), f'Bearer {token}'.encode())
+    if not authorized:
+        return HttpResponseForbidden('Forbidden', content_type='text/plain')
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,256 @@
+"""
+Logging sin bloqueo y en JSON
+
+El thread de la request solo encola los registros; un thread aparte
+(``QueueListener``) los escribe en los archivos (rotados por tamaño) y en la
+consola. Un disco lento retrasa la escritura de los logs, no las respuestas.
+
+- ``RequestLogMiddleware``: abre el contexto de la request (id, IP, inicio)
+  que ``RequestContextFilter`` agrega a cada registro, responde con
+  ``X-Request-ID`` y registra una línea de acceso por request en el logger
+  ``dulce_bias.access``
+- ``RequestContextFilter``: agrega ``request_id``, ``user``, ``ip``,
+  ``method``, ``path`` y ``elapsed_ms`` (tiempo desde el inicio de la
+  request). Va en los handlers de cola: corre en el thread de la request
+- ``SamplingFilter``: deja pasar solo una fracción de los registros bajo
+  cierto nivel (ej: los INFO de acceso); los registros conservados llevan
+  ``sample_rate`` para escalar los conteos
+- ``JSONFormatter``: un objeto JSON por línea
+- ``QueueListenerHandler``: ``QueueHandler`` con su propio listener
+
+Uso en ``settings.LOGGING`` (los handlers destino se definen aparte y se
+referencian con ``cfg://``):
+
+    'queue_security': {
+        'class': 'dulce_bias_project.log.QueueListenerHandler',
+        'handlers': ['cfg://handlers.file_security'],
+        'filters': ['request_context'],
+    },
+
+dictConfig configura los handlers en orden alfabético: el nombre de los
+destinos debe ordenarse antes que el del handler de cola.
+
+Si la cola se llena (``maxsize``) los registros se descartan y se cuentan
+en ``dropped``, en lugar de bloquear la request. Gunicorn carga la app
+antes del fork (``preload_app``): el listener se detiene antes de cada fork
+(para que el hijo no herede un archivo a medio escribir) y se vuelve a
+iniciar en el proceso padre y en el worker.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import time
+import uuid
+import weakref
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+access_logger = logging.getLogger('dulce_bias.access')
+
+# Contexto de la request en curso (None fuera de una request)
+request_context = contextvars.ContextVar('request_context', default=None)
+
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{8,64}$')
+
+# Atributos propios de LogRecord: el resto viene de ``extra=`` y va al JSON
+RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+CONTEXT_FIELDS = ('request_id', 'user', 'ip', 'method', 'path', 'elapsed_ms')
+
+
+class RequestLogMiddleware:
+    """Contexto de logging de la request y línea de acceso al terminar"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from security.screening import get_client_ip
+
+        request_id = request.META.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+
+        context = {
+            'request': request,
+            'request_id': request_id,
+            'ip': get_client_ip(request),
+            'start': time.perf_counter(),
+        }
+        token = request_context.set(context)
+        try:
+            response = self.get_response(request)
+            response['X-Request-ID'] = request_id
+            access_logger.info(
+                '%s %s %s', request.method, request.path, response.status_code,
+                extra={'status': response.status_code, 'duration_ms': get_elapsed_ms(context)},
+            )
+            return response
+        finally:
+            request_context.reset(token)
+
+
+def get_elapsed_ms(context):
+    return round((time.perf_counter() - context['start']) * 1000, 2)
+
+
+def get_request_user(request):
+    """Usuario de la request, sin forzar la consulta si aún no se cargó"""
+    # AuthenticationMiddleware carga el usuario de forma perezosa en _cached_user
+    user = getattr(request, '_cached_user', None)
+    if user is None:
+        return None
+    return user.get_username() if user.is_authenticated else 'anonymous'
+
+
+class RequestContextFilter(logging.Filter):
+    """Agrega los datos de la request en curso al registro"""
+
+    def filter(self, record):
+        context = request_context.get()
+        if context is not None and not hasattr(record, 'request_id'):
+            request = context['request']
+            record.request_id = context['request_id']
+            record.user = get_request_user(request)
+            record.ip = context['ip']
+            record.method = request.method
+            record.path = request.path
+            record.elapsed_ms = get_elapsed_ms(context)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Conserva una fracción ``rate`` de los registros de nivel menor a
+    ``level``; los de ese nivel o superior pasan siempre.
+    """
+
+    def __init__(self, rate=1.0, level='WARNING'):
+        super().__init__()
+        self.rate = float(rate)
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def filter(self, record):
+        if record.levelno >= self.level or self.rate >= 1:
+            return True
+        if random.random() >= self.rate:
+            return False
+        record.sample_rate = self.rate
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Un objeto JSON por registro: campos fijos, contexto de la request y ``extra``"""
+
+    def format(self, record):
+        data = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS and key not in CONTEXT_FIELDS and key not in data:
+                data[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class QueueListenerHandler(QueueHandler):
+
+    def __init__(self, handlers, respect_handler_level=True, maxsize=10000):
+        self.target_handlers = []
+        # Por índice: dictConfig resuelve los ``cfg://`` al leer cada elemento
+        for i in range(len(handlers)):
+            handler = handlers[i]
+            if not isinstance(handler, logging.Handler):
+                # dictConfig configura los handlers en orden alfabético
+                raise ValueError(
+                    f'Handler destino no configurado: {handler!r} '
+                    '(su nombre debe ordenarse antes que el del handler de cola)'
+                )
+            self.target_handlers.append(handler)
+
+        self.respect_handler_level = respect_handler_level
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = None
+        super().__init__(queue.Queue(maxsize))
+        self.start()
+
+        handler_ref = weakref.ref(self)
+        os.register_at_fork(
+            before=lambda: _call(handler_ref, 'stop'),
+            after_in_parent=lambda: _call(handler_ref, 'start'),
+            after_in_child=lambda: _call(handler_ref, 'restart_in_child'),
+        )
+        atexit.register(self.stop)
+
+    def start(self):
+        if self.listener is not None:
+            return
+        self.listener = QueueListener(
+            self.queue, *self.target_handlers, respect_handler_level=self.respect_handler_level
+        )
+        self.listener.start()
+
+    def stop(self):
+        """Escribe los registros pendientes y detiene el thread"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def restart_in_child(self):
+        # La cola heredada puede tener sus locks tomados por threads del padre
+        self.queue = queue.Queue(self.maxsize)
+        self.listener = None
+        self.start()
+
+    def prepare(self, record):
+        """
+        Copia del registro lista para otro thread: el mensaje ya formateado
+        (los argumentos pueden cambiar o no ser thread-safe) y la excepción
+        como texto, conservando los campos para ``JSONFormatter``.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+def _call(handler_ref, method):
+    handler = handler_ref()
+    if handler is not None:
+        getattr(handler, method)()
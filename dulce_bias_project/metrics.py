@@ -0,0 +1,457 @@
+"""
+Métricas de rendimiento por vista
+
+``ProfilingMiddleware`` mide cada request desde adentro de la app:
+
+- tiempo total de la vista (incluye los middlewares que van después)
+- cantidad y tiempo de las consultas SQL (``connection.execute_wrapper``)
+- tiempo de render de templates (el ``render`` de primer nivel del backend
+  de Django; los ``include`` quedan dentro de ese tiempo)
+- tamaño de la respuesta
+
+Los valores se acumulan en histogramas por vista (nombre de la URL, ej:
+``shop:product_detail``). Cada proceso junta sus observaciones en memoria y
+un thread en segundo plano las suma cada ``FLUSH_SECONDS`` a contadores del
+cache compartido (``incr_many``, ver ``dulce_bias_project.cache``), fuera
+de las requests; así los percentiles incluyen a todos los workers.
+``get_view_metrics`` calcula p50/p90/p95/p99 interpolando dentro de los
+buckets (como ``histogram_quantile`` de Prometheus).
+
+Las requests más lentas que ``METRICS_SLOW_REQUEST_MS`` se registran en el
+logger ``dulce_bias.slow`` con sus consultas (SQL sin parámetros, en orden y
+con su duración).
+
+Se muestran en ``/management/metricas/`` y en formato de texto de
+Prometheus en ``/metrics/`` (ver ``dulce_bias_project.health``).
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections
+
+from .cache import _backend, _read, cache, incr, incr_many
+
+slow_logger = logging.getLogger('dulce_bias.slow')
+
+FLUSH_SECONDS = 10
+
+KEY_PREFIX = 'metrics'
+# Índice de vistas: contador de posiciones, la vista en cada posición y una
+# marca por vista ya registrada
+INDEX_KEY = f'{KEY_PREFIX}:index'
+INDEX_SLOT_KEY = f'{INDEX_KEY}:{{}}'
+INDEX_VIEW_KEY = f'{INDEX_KEY}:view:{{}}'
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Consultas guardadas por request para el volcado de requests lentas
+MAX_RECORDED_QUERIES = 200
+
+# Perfil de la request en curso (None fuera de una request)
+current_profile = contextvars.ContextVar('current_profile', default=None)
+
+
+@dataclass(frozen=True)
+class Histogram:
+    name: str
+    help: str
+    buckets: tuple
+    # Divisor para exportar en la unidad de Prometheus (ms -> segundos)
+    scale: int = 1
+    # Las sumas se guardan como enteros: valor * sum_factor
+    sum_factor: int = 1
+
+
+HISTOGRAMS = {
+    'duration': Histogram(
+        'request_duration_seconds', 'Tiempo total de la request',
+        (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000), scale=1000, sum_factor=1000,
+    ),
+    'db_time': Histogram(
+        'db_query_duration_seconds', 'Tiempo en consultas SQL por request',
+        (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500), scale=1000, sum_factor=1000,
+    ),
+    'queries': Histogram(
+        'db_queries', 'Consultas SQL por request',
+        (0, 1, 2, 5, 10, 20, 50, 100, 200),
+    ),
+    'template_time': Histogram(
+        'template_render_seconds', 'Tiempo de render de templates por request',
+        (1, 5, 10, 25, 50, 100, 250, 500, 1000), scale=1000, sum_factor=1000,
+    ),
+    'response_size': Histogram(
+        'response_size_bytes', 'Tamaño de la respuesta',
+        (1024, 10240, 51200, 102400, 262144, 524288, 1048576),
+    ),
+}
+
+UNITS = {
+    'duration': 'ms',
+    'db_time': 'ms',
+    'queries': '',
+    'template_time': 'ms',
+    'response_size': 'B',
+}
+
+
+def is_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+def metric_key(view, name):
+    return f'{KEY_PREFIX}:{view}:{name}'
+
+
+# Perfil de una request
+
+class RequestProfile:
+    """Consultas y tiempos de una request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.queries = []
+        self.template_time = 0.0
+        self.template_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.query_count += 1
+            self.db_time += elapsed
+            if len(self.queries) < MAX_RECORDED_QUERIES:
+                self.queries.append((sql, elapsed))
+
+    @property
+    def elapsed(self):
+        return (time.perf_counter() - self.start) * 1000
+
+
+def install_template_timing():
+    """Mide el render de templates del backend de Django (una sola vez por proceso)"""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'metrics_timed', False):
+        return
+    original_render = Template.render
+
+    @functools.wraps(original_render)
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        # Solo el render de primer nivel: un render dentro de otro ya se está midiendo
+        if profile is None or profile.template_depth:
+            return original_render(self, context, request)
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original_render(self, context, request)
+        finally:
+            profile.template_depth -= 1
+            profile.template_time += (time.perf_counter() - started) * 1000
+
+    render.metrics_timed = True
+    Template.render = render
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route or 'unnamed'
+
+
+def get_response_size(response):
+    if getattr(response, 'streaming', False):
+        return None
+    return len(response.content)
+
+
+class ProfilingMiddleware:
+    """Mide cada request y la agrega a las métricas de su vista"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timing()
+
+    def __call__(self, request):
+        if not is_enabled():
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_query))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+
+        duration = profile.elapsed
+        view = get_view_name(request)
+        values = {
+            'duration': duration,
+            'db_time': profile.db_time,
+            'queries': profile.query_count,
+            'template_time': profile.template_time,
+        }
+        size = get_response_size(response)
+        if size is not None:
+            values['response_size'] = size
+        registry.observe(view, values, error=response.status_code >= 500)
+
+        threshold = getattr(settings, 'METRICS_SLOW_REQUEST_MS', None)
+        if threshold is not None and duration >= threshold:
+            log_slow_request(request, view, response, profile, duration)
+        return response
+
+
+def log_slow_request(request, view, response, profile, duration):
+    slow_logger.warning(
+        'Slow request: %s %s (%s) %.0f ms, %d queries in %.0f ms',
+        request.method, request.path, view, duration, profile.query_count, profile.db_time,
+        extra={
+            'view': view,
+            'status': response.status_code,
+            'duration_ms': round(duration, 2),
+            'query_count': profile.query_count,
+            'db_time_ms': round(profile.db_time, 2),
+            'template_ms': round(profile.template_time, 2),
+            'queries': [{'sql': sql, 'ms': round(elapsed, 2)} for sql, elapsed in profile.queries],
+        },
+    )
+
+
+# Agregación
+
+class MetricsRegistry:
+    """
+    Observaciones del proceso pendientes de sumar al cache compartido.
+
+    Los contadores por vista son: ``count``, ``errors`` y, por histograma,
+    un contador por bucket (``b<i>``, no acumulados; el último es +Inf) y
+    la suma (``sum``).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(int)
+        self.views = set()
+        self.flusher = None
+        self.flusher_pid = None
+
+    def observe(self, view, values, error=False):
+        with self.lock:
+            self.views.add(view)
+            self.pending[metric_key(view, 'count')] += 1
+            if error:
+                self.pending[metric_key(view, 'errors')] += 1
+            for name, value in values.items():
+                histogram = HISTOGRAMS[name]
+                bucket = bisect.bisect_left(histogram.buckets, value)
+                self.pending[metric_key(view, f'{name}:b{bucket}')] += 1
+                self.pending[metric_key(view, f'{name}:sum')] += round(value * histogram.sum_factor)
+        self.start_flusher()
+
+    def start_flusher(self):
+        """Inicia el thread que guarda las métricas (uno por proceso: los threads no sobreviven a un fork)"""
+        if self.flusher_pid == os.getpid():
+            return
+        with self.lock:
+            if self.flusher_pid == os.getpid():
+                return
+            self.flusher = threading.Thread(target=self.run_flusher, name='metrics-flush', daemon=True)
+            self.flusher_pid = os.getpid()
+            self.flusher.start()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self):
+        """Suma lo pendiente al cache compartido (una escritura) y registra las vistas que falten"""
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(int)
+            views = set(self.views)
+        try:
+            incr_many({key: delta for key, delta in pending.items() if delta}, None)
+            register_views(views)
+        except Exception:
+            # Un error del cache no debe detener el thread
+            logging.getLogger(__name__).exception('No se pudieron guardar las métricas')
+
+    def get_pending(self):
+        with self.lock:
+            return dict(self.pending), set(self.views)
+
+
+registry = MetricsRegistry()
+
+
+def register_views(views):
+    """
+    Agrega las vistas al índice compartido. ``add`` es atómico: solo el
+    primer worker que registra una vista le asigna una posición (``incr``),
+    así que dos workers a la vez no se pisan ni la duplican. Las vistas ya
+    registradas se descartan con una sola lectura.
+    """
+    keys = {view: INDEX_VIEW_KEY.format(view) for view in views}
+    registered = _read(_backend(), 'get_many', list(keys.values())) if keys else {}
+    for view, key in keys.items():
+        if key not in registered and cache.add(key, 1, None):
+            cache.set(INDEX_SLOT_KEY.format(incr(INDEX_KEY, timeout=None)), view, None)
+
+
+def get_registered_views():
+    backend = _backend()
+    count = _read(backend, 'get', INDEX_KEY) or 0
+    if not count:
+        return set()
+    slots = _read(backend, 'get_many', [INDEX_SLOT_KEY.format(i) for i in range(1, count + 1)])
+    return set(slots.values())
+
+
+def get_counter_names():
+    names = ['count', 'errors']
+    for name, histogram in HISTOGRAMS.items():
+        names.append(f'{name}:sum')
+        names.extend(f'{name}:b{i}' for i in range(len(histogram.buckets) + 1))
+    return names
+
+
+def get_counters():
+    """{vista: {contador: valor}} de todos los workers (incluye lo pendiente de este proceso)"""
+    pending, local_views = registry.get_pending()
+    views = get_registered_views() | local_views
+
+    names = get_counter_names()
+    keys = {(view, name): metric_key(view, name) for view in views for name in names}
+    shared = _read(_backend(), 'get_many', list(keys.values())) if keys else {}
+
+    counters = {view: defaultdict(int) for view in views}
+    for (view, name), key in keys.items():
+        counters[view][name] = shared.get(key, 0) + pending.get(key, 0)
+    return counters
+
+
+def histogram_quantile(quantile, buckets, counts):
+    """Percentil estimado con interpolación lineal dentro del bucket"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = quantile * total
+    cumulative = 0
+    for i, count in enumerate(counts):
+        if cumulative + count >= rank and count:
+            if i == len(buckets):
+                # Bucket +Inf: el mejor estimado es el límite del último bucket
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0
+            return lower + (buckets[i] - lower) * (rank - cumulative) / count
+        cumulative += count
+    return buckets[-1]
+
+
+def summarize(view_counters):
+    """Promedio y percentiles de cada histograma de una vista"""
+    summary = {}
+    for name, histogram in HISTOGRAMS.items():
+        counts = [view_counters[f'{name}:b{i}'] for i in range(len(histogram.buckets) + 1)]
+        observations = sum(counts)
+        metric = {
+            'count': observations,
+            'avg': round(view_counters[f'{name}:sum'] / histogram.sum_factor / observations, 2) if observations else None,
+            'unit': UNITS[name],
+        }
+        for percentile in PERCENTILES:
+            value = histogram_quantile(percentile / 100, histogram.buckets, counts)
+            metric[f'p{percentile}'] = round(value, 2) if value is not None else None
+        summary[name] = metric
+    return summary
+
+
+def get_view_metrics():
+    """Métricas por vista, de la más lenta (p95) a la más rápida"""
+    rows = []
+    for view, counters in get_counters().items():
+        if not counters['count']:
+            continue
+        rows.append({
+            'view': view,
+            'requests': counters['count'],
+            'errors': counters['errors'],
+            **summarize(counters),
+        })
+    rows.sort(key=lambda row: row['duration']['p95'] or 0, reverse=True)
+    return rows
+
+
+def reset_metrics():
+    """Borra los contadores compartidos y los pendientes del proceso"""
+    count = _read(_backend(), 'get', INDEX_KEY) or 0
+    views = get_registered_views()
+    names = get_counter_names()
+    cache.delete_many(
+        [INDEX_KEY]
+        + [INDEX_SLOT_KEY.format(i) for i in range(1, count + 1)]
+        + [INDEX_VIEW_KEY.format(view) for view in views]
+        + [metric_key(view, name) for view in views for name in names]
+    )
+    with registry.lock:
+        registry.pending.clear()
+        registry.views.clear()
+
+
+# Exportación
+
+def format_prometheus_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """Métricas en el formato de texto de Prometheus (histogramas acumulados)"""
+    counters = get_counters()
+    views = sorted(view for view in counters if counters[view]['count'])
+    lines = [
+        '# HELP dulce_bias_requests_total Requests por vista',
+        '# TYPE dulce_bias_requests_total counter',
+    ]
+    lines += [f'dulce_bias_requests_total{{view="{escape_label(v)}"}} {counters[v]["count"]}' for v in views]
+    lines += [
+        '# HELP dulce_bias_request_errors_total Respuestas 5xx por vista',
+        '# TYPE dulce_bias_request_errors_total counter',
+    ]
+    lines += [f'dulce_bias_request_errors_total{{view="{escape_label(v)}"}} {counters[v]["errors"]}' for v in views]
+
+    for name, histogram in HISTOGRAMS.items():
+        metric = f'dulce_bias_{histogram.name}'
+        lines += [f'# HELP {metric} {histogram.help}', f'# TYPE {metric} histogram']
+        for view in views:
+            label = escape_label(view)
+            cumulative = 0
+            for i, bound in enumerate(histogram.buckets + (None,)):
+                cumulative += counters[view][f'{name}:b{i}']
+                le = '+Inf' if bound is None else format_prometheus_number(bound / histogram.scale)
+                lines.append(f'{metric}_bucket{{view="{label}",le="{le}"}} {cumulative}')
+            total = counters[view][f'{name}:sum'] / histogram.sum_factor / histogram.scale
+            lines.append(f'{metric}_sum{{view="{label}"}} {format_prometheus_number(float(total))}')
+            lines.append(f'{metric}_count{{view="{label}"}} {cumulative}')
+    return '\n'.join(lines) + '\n'
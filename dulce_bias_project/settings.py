@@ -68,7 +68,16 @@ AUTH_PASSWORD_VALIDATORS = [
 RATELIMIT_ENABLE = True
 RATELIMIT_USE_CACHE = 'default'
 
-# Logging de Seguridad
+# Logging (ver dulce_bias_project.log): JSON por línea, escrito desde un
+# thread aparte y con archivos rotados por tamaño
+LOG_DIR = BASE_DIR / 'logs'
+LOG_DIR.mkdir(exist_ok=True)  # No está en el repo (.gitignore)
+LOG_FILE_MAX_BYTES = int(os.environ.get('LOG_FILE_MAX_BYTES', 10 * 1024 * 1024))
+LOG_FILE_BACKUP_COUNT = int(os.environ.get('LOG_FILE_BACKUP_COUNT', 5))
+# Fracción de los registros INFO que se conservan (WARNING o superior se conservan siempre)
+LOG_ACCESS_SAMPLE_RATE = float(os.environ.get('LOG_ACCESS_SAMPLE_RATE', 0.1))
+LOG_SECURITY_INFO_SAMPLE_RATE = float(os.environ.get('LOG_SECURITY_INFO_SAMPLE_RATE', 0.25))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -77,34 +86,94 @@ LOGGING = {
             'format': '[{asctime}] {levelname} {name} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'dulce_bias_project.log.JSONFormatter',
+        },
+    },
+    'filters': {
+        'request_context': {
+            '()': 'dulce_bias_project.log.RequestContextFilter',
+        },
+        'sample_access': {
+            '()': 'dulce_bias_project.log.SamplingFilter',
+            'rate': LOG_ACCESS_SAMPLE_RATE,
+        },
+        'sample_security_info': {
+            '()': 'dulce_bias_project.log.SamplingFilter',
+            'rate': LOG_SECURITY_INFO_SAMPLE_RATE,
+        },
     },
     'handlers': {
-        'security_file': {
+        'file_security': {
             'level': 'WARNING',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'logs' / 'security.log',
-            'formatter': 'security',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOG_DIR / 'security.log',
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
+            'formatter': 'json',
+        },
+        'file_app': {
+            'level': 'INFO',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOG_DIR / 'app.log',
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
+            'formatter': 'json',
         },
         'console': {
             'level': 'INFO',
             'class': 'logging.StreamHandler',
             'formatter': 'security',
         },
+        # Los handlers de cola solo encolan; un thread escribe en los destinos
+        # (dictConfig los configura en orden alfabético: queue_* va después)
+        'queue_security': {
+            'class': 'dulce_bias_project.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.file_security'],
+            'filters': ['request_context'],
+        },
+        'queue_app': {
+            'class': 'dulce_bias_project.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.file_app', 'cfg://handlers.console'],
+            'filters': ['request_context'],
+        },
+    },
+    'root': {
+        'handlers': ['queue_app'],
+        'level': 'WARNING',
     },
     'loggers': {
+        # Apps del proyecto: INFO (el resto, incluidas las dependencias, desde WARNING)
+        **{
+            name: {'level': 'INFO'}
+            for name in ('shop', 'accounts', 'cart', 'orders', 'support', 'management', 'notifications')
+        },
         'security': {
-            'handlers': ['security_file', 'console'],
+            'handlers': ['queue_security'],
+            'filters': ['sample_security_info'],
             'level': 'INFO',
             'propagate': True,
         },
         'django.security': {
-            'handlers': ['security_file'],
+            'handlers': ['queue_security'],
             'level': 'WARNING',
             'propagate': True,
         },
+        'dulce_bias.access': {
+            'filters': ['sample_access'],
+            'level': 'INFO',
+            'propagate': True,
+        },
     },
 }
 
+# Métricas de rendimiento por vista (ver dulce_bias_project.metrics)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+# Requests más lentas que esto (ms) se registran con sus consultas SQL (vacío: nunca)
+METRICS_SLOW_REQUEST_MS = float(os.environ.get('METRICS_SLOW_REQUEST_MS', '1000') or 'inf')
+# Token para que Prometheus lea /metrics/ sin sesión (Authorization: Bearer <token>)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -135,7 +204,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'dulce_bias_project.log.RequestLogMiddleware',  # Id de request y contexto para los logs
+    'dulce_bias_project.metrics.ProfilingMiddleware',  # Tiempos, consultas SQL y templates por vista
     'django.middleware.security.SecurityMiddleware',
+    'security.middleware.RequestScreeningMiddleware',  # IP del cliente y patrones sospechosos (una pasada)
     'axes.middleware.AxesMiddleware',  # Protección contra ataques de fuerza bruta
     'security.middleware.RateLimitMiddleware',  # Rate limiting personalizado (antes de auth)
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -194,18 +266,57 @@ if 'DATABASE_URL' in os.environ:
         )
     }
 
-# Cache Configuration para Rate Limiting
+# Cache compartido entre los workers de gunicorn (ver dulce_bias_project.cache)
+# CACHE_BACKEND: 'redis' (por defecto si hay REDIS_URL), 'sqlite' (archivo local,
+# sin servicios externos) o 'locmem' (solo un proceso: desarrollo y tests)
+REDIS_URL = os.environ.get('REDIS_URL', '')
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis' if REDIS_URL else 'sqlite')
+CACHE_BACKENDS = {
+    'redis': {
+        'BACKEND': 'dulce_bias_project.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+    'sqlite': {
+        'BACKEND': 'dulce_bias_project.cache.SQLiteCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache' / 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'CULL_FREQUENCY': 4,
+        }
+    },
+    'locmem': {
+        'BACKEND': 'dulce_bias_project.cache.LocMemCache',
+        'LOCATION': 'dulce-bias',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        }
+    },
+}
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        **CACHE_BACKENDS[CACHE_BACKEND],
         'TIMEOUT': 300,
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
-        }
+        'KEY_PREFIX': 'dulce_bias',
     }
 }
 
+# Cache del catálogo para visitantes anónimos (ver shop.catalog_cache)
+CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', 'True').lower() == 'true'
+CATALOG_CACHE_TIMEOUT = 300  # Páginas completas (segundos)
+CATALOG_FRAGMENT_TIMEOUT = 3600  # Tarjetas de producto y navegación de categorías
+
+# Contadores de los paneles de administración (ver management.dashboard_stats)
+DASHBOARD_STATS_TIMEOUT = 60  # segundos
+
+# Exportaciones CSV/XLSX (ver management.exports): con EXPORT_BACKGROUND_JOBS,
+# sobre EXPORT_STREAM_MAX_ROWS filas se generan en segundo plano (Celery o
+# `manage.py run_export_jobs`). Activarlo solo si el despliegue ejecuta ese
+# worker; si no, todas se descargan en streaming
+EXPORT_BACKGROUND_JOBS = os.environ.get('EXPORT_BACKGROUND_JOBS', 'False').lower() == 'true'
+EXPORT_STREAM_MAX_ROWS = 50000
+EXPORT_ROOT = os.environ.get('EXPORT_ROOT', str(BASE_DIR / 'exports'))  # Fuera de MEDIA_ROOT: solo se descargan desde la vista
+EXPORT_RETENTION_DAYS = 7
+
 # Django Axes Configuration (Protección contra fuerza bruta)
 AXES_ENABLED = True
 AXES_FAILURE_LIMIT = 5  # Máximo 5 intentos fallidos
@@ -233,6 +344,9 @@ RATE_LIMIT_LOGIN = '5/m'  # 5 intentos por minuto
 RATE_LIMIT_PASSWORD_RESET = '3/h'  # 3 intentos por hora
 RATE_LIMIT_CONTACT_FORM = '10/h'  # 10 formularios por hora
 RATE_LIMIT_API = '100/h'  # 100 requests por hora para APIs
+# Reglas adicionales por prefijo de ruta (ver security.ratelimit), ej:
+# {'/cart/checkout/': '10/m sliding', '/buscar/': '60/m bucket=20'}
+RATE_LIMIT_RULES = {}
 
 # File Upload Security
 FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB
@@ -364,3 +478,17 @@ CONTENT_SECURITY_POLICY = {
 BACKUP_ENABLED = True
 BACKUP_DIR = BASE_DIR / 'backups'
 BACKUP_RETENTION_DAYS = 30
+
+# Notificaciones
+# 'queue': se encolan al hacer commit y las envía un worker (Celery o
+# `manage.py process_notifications --loop`, que start.sh y docker-compose
+# ejecutan junto a la web); 'sync': se envían en el mismo proceso
+NOTIFICATION_DISPATCH_MODE = os.environ.get('NOTIFICATION_DISPATCH_MODE', 'queue')
+NOTIFICATION_QUEUE_BATCH_SIZE = 100  # Items reservados por lote del worker
+NOTIFICATION_QUEUE_LEASE_SECONDS = 300  # Tras este tiempo otro worker reintenta el lote
+NOTIFICATION_THREADS_PER_CHANNEL = {'email': 4, 'sms': 4, 'whatsapp': 4}
+# Transporte HTTP de SMS/WhatsApp: envíos en paralelo, límite por segundo y reintentos
+NOTIFICATION_TRANSPORTS = {
+    'sms': {'max_concurrency': 4, 'rate_per_second': 10, 'max_retries': 3},
+    'whatsapp': {'max_concurrency': 4, 'rate_per_second': 10, 'max_retries': 3},
+}
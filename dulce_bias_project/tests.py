@@ -0,0 +1,192 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from . import metrics
+from .cache import LocMemCache, SQLiteCache, cache
+
+
+def run_in_threads(function, threads=4):
+    workers = [threading.Thread(target=function) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def add_one(value):
+    return (value or 0) + 1, None
+
+
+class SQLiteCacheTestCase(SimpleTestCase):
+    """Un archivo de cache propio por prueba"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = SQLiteCache(os.path.join(directory.name, 'cache.sqlite3'), {})
+
+
+class SQLiteCacheTests(SQLiteCacheTestCase):
+
+    def test_incr_or_create(self):
+        self.assertEqual(self.cache.incr_or_create('hits'), 1)
+        self.assertEqual(self.cache.incr_or_create('hits', 4), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_expired_keys_are_recreated(self):
+        self.cache.set('hits', 10, timeout=-1)
+        self.assertIsNone(self.cache.get('hits'))
+        self.assertEqual(self.cache.incr_or_create('hits', 2), 2)
+
+        self.cache.set('lock', 'a', timeout=-1)
+        self.assertTrue(self.cache.add('lock', 'b'))
+        self.assertFalse(self.cache.add('lock', 'c'))
+        self.assertEqual(self.cache.get('lock'), 'b')
+
+    def test_concurrent_incr_is_exact_across_threads(self):
+        run_in_threads(lambda: [self.cache.incr_or_create('hits') for _ in range(100)])
+
+        self.assertEqual(self.cache.get('hits'), 400)
+
+    def test_concurrent_incr_is_exact_across_processes(self):
+        self.cache.incr_or_create('hits', 0)
+
+        def work():
+            # Cada worker de gunicorn es un proceso con su propia conexión
+            for _ in range(100):
+                self.cache.incr('hits')
+
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=work) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        self.assertEqual([process.exitcode for process in processes], [0] * 4)
+        self.assertEqual(self.cache.get('hits'), 400)
+
+    def test_atomic_update_does_not_lose_writes(self):
+        run_in_threads(lambda: [self.cache.atomic_update('tokens', add_one) for _ in range(50)])
+
+        self.assertEqual(self.cache.get('tokens'), 200)
+
+    def test_atomic_update_returns_the_result_and_can_skip_the_write(self):
+        self.cache.set('tokens', 3)
+
+        self.assertEqual(self.cache.atomic_update('tokens', lambda value: (None, value * 2)), 6)
+        self.assertEqual(self.cache.get('tokens'), 3)
+
+    def test_counts_hits_and_misses(self):
+        self.cache.set('a', 1)
+        self.cache.get('a')
+        self.cache.get('missing')
+        self.cache.get_many(['a', 'b', 'c'])
+
+        self.assertEqual(self.cache.stats.pending(), {'hits': 2, 'misses': 3})
+
+
+class LocMemCacheTests(SimpleTestCase):
+
+    def test_atomic_update_does_not_lose_writes(self):
+        locmem = LocMemCache('tests', {})
+
+        run_in_threads(lambda: [locmem.atomic_update('tokens', add_one) for _ in range(50)])
+
+        self.assertEqual(locmem.get('tokens'), 200)
+
+
+class IncrManyTests(SQLiteCacheTestCase):
+
+    def test_creates_and_increments_in_one_call(self):
+        self.cache.set('existing', 5)
+        self.cache.set('expired', 7, timeout=-1)
+        self.cache.set('not-a-number', 'texto')
+
+        self.cache.incr_many({'existing': 2, 'new': 3, 'expired': 1, 'not-a-number': 4})
+
+        self.assertEqual(
+            self.cache.get_many(['existing', 'new', 'expired', 'not-a-number']),
+            {'existing': 7, 'new': 3, 'expired': 1, 'not-a-number': 4}
+        )
+
+    def test_concurrent_increments_are_not_lost(self):
+        run_in_threads(lambda: [self.cache.incr_many({'a': 1, 'b': 2}) for _ in range(50)])
+
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'a': 200, 'b': 400})
+
+
+class MetricsRegistryTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.registry = metrics.MetricsRegistry()
+        patcher = mock.patch.object(metrics, 'registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Sin thread: las pruebas llaman a flush() directamente
+        self.registry.flusher_pid = os.getpid()
+
+    def test_observe_does_not_write_to_the_cache(self):
+        with mock.patch.object(metrics, 'incr_many') as incr_many, \
+                mock.patch.object(metrics, 'register_views') as register_views:
+            for i in range(100):
+                self.registry.observe('shop:home', {'duration': i, 'queries': 3})
+
+        incr_many.assert_not_called()
+        register_views.assert_not_called()
+        # Lo pendiente del proceso ya se ve en las métricas
+        self.assertEqual(metrics.get_counters()['shop:home']['count'], 100)
+
+    def test_flush_adds_pending_counters_to_the_shared_cache(self):
+        for duration in (3, 30, 300):
+            self.registry.observe('shop:home', {'duration': duration}, error=duration > 100)
+        self.registry.flush()
+        self.registry.observe('shop:home', {'duration': 3})
+        self.registry.flush()
+
+        self.assertEqual(self.registry.get_pending(), ({}, {'shop:home'}))
+        counters = metrics.get_counters()['shop:home']
+        self.assertEqual((counters['count'], counters['errors']), (4, 1))
+        self.assertEqual(counters['duration:b0'], 2)
+        self.assertEqual(counters['duration:sum'], 336 * 1000)
+
+    def test_start_flusher_starts_one_thread_per_process(self):
+        self.registry.flusher_pid = None
+        with mock.patch.object(metrics.MetricsRegistry, 'run_flusher'):
+            self.registry.start_flusher()
+            flusher = self.registry.flusher
+            self.registry.start_flusher()
+        flusher.join()
+
+        self.assertIs(self.registry.flusher, flusher)
+        self.assertTrue(flusher.daemon)
+
+    def test_concurrent_workers_register_each_view_once(self):
+        views = [{'shop:home', 'shop:product_detail'}, {'shop:home', 'cart:detail'}] * 4
+
+        threads = [threading.Thread(target=metrics.register_views, args=(worker_views,)) for worker_views in views]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(metrics.get_registered_views(), {'shop:home', 'shop:product_detail', 'cart:detail'})
+        self.assertEqual(cache.get(metrics.INDEX_KEY), 3)
+
+    def test_reset_clears_the_index(self):
+        self.registry.observe('shop:home', {'duration': 3})
+        self.registry.flush()
+
+        metrics.reset_metrics()
+
+        self.assertEqual(metrics.get_counters(), {})
+        metrics.register_views({'shop:home'})
+        self.assertEqual(metrics.get_registered_views(), {'shop:home'})
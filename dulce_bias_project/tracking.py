@@ -0,0 +1,101 @@
+"""
+Seguimiento en memoria de cambios de campos
+
+``FieldTrackerMixin`` guarda el valor de los campos indicados en
+``tracked_fields`` al cargar la instancia desde la base de datos, de modo que
+``save()`` pueda saber qué cambió sin volver a consultar la fila. Lo usan los
+modelos de ``shop`` y ``orders``.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+
+class FieldTrackerMixin:
+    """
+    Mixin para modelos que necesitan detectar cambios de ciertos campos.
+
+    Uso:
+        class Order(FieldTrackerMixin, models.Model):
+            tracked_fields = ('status', 'payment_status')
+
+    - ``get_field_changes(update_fields)`` retorna {campo: (anterior, nuevo)}
+    - ``reset_field_tracking(fields)`` actualiza la foto tras guardar
+
+    Las FK se siguen por su columna (``product_id``); en ``update_fields``
+    sirve también el nombre del campo (``product``).
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.reset_field_tracking()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self.reset_field_tracking(fields)
+
+    def _get_loaded_values(self):
+        loaded_values = self.__dict__.get('_loaded_field_values')
+        if loaded_values is None:
+            loaded_values = self.__dict__['_loaded_field_values'] = {}
+        return loaded_values
+
+    def _get_column_names(self, fields):
+        """``fields`` más el attname de cada FK (update_fields=['product'] escribe product_id)"""
+        if fields is None:
+            return None
+        names = set(fields)
+        for name in fields:
+            try:
+                names.add(self._meta.get_field(name).attname)
+            except FieldDoesNotExist:
+                pass
+        return names
+
+    def reset_field_tracking(self, fields=None):
+        """Toma una nueva foto de los campos seguidos (todos o solo ``fields``)"""
+        fields = self._get_column_names(fields)
+        loaded_values = self._get_loaded_values()
+        for name in self.tracked_fields:
+            if fields is not None and name not in fields:
+                continue
+            # Los campos diferidos (.only/.defer) no están en __dict__
+            if name in self.__dict__:
+                loaded_values[name] = self.__dict__[name]
+
+    def get_field_changes(self, update_fields=None):
+        """
+        Retorna {campo: (valor_anterior, valor_nuevo)} de los campos seguidos que cambiaron.
+
+        Si se indica ``update_fields`` solo se consideran esos campos (los
+        demás no se escribirán). Si la instancia no fue cargada desde la base
+        de datos, los valores anteriores se leen con una sola consulta.
+        """
+        if self._state.adding or self.pk is None:
+            return {}
+
+        update_fields = self._get_column_names(update_fields)
+        fields = [
+            name for name in self.tracked_fields
+            if update_fields is None or name in update_fields
+        ]
+        loaded_values = self._get_loaded_values()
+
+        missing = [name for name in fields if name not in loaded_values]
+        if missing:
+            row = type(self)._default_manager.filter(pk=self.pk).values(*missing).first()
+            if row is None:
+                return {}
+            loaded_values.update(row)
+
+        changes = {}
+        for name in fields:
+            old_value = loaded_values[name]
+            new_value = getattr(self, name)
+            if old_value != new_value:
+                changes[name] = (old_value, new_value)
+        return changes
+
+    def has_field_changed(self, name):
+        return name in self.get_field_changes()
@@ -6,7 +6,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import RedirectView
-from .health import health_check
+from .health import cache_health_check, health_check, prometheus_metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -22,6 +22,8 @@ urlpatterns = [
     
     # Health check para Railway
     path('health/', health_check, name='health_check'),
+    path('health/cache/', cache_health_check, name='cache_health_check'),
+    path('metrics/', prometheus_metrics, name='prometheus_metrics'),
     
     # Favicon
     path('favicon.ico', RedirectView.as_view(url=settings.STATIC_URL + 'favicon.ico', permanent=True)),
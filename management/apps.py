@@ -11,5 +11,5 @@ class ManagementConfig(AppConfig):
         Método llamado cuando la aplicación está lista.
         Aquí se pueden registrar señales, etc.
         """
-        pass
+        import management.signals
     verbose_name = 'Gestión Empresarial'
@@ -0,0 +1,154 @@
+"""
+Contadores de los paneles de administración
+
+Cada familia de contadores sale de una sola consulta con agregación
+condicional (``Count('id', filter=Q(...))``) y se guarda en el cache
+compartido por ``DASHBOARD_STATS_TIMEOUT`` segundos. Los signals de
+``management.signals`` borran la familia afectada cuando cambian sus
+modelos, así que los paneles que se refrescan solos leen el cache en lugar
+de volver a contar las tablas.
+
+Uso:
+
+    stats = get_stats('products', 'coupons')
+    stats['products']['low_stock']
+
+Los contadores que dependen de la hora (cupones por expirar, notificaciones
+del día) pueden tener hasta ``DASHBOARD_STATS_TIMEOUT`` segundos de atraso.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils import timezone
+
+from dulce_bias_project.cache import cache
+from notifications.models import Notification, NotificationTemplate
+from orders.analytics import get_day_start, get_order_counts
+from orders.models import TransferPayment
+from shop.models import DiscountCoupon, Product, ProductSupplier, Supplier, TaxConfiguration
+
+TIMEOUT = getattr(settings, 'DASHBOARD_STATS_TIMEOUT', 60)
+LOW_STOCK_THRESHOLD = 10
+
+STATS_KEY = 'dashboard:stats:{}'
+
+
+def count_products():
+    has_supplier = Exists(ProductSupplier.objects.filter(product=OuterRef('pk')))
+    return Product.objects.aggregate(
+        total=Count('id'),
+        active=Count('id', filter=Q(available=True)),
+        low_stock=Count('id', filter=Q(stock__lte=LOW_STOCK_THRESHOLD)),
+        out_of_stock=Count('id', filter=Q(stock=0)),
+        without_supplier=Count('id', filter=~Q(has_supplier)),
+    )
+
+
+def count_coupons():
+    return DiscountCoupon.objects.aggregate(
+        active=Count('id', filter=Q(is_active=True)),
+        expiring=Count('id', filter=Q(is_active=True, valid_until__lte=timezone.now() + timedelta(days=7))),
+    )
+
+
+def count_suppliers():
+    return Supplier.objects.aggregate(active=Count('id', filter=Q(is_active=True)))
+
+
+def count_taxes():
+    return TaxConfiguration.objects.aggregate(active=Count('id', filter=Q(is_active=True)))
+
+
+def count_orders():
+    # Una consulta agrupada sobre el resumen diario de ventas (ver orders.analytics)
+    return get_order_counts()
+
+
+def count_transfers():
+    return TransferPayment.objects.aggregate(
+        total=Count('id'),
+        **{
+            status: Count('id', filter=Q(status=status))
+            for status, display in TransferPayment.TRANSFER_STATUS_CHOICES
+        }
+    )
+
+
+def count_notifications():
+    """Por estado, del día y por día de la última semana (``daily``: lista de (fecha, cantidad))"""
+    today = timezone.localdate()
+    today_start = get_day_start(today)
+    tomorrow_start = get_day_start(today + timedelta(days=1))
+    created_today = Q(created_at__gte=today_start, created_at__lt=tomorrow_start)
+
+    # Los 7 días anteriores a hoy
+    days = [today - timedelta(days=7 - i) for i in range(7)]
+    daily = {
+        f'day_{i}': Count('id', filter=Q(
+            created_at__gte=get_day_start(day),
+            created_at__lt=get_day_start(day + timedelta(days=1)),
+        ))
+        for i, day in enumerate(days)
+    }
+
+    counts = Notification.objects.aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status='pending')),
+        failed=Count('id', filter=Q(status='failed')),
+        sent_today=Count('id', filter=Q(sent_at__gte=today_start, sent_at__lt=tomorrow_start)),
+        created_sent_today=Count('id', filter=created_today & Q(status='sent')),
+        created_failed_today=Count('id', filter=created_today & Q(status='failed')),
+        **daily
+    )
+    counts['daily'] = [(day, counts.pop(f'day_{i}')) for i, day in enumerate(days)]
+    return counts
+
+
+def count_notification_templates():
+    return NotificationTemplate.objects.aggregate(active=Count('id', filter=Q(is_active=True)))
+
+
+def count_users():
+    return User.objects.aggregate(
+        total=Count('id'),
+        with_notification_preferences=Count('notification_preferences'),
+    )
+
+
+FAMILIES = {
+    'products': count_products,
+    'coupons': count_coupons,
+    'suppliers': count_suppliers,
+    'taxes': count_taxes,
+    'orders': count_orders,
+    'transfers': count_transfers,
+    'notifications': count_notifications,
+    'notification_templates': count_notification_templates,
+    'users': count_users,
+}
+
+
+def get_stats(*families):
+    """{familia: contadores} con una sola lectura del cache; las familias que faltan se calculan"""
+    keys = {family: STATS_KEY.format(family) for family in families}
+    found = cache.get_many(keys.values())
+
+    stats = {}
+    missing = {}
+    for family, key in keys.items():
+        if key in found:
+            stats[family] = found[key]
+        else:
+            stats[family] = missing[key] = FAMILIES[family]()
+    if missing:
+        cache.set_many(missing, TIMEOUT)
+    return stats
+
+
+def invalidate(*families):
+    """Borra las familias del cache después del commit (para no guardar datos que aún no son visibles)"""
+    keys = [STATS_KEY.format(family) for family in families]
+    transaction.on_commit(lambda: cache.delete_many(keys))
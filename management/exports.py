@@ -0,0 +1,419 @@
+"""
+Exportaciones CSV y XLSX
+
+Cada exportación es una subclase de ``Export`` que define sus columnas y la
+proyección del queryset (``values()`` o ``select_related``), de modo que las
+filas se leen por bloques con ``.iterator(chunk_size=...)`` sin consultas por
+fila. Los archivos se escriben a medida que llegan las filas:
+
+- ``stream_export`` responde con ``StreamingHttpResponse`` (el archivo nunca
+  está completo en memoria).
+- ``export_response`` decide: hasta ``EXPORT_STREAM_MAX_ROWS`` filas responde
+  en streaming; sobre eso, si ``EXPORT_BACKGROUND_JOBS`` está activo, crea un
+  ``ExportJob`` y redirige a su página, desde donde se descarga cuando está
+  listo. Sin worker (por defecto) todo se descarga en streaming.
+
+Los trabajos se generan con la tarea de Celery ``run_export_jobs`` (si hay
+broker configurado) o con ``manage.py run_export_jobs``; se reservan con
+``select_for_update(skip_locked=True)`` por un tiempo que se renueva mientras
+se escribe, así que si un worker muere otro retoma el trabajo. Los archivos
+quedan en ``EXPORT_ROOT`` (fuera de ``MEDIA_ROOT``) por
+``EXPORT_RETENTION_DAYS`` días.
+
+Uso:
+
+    class MovementExport(Export):
+        title = 'Movimientos de stock'
+        filename = 'movimientos_stock'
+        columns = [('Producto', 'product__name'), ('Cantidad', 'quantity')]
+
+        def get_queryset(self):
+            return ProductStock.objects.all()
+
+    return export_response(request, MovementExport(), queryset, 'xlsx')
+
+El XLSX se arma sin dependencias (``zipfile`` + SpreadsheetML con textos
+en línea), suficiente para abrirse en Excel, LibreOffice y Google Sheets.
+"""
+import csv
+import io
+import logging
+import os
+import pickle
+import re
+import socket
+import tempfile
+import time
+import uuid
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+STREAM_MAX_ROWS = getattr(settings, 'EXPORT_STREAM_MAX_ROWS', 50000)
+RETENTION_DAYS = getattr(settings, 'EXPORT_RETENTION_DAYS', 7)
+CHUNK_SIZE = 2000
+LEASE_SECONDS = 300
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+FORMAT_ALIASES = {'excel': 'xlsx', 'xls': 'xlsx'}
+
+# Caracteres de control que XML no admite
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def get_storage():
+    return FileSystemStorage(location=getattr(settings, 'EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports')))
+
+
+def get_export_format(value, default=None):
+    """'csv' o 'xlsx' desde un parámetro ``format`` (acepta 'excel'); ``default`` si no es válido"""
+    value = FORMAT_ALIASES.get(value, value)
+    return value if value in FORMATS else default
+
+
+class Export:
+    """Definición de una exportación: columnas, queryset y formato de cada fila"""
+    title = 'Exportación'
+    filename = 'exportacion'
+    columns = ()  # [(encabezado, campo de values())]
+    chunk_size = CHUNK_SIZE
+
+    def get_queryset(self):
+        """Filas a exportar cuando no se entrega un queryset"""
+        raise NotImplementedError
+
+    def project(self, queryset):
+        """Proyección de las filas; por defecto ``values()`` de los campos de ``columns``"""
+        return queryset.values(*[field for header, field in self.columns])
+
+    def format_row(self, row):
+        return [row[field] for header, field in self.columns]
+
+    def get_headers(self):
+        return [header for header, field in self.columns]
+
+    def get_filename(self):
+        return f"{self.filename}_{timezone.localdate().strftime('%Y%m%d')}"
+
+    def iter_rows(self, queryset=None):
+        queryset = self.get_queryset() if queryset is None else queryset
+        for row in self.project(queryset).iterator(chunk_size=self.chunk_size):
+            yield self.format_row(row)
+
+
+# Escritura por bloques
+
+def iter_csv(headers, rows, flush_rows=CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % flush_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+class ChunkBuffer:
+    """Archivo de solo escritura que acumula bytes hasta que se leen con ``pop``"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+
+def xlsx_cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, bool):
+        value = 'Sí' if value else 'No'
+    elif isinstance(value, (int, float, Decimal)):
+        return f'<c><v>{value}</v></c>'
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    text = escape(INVALID_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_row(values):
+    return '<row>' + ''.join(xlsx_cell(value) for value in values) + '</row>'
+
+
+def iter_xlsx(headers, rows, title='Hoja1', flush_rows=CHUNK_SIZE):
+    buffer = ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        sheet_name = escape(re.sub(r'[\[\]:*?/\\]', '', title)[:31] or 'Hoja1', {'"': '&quot;'})
+        workbook.writestr('xl/workbook.xml', WORKBOOK_XML.format(sheet_name))
+
+        with workbook.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(xlsx_row(headers).encode('utf-8'))
+            for count, row in enumerate(rows, 1):
+                sheet.write(xlsx_row(row).encode('utf-8'))
+                if count % flush_rows == 0:
+                    yield buffer.pop()
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.pop()
+
+
+def iter_export(export, file_format, rows):
+    """Bytes del archivo de la exportación (``rows``: filas ya formateadas), por bloques"""
+    if file_format == 'xlsx':
+        return iter_xlsx(export.get_headers(), rows, export.title)
+    return iter_csv(export.get_headers(), rows)
+
+
+def stream_export(export, file_format='csv', queryset=None):
+    """Descarga en streaming"""
+    content_type, extension = FORMATS[file_format]
+    response = StreamingHttpResponse(
+        iter_export(export, file_format, export.iter_rows(queryset)),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export.get_filename()}.{extension}"'
+    return response
+
+
+def background_jobs_enabled():
+    """Si el despliegue ejecuta el worker de exportaciones (``EXPORT_BACKGROUND_JOBS``)"""
+    return getattr(settings, 'EXPORT_BACKGROUND_JOBS', False)
+
+
+def export_response(request, export, queryset=None, file_format='csv'):
+    """Descarga en streaming o, si hay más de ``STREAM_MAX_ROWS`` filas y worker, exportación en segundo plano"""
+    if not background_jobs_enabled():
+        return stream_export(export, file_format, queryset)
+
+    rows = export.get_queryset() if queryset is None else queryset
+    if rows.count() <= STREAM_MAX_ROWS:
+        return stream_export(export, file_format, queryset)
+
+    job = create_export_job(export, file_format, user=request.user, queryset=queryset)
+    messages.info(
+        request,
+        f'📦 La exportación "{job.title}" es grande y se está generando en segundo plano. '
+        f'Podrás descargarla desde esta página cuando esté lista.'
+    )
+    return redirect('management:export_job_detail', pk=job.pk)
+
+
+# Exportaciones en segundo plano
+
+def get_export_path(export):
+    export_class = type(export)
+    return f'{export_class.__module__}.{export_class.__qualname__}'
+
+
+def create_export_job(export, file_format='csv', user=None, queryset=None):
+    """Registra la exportación y avisa al worker después del commit"""
+    job = ExportJob.objects.create(
+        export=get_export_path(export),
+        title=export.title,
+        file_format=file_format,
+        # La consulta se guarda tal cual (filtros del admin incluidos) y se vuelve a ejecutar en el worker
+        query=pickle.dumps(queryset.query) if queryset is not None else None,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    transaction.on_commit(wake_up_export_worker)
+    return job
+
+
+def wake_up_export_worker():
+    """Pedir a Celery que genere las exportaciones pendientes (sin Celery: ``manage.py run_export_jobs``)"""
+    from notifications.services import celery_is_configured
+
+    if not celery_is_configured():
+        return
+    try:
+        from .tasks import run_export_jobs
+        run_export_jobs.delay()
+    except Exception as e:
+        logger.warning(f"No se pudo avisar al worker de exportaciones: {str(e)}")
+
+
+def get_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def claim_export_job(worker_id, lease_seconds=LEASE_SECONDS):
+    """Reserva la exportación pendiente más antigua (o una cuya reserva venció)"""
+    now = timezone.now()
+    available = Q(status='pending') | Q(status='running', locked_until__lt=now)
+
+    with transaction.atomic():
+        job_id = (
+            ExportJob.objects.select_for_update(skip_locked=True)
+            .filter(available)
+            .order_by('created_at')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+
+        # La condición se repite en el UPDATE para bases sin SKIP LOCKED (SQLite)
+        claimed = ExportJob.objects.filter(available, id=job_id).update(
+            status='running',
+            started_at=now,
+            locked_until=now + timedelta(seconds=lease_seconds),
+            locked_by=worker_id,
+        )
+    if not claimed:
+        return None
+    return ExportJob.objects.get(id=job_id)
+
+
+def run_export_job(job, lease_seconds=LEASE_SECONDS):
+    """Genera el archivo de una exportación reservada; renueva la reserva mientras escribe"""
+    export = import_string(job.export)()
+    queryset = None
+    if job.query:
+        queryset = export.get_queryset()
+        queryset.query = pickle.loads(job.query)
+
+    rows = 0
+    renewed = time.monotonic()
+
+    def counted(rows_iter):
+        nonlocal rows, renewed
+        for row in rows_iter:
+            rows += 1
+            if time.monotonic() - renewed > lease_seconds / 3:
+                renewed = time.monotonic()
+                ExportJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+                    row_count=rows,
+                    locked_until=timezone.now() + timedelta(seconds=lease_seconds),
+                )
+            yield row
+
+    extension = FORMATS[job.file_format][1]
+    try:
+        with tempfile.TemporaryFile() as output:
+            for chunk in iter_export(export, job.file_format, counted(export.iter_rows(queryset))):
+                output.write(chunk)
+            output.seek(0)
+            file_name = get_storage().save(f'{job.pk}_{export.get_filename()}.{extension}', File(output))
+    except Exception as e:
+        logger.exception(f"Error generando la exportación {job.pk}")
+        ExportJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+            status='failed', error=str(e), finished_at=timezone.now(), locked_until=None, locked_by=''
+        )
+        return False
+
+    # Solo si la reserva sigue siendo nuestra: si venció, otro worker retomó el trabajo
+    updated = ExportJob.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status='done',
+        row_count=rows,
+        file_name=file_name,
+        finished_at=timezone.now(),
+        locked_until=None,
+        locked_by='',
+    )
+    if not updated:
+        logger.warning(f"La reserva de la exportación {job.pk} venció; se descarta el archivo generado")
+        get_storage().delete(file_name)
+        return False
+    return True
+
+
+def purge_export_jobs(days=RETENTION_DAYS):
+    """Elimina las exportaciones (y sus archivos) de más de ``days`` días; retorna la cantidad"""
+    old_jobs = ExportJob.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))
+    storage = get_storage()
+    for file_name in old_jobs.exclude(file_name='').values_list('file_name', flat=True):
+        storage.delete(file_name)
+    deleted, _ = old_jobs.delete()
+    return deleted
+
+
+def run_export_jobs(max_jobs=None, worker_id=None):
+    """Genera exportaciones pendientes hasta vaciar la cola (o ``max_jobs``); retorna (listas, fallidas)"""
+    worker_id = worker_id or get_worker_id()
+    purge_export_jobs()
+
+    done = failed = 0
+    while max_jobs is None or done + failed < max_jobs:
+        job = claim_export_job(worker_id)
+        if job is None:
+            break
+        if run_export_job(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
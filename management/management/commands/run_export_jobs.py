@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from management.exports import get_worker_id, run_export_jobs
+
+
+class Command(BaseCommand):
+    help = 'Generar las exportaciones CSV/XLSX pendientes (worker para cuando Celery no está configurado)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=None,
+            help='Detenerse después de generar esta cantidad de exportaciones'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Seguir esperando nuevas exportaciones indefinidamente'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10,
+            help='Segundos de espera cuando no hay exportaciones pendientes (con --loop)'
+        )
+
+    def handle(self, *args, **options):
+        worker_id = get_worker_id()
+        self.stdout.write(f"📦 Worker {worker_id} generando exportaciones pendientes...")
+
+        total_done = total_failed = 0
+        try:
+            while True:
+                done, failed = run_export_jobs(max_jobs=options['max_jobs'], worker_id=worker_id)
+                total_done += done
+                total_failed += failed
+                if not options['loop']:
+                    break
+                if not done and not failed:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Exportaciones generadas: {total_done} listas, {total_failed} fallidas')
+        )
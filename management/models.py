@@ -0,0 +1,52 @@
+"""
+Modelos del módulo de gestión empresarial
+"""
+from django.contrib.auth.models import User
+from django.db import models
+
+
+class ExportJob(models.Model):
+    """Exportación grande generada en segundo plano (ver management.exports)"""
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En proceso'),
+        ('done', 'Lista'),
+        ('failed', 'Fallida'),
+    ]
+    
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+    ]
+    
+    export = models.CharField(max_length=200, help_text="Ruta de la clase de exportación")
+    title = models.CharField(max_length=200)
+    file_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='csv')
+    query = models.BinaryField(null=True, blank=True, help_text="Consulta serializada (vacía: todas las filas)")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    row_count = models.PositiveIntegerField(default=0)
+    file_name = models.CharField(max_length=255, blank=True, help_text="Archivo en el almacenamiento de exportaciones")
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    # Reserva del worker que la está generando; vencida, otro worker la puede tomar
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    
+    class Meta:
+        verbose_name = "Exportación"
+        verbose_name_plural = "Exportaciones"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} ({self.get_file_format_display()}) - {self.get_status_display()}"
+    
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from notifications.models import Notification, NotificationTemplate, UserNotificationPreference
+from orders.analytics import sales_changed
+from orders.models import TransferPayment
+from shop import stock
+from shop.models import DiscountCoupon, Product, ProductSupplier, Supplier, TaxConfiguration
+
+from . import dashboard_stats
+
+# Familias de contadores (ver management.dashboard_stats) que dependen de cada modelo
+STATS_FAMILIES = {
+    Product: ('products',),
+    ProductSupplier: ('products',),
+    DiscountCoupon: ('coupons',),
+    Supplier: ('suppliers',),
+    TaxConfiguration: ('taxes',),
+    TransferPayment: ('transfers',),
+    Notification: ('notifications',),
+    NotificationTemplate: ('notification_templates',),
+    User: ('users',),
+    UserNotificationPreference: ('users',),
+}
+
+
+def invalidate_dashboard_stats(sender, **kwargs):
+    dashboard_stats.invalidate(*STATS_FAMILIES[sender])
+
+
+for model in STATS_FAMILIES:
+    post_save.connect(invalidate_dashboard_stats, sender=model, dispatch_uid=f'dashboard_stats_save_{model.__name__}')
+    post_delete.connect(invalidate_dashboard_stats, sender=model, dispatch_uid=f'dashboard_stats_delete_{model.__name__}')
+
+
+@receiver(stock.stock_changed)
+def invalidate_product_stats_on_stock_change(sender, products, **kwargs):
+    dashboard_stats.invalidate('products')
+
+
+@receiver(sales_changed)
+def invalidate_order_stats_on_sales_change(sender, **kwargs):
+    dashboard_stats.invalidate('orders')
@@ -0,0 +1,13 @@
+"""
+Tareas de Celery del módulo de gestión
+"""
+from celery import shared_task
+
+from .exports import run_export_jobs as generate_export_jobs
+
+
+@shared_task
+def run_export_jobs(max_jobs=None):
+    """Generar las exportaciones pendientes (reserva cada trabajo y escribe su archivo)"""
+    done, failed = generate_export_jobs(max_jobs=max_jobs)
+    return {'done': done, 'failed': failed}
@@ -54,6 +54,12 @@ urlpatterns = [
     path('reportes/ventas/', views.SalesReportView.as_view(), name='sales_report'),
     path('reportes/productos/', views.ProductReportView.as_view(), name='product_report'),
     path('reportes/margenes/', views.MarginsReportView.as_view(), name='margins_report'),
+    path('metricas/', views.MetricsView.as_view(), name='metrics'),
+    
+    # Exportaciones generadas en segundo plano
+    path('exportaciones/', views.ExportJobListView.as_view(), name='export_jobs'),
+    path('exportaciones/<int:pk>/', views.ExportJobDetailView.as_view(), name='export_job_detail'),
+    path('exportaciones/<int:pk>/descargar/', views.ExportJobDownloadView.as_view(), name='export_job_download'),
     
     # APIs para AJAX
     path('api/productos/', views.ProductsAPIView.as_view(), name='api_products'),
@@ -4,19 +4,32 @@ Solo accesible para superusuarios
 """
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import (
-    TemplateView, ListView, CreateView, UpdateView, DeleteView, View
+    TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView, View
 )
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, JsonResponse
 from django.db.models import Sum, Count, Q, Avg
 from django.urls import reverse_lazy
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.utils import timezone
-
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from dulce_bias_project.metrics import FLUSH_SECONDS as METRICS_FLUSH_SECONDS, get_view_metrics, reset_metrics
+from orders.analytics import get_sales_report
+from orders.exports import SalesOrderExport, get_sales_orders
+from .dashboard_stats import get_stats
+from . import exports
+from .models import ExportJob
 from .decorators import SuperuserRequiredMixin
 from .forms import CouponForm
+from shop.exports import ProductStockReportExport, StockAlertsExport
+from shop.stock_alerts import LOW_STOCK_FACTOR, get_alerts_etag, get_stock_alerts, serialize_alert
 from shop.models import (
     Product, Category, TaxConfiguration, DiscountCoupon, CouponUsage,
     ProductStock, Supplier, ProductSupplier
@@ -30,27 +43,25 @@ class ManagementDashboardView(SuperuserRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
+        # Contadores cacheados, una consulta por familia (ver management.dashboard_stats)
+        stats = get_stats('products', 'suppliers', 'coupons', 'taxes')
+        
         # Estadísticas generales
         context.update({
-            'total_products': Product.objects.count(),
-            'active_products': Product.objects.filter(available=True).count(),
-            'total_suppliers': Supplier.objects.filter(is_active=True).count(),
-            'active_coupons': DiscountCoupon.objects.filter(is_active=True).count(),
-            'tax_configurations': TaxConfiguration.objects.filter(is_active=True).count(),
+            'total_products': stats['products']['total'],
+            'active_products': stats['products']['active'],
+            'total_suppliers': stats['suppliers']['active'],
+            'active_coupons': stats['coupons']['active'],
+            'tax_configurations': stats['taxes']['active'],
             
             # Productos con stock bajo
-            'low_stock_products': Product.objects.filter(stock__lte=10).count(),
+            'low_stock_products': stats['products']['low_stock'],
             
             # Cupones por expirar
-            'expiring_coupons': DiscountCoupon.objects.filter(
-                valid_until__lte=timezone.now() + timedelta(days=7),
-                is_active=True
-            ).count(),
+            'expiring_coupons': stats['coupons']['expiring'],
             
             # Productos sin proveedor principal
-            'products_without_supplier': Product.objects.filter(
-                supplier_info__isnull=True
-            ).count(),
+            'products_without_supplier': stats['products']['without_supplier'],
             
             # Últimos movimientos de stock
             'recent_stock_movements': ProductStock.objects.select_related(
@@ -68,28 +79,19 @@ class APIStatisticsView(SuperuserRequiredMixin, View):
     """Vista API para estadísticas del dashboard"""
     
     def get(self, request):
+        stats = get_stats('products', 'suppliers', 'coupons', 'taxes')
         data = {
-            'total_products': Product.objects.count(),
-            'active_products': Product.objects.filter(available=True).count(),
-            'total_suppliers': Supplier.objects.filter(is_active=True).count(),
-            'active_coupons': DiscountCoupon.objects.filter(is_active=True).count(),
-            'tax_configurations': TaxConfiguration.objects.filter(is_active=True).count(),
-            'low_stock_products': Product.objects.filter(stock__lte=10).count(),
+            'total_products': stats['products']['total'],
+            'active_products': stats['products']['active'],
+            'total_suppliers': stats['suppliers']['active'],
+            'active_coupons': stats['coupons']['active'],
+            'tax_configurations': stats['taxes']['active'],
+            'low_stock_products': stats['products']['low_stock'],
             'timestamp': timezone.now().isoformat(),
         }
         return JsonResponse(data)
 
 
-class StockAlertsView(SuperuserRequiredMixin, ListView):
-    """Vista para productos con stock bajo"""
-    model = Product
-    template_name = 'management/stock/alerts.html'
-    context_object_name = 'low_stock_products'
-    
-    def get_queryset(self):
-        return Product.objects.filter(stock__lte=10).order_by('stock')
-
-
 # ===== GESTIÓN DE IMPUESTOS =====
 
 class TaxManagementView(SuperuserRequiredMixin, ListView):
@@ -433,6 +435,12 @@ class StockReportView(SuperuserRequiredMixin, TemplateView):
     """Reporte de stock"""
     template_name = 'management/stock/report.html'
     
+    def get(self, request, *args, **kwargs):
+        file_format = exports.get_export_format(request.GET.get('format'))
+        if file_format:
+            return exports.export_response(request, ProductStockReportExport(), file_format=file_format)
+        return super().get(request, *args, **kwargs)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
@@ -462,197 +470,66 @@ class StockAlertsView(SuperuserRequiredMixin, TemplateView):
     """Alertas de stock"""
     template_name = 'management/stock/alerts.html'
     
+    def get(self, request, *args, **kwargs):
+        file_format = exports.get_export_format(request.GET.get('format'))
+        if file_format:
+            export = StockAlertsExport(request.GET)
+            return exports.export_response(request, export, export.get_queryset(), file_format)
+        return super().get(request, *args, **kwargs)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Filtros desde la URL
-        alert_type = self.request.GET.get('alert_type', '')
-        category_id = self.request.GET.get('category', '')
-        priority = self.request.GET.get('priority', '')
-        
-        # Productos base con stock
-        products = Product.objects.filter(available=True).select_related('category')
-        
-        # Aplicar filtro por categoría si existe
-        if category_id:
-            products = products.filter(category_id=category_id)
+        # Clasificación, filtros, orden y paginación en la base de datos (ver shop.stock_alerts)
+        result = get_stock_alerts(self.request.GET)
         
-        # Obtener productos críticos, con stock bajo y sin stock
-        critical_stock = products.filter(stock__lte=5, stock__gt=0)
-        low_stock = products.filter(stock__lte=20, stock__gt=5)
-        out_of_stock = products.filter(stock=0)
-        
-        # Crear lista de alertas con información detallada
-        alerts = []
-        
-        # Alertas críticas (stock ≤ 5)
-        for product in critical_stock:
-            alerts.append({
-                'product': product,
-                'type': 'critical',
-                'priority': 'high' if product.stock <= 2 else 'medium',
-                'current_stock': product.stock,
-                'minimum_stock': 5,
-                'recommended_order': max(50, product.stock * 10),
-                'days_out': 0,
-            })
-        
-        # Alertas de stock bajo (stock ≤ 20)
-        for product in low_stock:
-            alerts.append({
-                'product': product,
-                'type': 'low',
-                'priority': 'medium' if product.stock <= 10 else 'low',
-                'current_stock': product.stock,
-                'minimum_stock': 20,
-                'recommended_order': max(30, product.stock * 5),
-                'days_out': 0,
-            })
-        
-        # Alertas sin stock
-        for product in out_of_stock:
-            alerts.append({
-                'product': product,
-                'type': 'out',
-                'priority': 'high',
-                'current_stock': 0,
-                'minimum_stock': 20,
-                'recommended_order': 100,
-                'days_out': 1,  # Esto se podría calcular basado en la última venta
-            })
-        
-        # Aplicar filtros adicionales
-        if alert_type:
-            alerts = [alert for alert in alerts if alert['type'] == alert_type]
-        
-        if priority:
-            alerts = [alert for alert in alerts if alert['priority'] == priority]
-        
-        # Ordenar por prioridad y luego por stock
-        priority_order = {'high': 0, 'medium': 1, 'low': 2}
-        alerts.sort(key=lambda x: (priority_order[x['priority']], x['current_stock']))
-        
-        # Estadísticas
-        critical_alerts = len([a for a in alerts if a['type'] == 'critical'])
-        low_stock_alerts = len([a for a in alerts if a['type'] == 'low'])
-        out_of_stock_alerts = len([a for a in alerts if a['type'] == 'out'])
+        query = self.request.GET.copy()
+        query.pop('page', None)
         
+        context.update(result['statistics'])
         context.update({
-            'alerts': alerts,
-            'critical_alerts': critical_alerts,
-            'low_stock_alerts': low_stock_alerts,
-            'out_of_stock': out_of_stock_alerts,
-            'total_alerts': len(alerts),
+            'alerts': result['alerts'],
+            'page_obj': result['page_obj'],
+            'is_paginated': result['page_obj'].has_other_pages(),
+            'filters': result['filters'],
+            'filter_query': query.urlencode(),
+            'low_stock_factor': LOW_STOCK_FACTOR,
             'categories': Category.objects.all(),
         })
         
         return context
 
 
+def stock_alerts_etag(request, *args, **kwargs):
+    return get_alerts_etag(request.GET)
+
+
+@method_decorator(condition(etag_func=stock_alerts_etag), name='get')
 class StockAlertsAPIView(SuperuserRequiredMixin, View):
-    """API para obtener alertas de stock en tiempo real"""
+    """API para obtener alertas de stock en tiempo real
+    
+    Responde 304 si las alertas no cambiaron desde el ETag que envía el panel.
+    """
     
     def get(self, request, *args, **kwargs):
-        # Filtros desde la URL
-        alert_type = request.GET.get('alert_type', '')
-        category_id = request.GET.get('category', '')
-        priority = request.GET.get('priority', '')
-        
-        # Productos base con stock
-        products = Product.objects.filter(available=True).select_related('category')
-        
-        # Aplicar filtro por categoría si existe
-        if category_id:
-            products = products.filter(category_id=category_id)
-        
-        # Obtener productos críticos, con stock bajo y sin stock
-        critical_stock = products.filter(stock__lte=5, stock__gt=0)
-        low_stock = products.filter(stock__lte=20, stock__gt=5)
-        out_of_stock = products.filter(stock=0)
-        
-        # Crear lista de alertas con información detallada
-        alerts = []
-        
-        # Alertas críticas (stock ≤ 5)
-        for product in critical_stock:
-            alerts.append({
-                'id': product.id,
-                'name': product.name,
-                'sku': f'PRD-{product.id:04d}',  # Crear SKU basado en ID
-                'category': product.category.name if product.category else 'Sin categoría',
-                'image_url': product.image.url if product.image else None,
-                'type': 'critical',
-                'priority': 'high' if product.stock <= 2 else 'medium',
-                'current_stock': product.stock,
-                'minimum_stock': 5,
-                'recommended_order': max(50, product.stock * 10),
-                'days_out': 0,
-                'last_updated': timezone.now().isoformat(),
-            })
-        
-        # Alertas de stock bajo (stock ≤ 20)
-        for product in low_stock:
-            alerts.append({
-                'id': product.id,
-                'name': product.name,
-                'sku': f'PRD-{product.id:04d}',  # Crear SKU basado en ID
-                'category': product.category.name if product.category else 'Sin categoría',
-                'image_url': product.image.url if product.image else None,
-                'type': 'low',
-                'priority': 'medium' if product.stock <= 10 else 'low',
-                'current_stock': product.stock,
-                'minimum_stock': 20,
-                'recommended_order': max(30, product.stock * 5),
-                'days_out': 0,
-                'last_updated': timezone.now().isoformat(),
-            })
-        
-        # Alertas sin stock
-        for product in out_of_stock:
-            alerts.append({
-                'id': product.id,
-                'name': product.name,
-                'sku': f'PRD-{product.id:04d}',  # Crear SKU basado en ID
-                'category': product.category.name if product.category else 'Sin categoría',
-                'image_url': product.image.url if product.image else None,
-                'type': 'out',
-                'priority': 'high',
-                'current_stock': 0,
-                'minimum_stock': 20,
-                'recommended_order': 100,
-                'days_out': 1,
-                'last_updated': timezone.now().isoformat(),
-            })
-        
-        # Aplicar filtros adicionales
-        if alert_type:
-            alerts = [alert for alert in alerts if alert['type'] == alert_type]
-        
-        if priority:
-            alerts = [alert for alert in alerts if alert['priority'] == priority]
-        
-        # Ordenar por prioridad y luego por stock
-        priority_order = {'high': 0, 'medium': 1, 'low': 2}
-        alerts.sort(key=lambda x: (priority_order[x['priority']], x['current_stock']))
+        result = get_stock_alerts(request.GET)
+        page_obj = result['page_obj']
         
-        # Estadísticas
-        critical_alerts = len([a for a in alerts if a['type'] == 'critical'])
-        low_stock_alerts = len([a for a in alerts if a['type'] == 'low'])
-        out_of_stock_alerts = len([a for a in alerts if a['type'] == 'out'])
-        
-        return JsonResponse({
+        response = JsonResponse({
             'success': True,
             'data': {
-                'alerts': alerts,
-                'statistics': {
-                    'critical_alerts': critical_alerts,
-                    'low_stock_alerts': low_stock_alerts,
-                    'out_of_stock': out_of_stock_alerts,
-                    'total_alerts': len(alerts),
+                'alerts': [serialize_alert(alert) for alert in result['alerts']],
+                'statistics': result['statistics'],
+                'pagination': {
+                    'page': page_obj.number,
+                    'num_pages': page_obj.paginator.num_pages,
+                    'per_page': page_obj.paginator.per_page,
                 },
                 'last_updated': timezone.now().isoformat(),
             }
         })
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
 
 
 # ===== RELACIONES PRODUCTO-PROVEEDOR =====
@@ -751,13 +628,52 @@ class ReportsView(SuperuserRequiredMixin, TemplateView):
     template_name = 'management/reports/dashboard.html'
 
 
+def parse_report_date(value, default):
+    """Fecha YYYY-MM-DD de los filtros de reportes, o ``default`` si falta o no es válida"""
+    try:
+        return parse_date(value or '') or default
+    except ValueError:
+        return default
+
+
 class SalesReportView(SuperuserRequiredMixin, TemplateView):
     """Reporte de ventas"""
     template_name = 'management/reports/sales.html'
     
+    def get_filters(self):
+        """(inicio, fin, categoría) desde la URL"""
+        # Por defecto el mes en curso (comparado con el mes anterior)
+        today = timezone.localdate()
+        start = parse_report_date(self.request.GET.get('start_date'), today.replace(day=1))
+        end = parse_report_date(self.request.GET.get('end_date'), today)
+        if start > end:
+            start, end = end, start
+        
+        category = None
+        category_id = self.request.GET.get('category', '')
+        if category_id.isdigit():
+            category = Category.objects.filter(pk=category_id).first()
+        return start, end, category
+    
+    def get(self, request, *args, **kwargs):
+        # CSV/Excel con los pedidos del período filtrado
+        file_format = exports.get_export_format(request.GET.get('format'))
+        if file_format:
+            queryset = get_sales_orders(*self.get_filters())
+            return exports.export_response(request, SalesOrderExport(), queryset, file_format)
+        return super().get(request, *args, **kwargs)
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Aquí agregarías lógica de reportes de ventas cuando tengas el modelo Order
+        start, end, category = self.get_filters()
+        
+        # Desde los resúmenes diarios de ventas (ver orders.analytics)
+        context.update(get_sales_report(start, end, category))
+        context.update({
+            'categories': Category.objects.all(),
+            'start_date': start,
+            'end_date': end,
+        })
         return context
 
 
@@ -799,6 +715,76 @@ class MarginsReportView(SuperuserRequiredMixin, TemplateView):
         return context
 
 
+class MetricsView(SuperuserRequiredMixin, TemplateView):
+    """Métricas de rendimiento por vista (tiempos, consultas SQL, templates)"""
+    template_name = 'management/reports/metrics.html'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        rows = get_view_metrics()
+        
+        context.update({
+            'view_metrics': rows,
+            'total_requests': sum(row['requests'] for row in rows),
+            'total_errors': sum(row['errors'] for row in rows),
+            'slow_request_ms': getattr(settings, 'METRICS_SLOW_REQUEST_MS', None),
+            'flush_seconds': METRICS_FLUSH_SECONDS,
+        })
+        
+        return context
+    
+    def post(self, request):
+        reset_metrics()
+        messages.success(request, '📊 Métricas reiniciadas')
+        return redirect('management:metrics')
+
+
+# ===== EXPORTACIONES =====
+
+class ExportJobListView(SuperuserRequiredMixin, ListView):
+    """Exportaciones generadas en segundo plano"""
+    model = ExportJob
+    template_name = 'management/exports/list.html'
+    context_object_name = 'jobs'
+    paginate_by = 20
+    
+    def get_queryset(self):
+        return ExportJob.objects.select_related('created_by').defer('query')
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['retention_days'] = exports.RETENTION_DAYS
+        return context
+
+
+class ExportJobDetailView(SuperuserRequiredMixin, DetailView):
+    """Estado de una exportación; se recarga sola hasta que está lista"""
+    model = ExportJob
+    template_name = 'management/exports/detail.html'
+    context_object_name = 'job'
+    
+    def get_queryset(self):
+        return ExportJob.objects.select_related('created_by').defer('query')
+
+
+class ExportJobDownloadView(SuperuserRequiredMixin, View):
+    """Descarga del archivo de una exportación lista"""
+    
+    def get(self, request, pk):
+        job = get_object_or_404(ExportJob.objects.defer('query'), pk=pk, status='done')
+        storage = exports.get_storage()
+        if not job.file_name or not storage.exists(job.file_name):
+            raise Http404('El archivo de la exportación ya no está disponible')
+        
+        content_type, extension = exports.FORMATS[job.file_format]
+        return FileResponse(
+            storage.open(job.file_name, 'rb'),
+            as_attachment=True,
+            filename=job.file_name.split('_', 1)[-1],
+            content_type=content_type,
+        )
+
+
 # ===== APIs para AJAX =====
 
 class ProductsAPIView(SuperuserRequiredMixin, View):
@@ -825,12 +811,13 @@ class StatisticsAPIView(SuperuserRequiredMixin, View):
     """API para estadísticas del dashboard"""
     
     def get(self, request):
+        counters = get_stats('products', 'suppliers', 'coupons')
         stats = {
-            'total_products': Product.objects.count(),
-            'active_products': Product.objects.filter(available=True).count(),
-            'total_suppliers': Supplier.objects.filter(is_active=True).count(),
-            'active_coupons': DiscountCoupon.objects.filter(is_active=True).count(),
-            'low_stock_alert': Product.objects.filter(stock__lte=10).count(),
+            'total_products': counters['products']['total'],
+            'active_products': counters['products']['active'],
+            'total_suppliers': counters['suppliers']['active'],
+            'active_coupons': counters['coupons']['active'],
+            'low_stock_alert': counters['products']['low_stock'],
         }
         
         return JsonResponse(stats)
@@ -23,6 +23,9 @@ from .models import (
     NotificationLog,
     NotificationQueue
 )
+from management.dashboard_stats import get_stats
+from management.exports import export_response, get_export_format
+from .exports import NotificationExport, UserPreferenceExport
 from .services import NotificationService
 from .forms import BulkNotificationForm, NotificationTemplateForm
 
@@ -37,16 +40,18 @@ def is_superuser(user):
 def admin_dashboard(request):
     """Dashboard principal de administración de notificaciones"""
     
+    # Contadores cacheados, una consulta por familia (ver management.dashboard_stats)
+    counters = get_stats('notifications', 'users')
+    notification_counts = counters['notifications']
+    
     # Estadísticas generales
     stats = {
-        'total_notifications': Notification.objects.count(),
-        'pending_notifications': Notification.objects.filter(status='pending').count(),
-        'sent_today': Notification.objects.filter(
-            sent_at__date=timezone.now().date()
-        ).count(),
-        'failed_notifications': Notification.objects.filter(status='failed').count(),
-        'total_users': User.objects.count(),
-        'users_with_preferences': UserNotificationPreference.objects.values('user').distinct().count(),
+        'total_notifications': notification_counts['total'],
+        'pending_notifications': notification_counts['pending'],
+        'sent_today': notification_counts['sent_today'],
+        'failed_notifications': notification_counts['failed'],
+        'total_users': counters['users']['total'],
+        'users_with_preferences': counters['users']['with_notification_preferences'],
     }
     
     # Notificaciones recientes
@@ -58,17 +63,10 @@ def admin_dashboard(request):
     ).order_by('-count')
     
     # Notificaciones por día (últimos 7 días)
-    seven_days_ago = timezone.now() - timedelta(days=7)
-    daily_stats = []
-    for i in range(7):
-        date = seven_days_ago + timedelta(days=i)
-        count = Notification.objects.filter(
-            created_at__date=date.date()
-        ).count()
-        daily_stats.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'count': count
-        })
+    daily_stats = [
+        {'date': day.strftime('%Y-%m-%d'), 'count': count}
+        for day, count in notification_counts['daily']
+    ]
     
     context = {
         'stats': stats,
@@ -350,35 +348,9 @@ def clear_old_logs(request):
 @login_required
 @user_passes_test(is_superuser)
 def export_notifications(request):
-    """Exportar notificaciones a CSV"""
-    
-    import csv
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="notificaciones.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'ID', 'Usuario', 'Tipo', 'Canal', 'Estado', 
-        'Fecha Creación', 'Fecha Envío', 'Mensaje'
-    ])
-    
-    notifications = Notification.objects.select_related('user').order_by('-created_at')
-    
-    for notification in notifications:
-        writer.writerow([
-            notification.id,
-            notification.user.username if notification.user else 'N/A',
-            notification.get_notification_type_display(),
-            notification.get_channel_display(),
-            notification.get_status_display(),
-            notification.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            notification.sent_at.strftime('%Y-%m-%d %H:%M:%S') if notification.sent_at else 'N/A',
-            notification.message[:100] + '...' if len(notification.message) > 100 else notification.message
-        ])
-    
-    return response
+    """Exportar notificaciones a CSV (o Excel con ?format=xlsx)"""
+    file_format = get_export_format(request.GET.get('format'), 'csv')
+    return export_response(request, NotificationExport(), file_format=file_format)
 
 
 @login_required
@@ -493,36 +465,9 @@ def user_preference_detail(request, user_id):
 @login_required
 @user_passes_test(is_superuser)
 def export_user_preferences(request):
-    """Exportar preferencias de usuarios a CSV"""
-    import csv
-    from django.http import HttpResponse
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="preferencias_usuarios.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow([
-        'Usuario', 'Email', 'Email Habilitado', 'SMS Habilitado', 
-        'WhatsApp Habilitado', 'Push Habilitado', 'Teléfono', 'WhatsApp',
-        'Fecha Registro'
-    ])
-    
-    preferences = UserNotificationPreference.objects.select_related('user').all()
-    
-    for pref in preferences:
-        writer.writerow([
-            pref.user.username,
-            pref.user.email,
-            'Sí' if pref.email_enabled else 'No',
-            'Sí' if pref.sms_enabled else 'No',
-            'Sí' if pref.whatsapp_enabled else 'No',
-            'Sí' if pref.push_enabled else 'No',
-            pref.phone_number or 'N/A',
-            pref.whatsapp_number or 'N/A',
-            pref.created_at.strftime('%Y-%m-%d') if pref.created_at else 'N/A'
-        ])
-    
-    return response
+    """Exportar preferencias de usuarios a CSV (o Excel con ?format=xlsx)"""
+    file_format = get_export_format(request.GET.get('format'), 'csv')
+    return export_response(request, UserPreferenceExport(), file_format=file_format)
 
 
 @login_required
@@ -719,23 +664,17 @@ def reports(request):
 def api_dashboard_stats(request):
     """API para estadísticas del dashboard"""
     from django.http import JsonResponse
-    from datetime import datetime, timedelta
     
-    today = datetime.now().date()
+    counters = get_stats('notifications', 'users', 'notification_templates')
+    notification_counts = counters['notifications']
     
     stats = {
-        'total_notifications': Notification.objects.count(),
-        'sent_today': Notification.objects.filter(
-            created_at__date=today, 
-            status='sent'
-        ).count(),
-        'failed_today': Notification.objects.filter(
-            created_at__date=today, 
-            status='failed'
-        ).count(),
-        'pending': Notification.objects.filter(status='pending').count(),
-        'total_users': User.objects.count(),
-        'active_templates': NotificationTemplate.objects.filter(is_active=True).count()
+        'total_notifications': notification_counts['total'],
+        'sent_today': notification_counts['created_sent_today'],
+        'failed_today': notification_counts['created_failed_today'],
+        'pending': notification_counts['pending'],
+        'total_users': counters['users']['total'],
+        'active_templates': counters['notification_templates']['active']
     }
     
     return JsonResponse(stats)
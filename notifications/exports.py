@@ -0,0 +1,87 @@
+"""
+Exportaciones CSV/XLSX del panel de notificaciones (ver ``management.exports``)
+"""
+from django.db.models.functions import Left
+
+from management.exports import Export
+
+from .models import Notification, NotificationChannel, NotificationStatus, NotificationType, UserNotificationPreference
+
+MESSAGE_PREVIEW_LENGTH = 100
+
+
+def yes_no(value):
+    return 'Sí' if value else 'No'
+
+
+class NotificationExport(Export):
+    title = 'Notificaciones'
+    filename = 'notificaciones'
+    columns = [
+        ('ID', 'id'),
+        ('Usuario', 'user__username'),
+        ('Tipo', 'notification_type'),
+        ('Canal', 'channel'),
+        ('Estado', 'status'),
+        ('Fecha Creación', 'created_at'),
+        ('Fecha Envío', 'sent_at'),
+        ('Mensaje', 'message_preview'),
+    ]
+
+    TYPES = dict(NotificationType.choices)
+    CHANNELS = dict(NotificationChannel.choices)
+    STATUSES = dict(NotificationStatus.choices)
+
+    def get_queryset(self):
+        return Notification.objects.order_by('-created_at')
+
+    def project(self, queryset):
+        # Solo el comienzo del mensaje, sin leer los textos completos
+        return super().project(queryset.annotate(message_preview=Left('message', MESSAGE_PREVIEW_LENGTH + 1)))
+
+    def format_row(self, row):
+        message = row['message_preview']
+        if len(message) > MESSAGE_PREVIEW_LENGTH:
+            message = message[:MESSAGE_PREVIEW_LENGTH] + '...'
+        return [
+            row['id'],
+            row['user__username'] or 'N/A',
+            self.TYPES.get(row['notification_type'], row['notification_type']),
+            self.CHANNELS.get(row['channel'], row['channel']),
+            self.STATUSES.get(row['status'], row['status']),
+            row['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
+            row['sent_at'].strftime('%Y-%m-%d %H:%M:%S') if row['sent_at'] else 'N/A',
+            message,
+        ]
+
+
+class UserPreferenceExport(Export):
+    title = 'Preferencias de usuarios'
+    filename = 'preferencias_usuarios'
+    columns = [
+        ('Usuario', 'user__username'),
+        ('Email', 'user__email'),
+        ('Email Habilitado', 'email_enabled'),
+        ('SMS Habilitado', 'sms_enabled'),
+        ('WhatsApp Habilitado', 'whatsapp_enabled'),
+        ('Push Habilitado', 'push_enabled'),
+        ('Teléfono', 'phone_number'),
+        ('WhatsApp', 'whatsapp_number'),
+        ('Fecha Registro', 'created_at'),
+    ]
+
+    def get_queryset(self):
+        return UserNotificationPreference.objects.order_by('user__username')
+
+    def format_row(self, row):
+        return [
+            row['user__username'],
+            row['user__email'],
+            yes_no(row['email_enabled']),
+            yes_no(row['sms_enabled']),
+            yes_no(row['whatsapp_enabled']),
+            yes_no(row['push_enabled']),
+            row['phone_number'] or 'N/A',
+            row['whatsapp_number'] or 'N/A',
+            row['created_at'].strftime('%Y-%m-%d') if row['created_at'] else 'N/A',
+        ]
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+
+from notifications.worker import NotificationQueueWorker
+
+
+class Command(BaseCommand):
+    help = 'Enviar las notificaciones encoladas (worker para cuando Celery no está configurado)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Cantidad máxima de notificaciones reservadas por lote'
+        )
+        parser.add_argument(
+            '--lease',
+            type=int,
+            default=None,
+            help='Segundos de reserva de cada lote antes de que otro worker lo pueda tomar'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Detenerse después de procesar esta cantidad de lotes'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Seguir procesando la cola indefinidamente'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Segundos de espera cuando la cola está vacía (con --loop)'
+        )
+
+    def handle(self, *args, **options):
+        worker = NotificationQueueWorker(
+            batch_size=options['batch_size'],
+            lease_seconds=options['lease']
+        )
+        self.stdout.write(f"📨 Worker {worker.worker_id} procesando la cola de notificaciones...")
+
+        try:
+            stats = worker.run(
+                loop=options['loop'],
+                interval=options['interval'],
+                max_batches=options['max_batches']
+            )
+        except KeyboardInterrupt:
+            stats = worker.stats
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'✅ Cola procesada: {stats.sent} enviadas, {stats.failed} fallidas, '
+                f'{stats.retried} reprogramadas en {stats.batches} lotes ({stats.per_second:.1f}/s)'
+            )
+        )
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_add_subject_field'),
+        ('notifications', '0003_fix_missing_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationqueue',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Reservado hasta'),
+        ),
+        migrations.AddField(
+            model_name='notificationqueue',
+            name='locked_by',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Reservado por'),
+        ),
+    ]
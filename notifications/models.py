@@ -226,6 +226,10 @@ class NotificationQueue(models.Model):
     processed = models.BooleanField(default=False, verbose_name="Procesado")
     processed_at = models.DateTimeField(null=True, blank=True, verbose_name="Procesado en")
     
+    # Reserva del worker que la está procesando; vencida, otro worker la puede tomar
+    locked_until = models.DateTimeField(null=True, blank=True, verbose_name="Reservado hasta")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="Reservado por")
+    
     class Meta:
         verbose_name = "Cola de Notificación"
         verbose_name_plural = "Cola de Notificaciones"
@@ -3,14 +3,18 @@ Servicios de notificación para Email, SMS y WhatsApp
 """
 import smtplib
 import logging
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.db import transaction
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
 from django.utils import timezone
-from .models import Notification, NotificationStatus, NotificationLog
-from typing import Dict, Any, Optional
+from .models import Notification, NotificationStatus, NotificationLog, NotificationQueue
+from .transport import TransportError, get_transport, send_twilio_message
+from typing import Dict, Any, Optional, Tuple
 
 # Importaciones opcionales
 try:
@@ -20,13 +24,6 @@ except ImportError:
     HAS_REQUESTS = False
     requests = None
 
-try:
-    from twilio.rest import Client as TwilioClient
-    HAS_TWILIO = True
-except ImportError:
-    HAS_TWILIO = False
-    TwilioClient = None
-
 logger = logging.getLogger(__name__)
 
 
@@ -64,6 +61,61 @@ class NotificationService:
             self._log_notification(notification, "ERROR", str(e))
             return False
     
+    def deliver_batch(self, notifications) -> Dict[Any, Tuple[bool, str]]:
+        """
+        Enviar un lote sin tocar la base de datos.
+        
+        Agrupa por canal y usa ``send_batch`` de cada proveedor (el email usa
+        una sola conexión SMTP por lote). Retorna {notification.id: (éxito, error)}.
+        """
+        by_channel = {}
+        for notification in notifications:
+            by_channel.setdefault(notification.channel, []).append(notification)
+        
+        results = {}
+        for channel, channel_notifications in by_channel.items():
+            service = self.providers.get(channel)
+            if not service:
+                for notification in channel_notifications:
+                    results[notification.id] = (False, f"Canal no soportado: {channel}")
+                continue
+            results.update(service.send_batch(channel_notifications))
+        return results
+    
+    def record_results(self, notifications, results: Dict[Any, Tuple[bool, str]]) -> None:
+        """Guardar en lote el resultado de cada notificación y su log"""
+        now = timezone.now()
+        logs = []
+        
+        for notification in notifications:
+            success, error = results.get(notification.id, (False, "Sin resultado"))
+            if success:
+                notification.status = NotificationStatus.SENT
+                notification.sent_at = now
+                logs.append(NotificationLog(
+                    notification=notification,
+                    action="SENT",
+                    details="Notificación enviada exitosamente"
+                ))
+            else:
+                notification.status = NotificationStatus.FAILED
+                notification.error_message = error
+                notification.retry_count += 1
+                logs.append(NotificationLog(notification=notification, action="FAILED", details=error))
+        
+        with transaction.atomic():
+            Notification.objects.bulk_update(
+                notifications, ['status', 'sent_at', 'error_message', 'retry_count', 'external_id']
+            )
+            NotificationLog.objects.bulk_create(logs)
+    
+    def send_batch(self, notifications) -> Dict[Any, bool]:
+        """Enviar un lote de notificaciones ya guardadas y registrar sus resultados"""
+        notifications = list(notifications)
+        results = self.deliver_batch(notifications)
+        self.record_results(notifications, results)
+        return {notification_id: success for notification_id, (success, error) in results.items()}
+    
     def _log_notification(self, notification: Notification, action: str, details: str):
         """Registrar actividad de notificación"""
         NotificationLog.objects.create(
@@ -73,46 +125,57 @@ class NotificationService:
         )
 
 
-class EmailService:
-    """Servicio de notificaciones por Email"""
+class ChannelService:
+    """Base de los proveedores: ``send_batch`` por defecto envía uno por uno"""
     
     def send(self, notification: Notification) -> bool:
-        """Enviar email"""
+        raise NotImplementedError
+    
+    def _send_with_result(self, notification: Notification) -> Tuple[bool, str]:
         try:
-            # Usar el sistema de email de Django
-            send_mail(
-                subject=notification.subject,
-                message=notification.message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[notification.recipient_email],
-                fail_silently=False,
-                html_message=self._render_html_template(notification)
-            )
-            return True
-            
+            success = self.send(notification)
+            return success, "" if success else "Error en el envío"
         except Exception as e:
-            logger.error(f"Error enviando email: {str(e)}")
-            return False
+            return False, str(e)
     
-    def _render_html_template(self, notification: Notification) -> str:
-        """Renderizar template HTML para email"""
+    def send_batch(self, notifications) -> Dict[Any, Tuple[bool, str]]:
+        """Retorna {notification.id: (éxito, error)}"""
+        return {
+            notification.id: self._send_with_result(notification)
+            for notification in notifications
+        }
+
+
+class HTTPChannelService(ChannelService):
+    """
+    Proveedor HTTP: ``send_batch`` envía en paralelo por el transporte del canal
+    (sesión persistente, concurrencia acotada y límite de envíos por segundo)
+    """
+    transport_name = None
+    
+    def send_batch(self, notifications) -> Dict[Any, Tuple[bool, str]]:
+        notifications = list(notifications)
         try:
-            template_name = f"notifications/email/{notification.notification_type}.html"
-            context = {
-                'user': notification.user,
-                'subject': notification.subject,
-                'message': notification.message,
-                'extra_data': notification.extra_data,
-                'notification': notification,
-            }
-            return render_to_string(template_name, context)
-        except:
-            # Fallback a template genérico
-            return f"""
+            transport = get_transport(self.transport_name)
+        except TransportError:
+            return super().send_batch(notifications)
+        
+        results = transport.map(self._send_with_result, notifications)
+        return {
+            notification.id: result
+            for notification, result in zip(notifications, results)
+        }
+
+
+# Templates HTML de email compilados, por tipo de notificación (None = usar el genérico)
+_email_templates = {}
+_email_templates_lock = threading.Lock()
+
+FALLBACK_EMAIL_HTML = """
             <html>
                 <body>
-                    <h2>{notification.subject}</h2>
-                    <p>{notification.message}</p>
+                    <h2>{subject}</h2>
+                    <p>{message}</p>
                     <hr>
                     <p><small>Galletas Kati - Las más deliciosas de Chile</small></p>
                 </body>
@@ -120,8 +183,111 @@ class EmailService:
             """
 
 
-class SMSService:
+def get_email_template(notification_type: str):
+    """Retorna el template compilado del tipo de notificación (cacheado por proceso)"""
+    try:
+        return _email_templates[notification_type]
+    except KeyError:
+        pass
+    
+    with _email_templates_lock:
+        if notification_type not in _email_templates:
+            try:
+                template = get_template(f"notifications/email/{notification_type}.html")
+            except TemplateDoesNotExist:
+                template = None
+            except Exception as e:
+                logger.error(f"Error compilando template de email {notification_type}: {str(e)}")
+                template = None
+            _email_templates[notification_type] = template
+    return _email_templates[notification_type]
+
+
+class EmailService(ChannelService):
+    """Servicio de notificaciones por Email"""
+    
+    def send(self, notification: Notification) -> bool:
+        """Enviar email"""
+        success, error = self.send_batch([notification])[notification.id]
+        return success
+    
+    def send_batch(self, notifications) -> Dict[Any, Tuple[bool, str]]:
+        """
+        Enviar varios emails por una sola conexión SMTP.
+        
+        Cada mensaje se envía por separado sobre la conexión abierta para
+        poder informar el resultado de cada notificación.
+        """
+        results = {}
+        messages = []
+        for notification in notifications:
+            try:
+                messages.append((notification, self._build_message(notification)))
+            except Exception as e:
+                logger.error(f"Error preparando email {notification.id}: {str(e)}")
+                results[notification.id] = (False, str(e))
+        
+        if not messages:
+            return results
+        
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Error abriendo conexión de email: {str(e)}")
+            for notification, message in messages:
+                results[notification.id] = (False, str(e))
+            return results
+        
+        try:
+            for notification, message in messages:
+                try:
+                    sent = connection.send_messages([message])
+                    results[notification.id] = (bool(sent), "" if sent else "Email no enviado")
+                except Exception as e:
+                    logger.error(f"Error enviando email: {str(e)}")
+                    results[notification.id] = (False, str(e))
+        finally:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        
+        return results
+    
+    def _build_message(self, notification: Notification) -> EmailMultiAlternatives:
+        message = EmailMultiAlternatives(
+            subject=notification.subject,
+            body=notification.message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[notification.recipient_email],
+        )
+        message.attach_alternative(self._render_html_template(notification), 'text/html')
+        return message
+    
+    def _render_html_template(self, notification: Notification) -> str:
+        """Renderizar template HTML para email"""
+        template = get_email_template(notification.notification_type)
+        if template is not None:
+            try:
+                context = {
+                    'user': notification.user,
+                    'subject': notification.subject,
+                    'message': notification.message,
+                    'extra_data': notification.extra_data,
+                    'notification': notification,
+                }
+                return template.render(context)
+            except Exception as e:
+                logger.error(f"Error renderizando template {notification.notification_type}: {str(e)}")
+        
+        # Fallback a template genérico
+        return FALLBACK_EMAIL_HTML.format(subject=notification.subject, message=notification.message)
+
+
+class SMSService(HTTPChannelService):
     """Servicio de notificaciones por SMS"""
+    transport_name = 'sms'
     
     def __init__(self):
         # Configuración para Twilio (ejemplo)
@@ -150,22 +316,15 @@ class SMSService:
     
     def _send_via_twilio(self, notification: Notification) -> bool:
         """Enviar SMS usando Twilio"""
-        if not HAS_TWILIO:
-            logger.warning("Twilio no instalado. Instalar: pip install twilio")
-            return False
-            
         try:
-            from twilio.rest import Client
-            
-            client = Client(self.account_sid, self.auth_token)
-            
-            message = client.messages.create(
-                body=notification.message,
+            notification.external_id = send_twilio_message(
+                get_transport('sms'),
+                self.account_sid,
+                self.auth_token,
                 from_=self.from_number,
-                to=notification.recipient_phone
+                to=notification.recipient_phone,
+                body=notification.message
             )
-            
-            notification.external_id = message.sid
             return True
             
         except Exception as e:
@@ -181,7 +340,7 @@ class SMSService:
                 'api_key': self.sms_api_key
             }
             
-            response = requests.post(self.sms_api_url, json=payload, timeout=30)
+            response = get_transport('sms').post(self.sms_api_url, json=payload)
             
             if response.status_code == 200:
                 result = response.json()
@@ -203,8 +362,9 @@ class SMSService:
         return True
 
 
-class WhatsAppService:
+class WhatsAppService(HTTPChannelService):
     """Servicio de notificaciones por WhatsApp"""
+    transport_name = 'whatsapp'
     
     def __init__(self):
         # Configuración para WhatsApp Business API
@@ -232,25 +392,15 @@ class WhatsAppService:
     
     def _send_via_twilio_whatsapp(self, notification: Notification) -> bool:
         """Enviar WhatsApp usando Twilio"""
-        if not HAS_TWILIO:
-            logger.warning("Twilio no instalado. Instalar: pip install twilio")
-            return False
-            
         try:
-            from twilio.rest import Client
-            
-            client = Client(
+            notification.external_id = send_twilio_message(
+                get_transport('whatsapp'),
                 getattr(settings, 'TWILIO_ACCOUNT_SID', ''),
-                getattr(settings, 'TWILIO_AUTH_TOKEN', '')
-            )
-            
-            message = client.messages.create(
-                body=notification.message,
+                getattr(settings, 'TWILIO_AUTH_TOKEN', ''),
                 from_=f'whatsapp:{self.from_number}',
-                to=f'whatsapp:{notification.recipient_phone}'
+                to=f'whatsapp:{notification.recipient_phone}',
+                body=notification.message
             )
-            
-            notification.external_id = message.sid
             return True
             
         except Exception as e:
@@ -277,11 +427,10 @@ class WhatsAppService:
                 }
             }
             
-            response = requests.post(
+            response = get_transport('whatsapp').post(
                 f"{self.api_url}/messages",
                 headers=headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             if response.status_code == 200:
@@ -306,13 +455,17 @@ class WhatsAppService:
     @staticmethod
     def test_configuration():
         """Probar la configuración del sistema"""
+        # SMS y WhatsApp (Twilio o API propia) van por HTTP: requieren requests y credenciales
+        sms = SMSService()
+        whatsapp = WhatsAppService()
         results = {
             'email': True,  # Email siempre disponible con Django
-            'sms': HAS_TWILIO or HAS_REQUESTS,
-            'whatsapp': HAS_TWILIO or HAS_REQUESTS,
+            'sms': HAS_REQUESTS and bool((sms.account_sid and sms.auth_token) or sms.sms_api_url),
+            'whatsapp': HAS_REQUESTS and bool(
+                (whatsapp.twilio_whatsapp and sms.account_sid and sms.auth_token) or whatsapp.api_url
+            ),
             'dependencies': {
                 'requests': HAS_REQUESTS,
-                'twilio': HAS_TWILIO,
             }
         }
         
@@ -321,7 +474,6 @@ class WhatsAppService:
         logger.info(f"  📱 SMS: {'✅' if results['sms'] else '❌'}")
         logger.info(f"  💚 WhatsApp: {'✅' if results['whatsapp'] else '❌'}")
         logger.info(f"  📦 Requests: {'✅' if HAS_REQUESTS else '❌'}")
-        logger.info(f"  📞 Twilio: {'✅' if HAS_TWILIO else '❌'}")
         
         return results
 
@@ -330,7 +482,7 @@ class NotificationFactory:
     """Factory para crear notificaciones"""
     
     @staticmethod
-    def create_notification(
+    def build_notification(
         user,
         notification_type: str,
         channel: str,
@@ -340,7 +492,7 @@ class NotificationFactory:
         recipient_email: str = "",
         recipient_phone: str = ""
     ) -> Notification:
-        """Crear una nueva notificación"""
+        """Construir una notificación sin guardarla (para crearlas en lote)"""
         
         # Usar datos del usuario si no se proporcionan
         if not recipient_email and hasattr(user, 'email'):
@@ -350,7 +502,7 @@ class NotificationFactory:
             prefs = user.notification_preferences
             recipient_phone = prefs.phone_number if channel == 'sms' else prefs.whatsapp_number
         
-        notification = Notification.objects.create(
+        return Notification(
             user=user,
             notification_type=notification_type,
             channel=channel,
@@ -360,9 +512,48 @@ class NotificationFactory:
             recipient_phone=recipient_phone,
             extra_data=extra_data or {}
         )
-        
+    
+    @staticmethod
+    def create_notification(
+        user,
+        notification_type: str,
+        channel: str,
+        subject: str,
+        message: str,
+        extra_data: Optional[Dict[str, Any]] = None,
+        recipient_email: str = "",
+        recipient_phone: str = ""
+    ) -> Notification:
+        """Crear una nueva notificación"""
+        notification = NotificationFactory.build_notification(
+            user=user,
+            notification_type=notification_type,
+            channel=channel,
+            subject=subject,
+            message=message,
+            extra_data=extra_data,
+            recipient_email=recipient_email,
+            recipient_phone=recipient_phone
+        )
+        notification.save()
         return notification
     
+    @staticmethod
+    def queue_notifications(notifications, priority: int = 5) -> list:
+        """
+        Guardar un lote de notificaciones y encolarlas sin enviarlas.
+        
+        Usa dos ``bulk_create`` (notificaciones y entradas de cola) sin importar
+        el tamaño del lote; el envío queda a cargo del procesamiento de la cola.
+        """
+        with transaction.atomic():
+            notifications = Notification.objects.bulk_create(notifications)
+            NotificationQueue.objects.bulk_create([
+                NotificationQueue(notification=notification, priority=priority)
+                for notification in notifications
+            ])
+        return notifications
+    
     @staticmethod
     def send_multi_channel_notification(
         user,
@@ -399,3 +590,83 @@ class NotificationFactory:
                 results[channel] = False
         
         return results
+    
+    @staticmethod
+    def dispatch_multi_channel_notification(
+        user,
+        notification_type: str,
+        subject: str,
+        message: str,
+        channels: list = None,
+        extra_data: Optional[Dict[str, Any]] = None,
+        priority: int = 5
+    ) -> None:
+        """
+        Despachar notificación por múltiples canales fuera del request.
+        
+        En modo 'queue' (por defecto) solo se guardan las filas de
+        ``Notification`` y ``NotificationQueue`` después del commit; el envío
+        lo hace un worker (Celery o ``manage.py process_notifications``).
+        En modo 'sync' se envía directamente, también después del commit.
+        """
+        if channels is None:
+            channels = ['email']  # Por defecto solo email
+        
+        def dispatch():
+            if get_dispatch_mode() == 'sync':
+                NotificationFactory.send_multi_channel_notification(
+                    user=user,
+                    notification_type=notification_type,
+                    subject=subject,
+                    message=message,
+                    channels=channels,
+                    extra_data=extra_data
+                )
+                return
+            
+            try:
+                NotificationFactory.queue_notifications([
+                    NotificationFactory.build_notification(
+                        user=user,
+                        notification_type=notification_type,
+                        channel=channel,
+                        subject=subject,
+                        message=message,
+                        extra_data=extra_data
+                    )
+                    for channel in channels
+                ], priority=priority)
+            except Exception as e:
+                logger.error(f"Error encolando notificación {notification_type}: {str(e)}")
+                return
+            
+            wake_up_notification_worker()
+        
+        transaction.on_commit(dispatch)
+
+
+def get_dispatch_mode() -> str:
+    """Modo de despacho de notificaciones: 'queue' (por defecto) o 'sync'"""
+    return getattr(settings, 'NOTIFICATION_DISPATCH_MODE', 'queue')
+
+
+def celery_is_configured() -> bool:
+    """Indica si hay un broker de Celery configurado para este proyecto"""
+    return bool(getattr(settings, 'CELERY_BROKER_URL', None))
+
+
+def wake_up_notification_worker() -> None:
+    """
+    Pedir a Celery que procese la cola ahora (si está configurado).
+    
+    Sin Celery la cola la drena ``manage.py process_notifications``.
+    """
+    if not celery_is_configured():
+        return
+    try:
+        from .tasks import process_notification_queue
+        process_notification_queue.delay()
+    except Exception as e:
+        # Si el broker no responde, el worker periódico procesará la cola
+        logger.warning(f"No se pudo avisar al worker de notificaciones: {str(e)}")
+
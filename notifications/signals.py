@@ -1,6 +1,7 @@
 """
 Signals para automatizar notificaciones en eventos del sistema
 """
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
@@ -37,23 +38,28 @@ try:
     def send_order_notifications(sender, instance, created, **kwargs):
         """Enviar notificaciones cuando se crea o actualiza una orden"""
         if created:
-            # Nueva orden creada
-            NotificationFactory.send_multi_channel_notification(
-                user=instance.user,
-                notification_type='order_confirmation',
-                subject=f'Confirmación de Pedido #{instance.id}',
-                message=f'Hola {instance.user.first_name}, tu pedido #{instance.id} ha sido confirmado. Total: ${instance.total}',
-                channels=['email', 'sms'],
-                extra_data={
-                    'order_id': instance.id,
-                    'total': str(instance.total),
-                    'items_count': instance.items.count()
-                }
-            )
+            # Nueva orden creada: despachar después del commit, cuando los items ya existen.
+            # En modo 'queue' (por defecto) solo se encolan y el envío lo hace el
+            # worker de notificaciones, no el checkout
+            def notify_order_created():
+                NotificationFactory.dispatch_multi_channel_notification(
+                    user=instance.user,
+                    notification_type='order_confirmation',
+                    subject=f'Confirmación de Pedido #{instance.id}',
+                    message=f'Hola {instance.user.first_name}, tu pedido #{instance.id} ha sido confirmado. Total: ${instance.total}',
+                    channels=['email', 'sms'],
+                    extra_data={
+                        'order_id': instance.id,
+                        'total': str(instance.total),
+                        'items_count': instance.items.count()
+                    }
+                )
+            
+            transaction.on_commit(notify_order_created)
         else:
-            # Orden actualizada
-            if hasattr(instance, '_state') and instance._state.fields_cache.get('status') != instance.status:
-                NotificationFactory.send_multi_channel_notification(
+            # Orden actualizada (Order.save registra los cambios de estado en last_field_changes)
+            if 'status' in getattr(instance, 'last_field_changes', {}):
+                NotificationFactory.dispatch_multi_channel_notification(
                     user=instance.user,
                     notification_type='order_update',
                     subject=f'Actualización de Pedido #{instance.id}',
@@ -78,7 +84,7 @@ try:
         """Enviar notificaciones para tickets de soporte"""
         if created:
             # Nuevo ticket creado
-            NotificationFactory.send_multi_channel_notification(
+            NotificationFactory.dispatch_multi_channel_notification(
                 user=instance.user,
                 notification_type='support_ticket',
                 subject=f'Ticket de Soporte #{instance.ticket_number} Creado',
@@ -93,7 +99,7 @@ try:
         else:
             # Ticket actualizado
             if hasattr(instance, '_state') and instance._state.fields_cache.get('status') != instance.status:
-                NotificationFactory.send_multi_channel_notification(
+                NotificationFactory.dispatch_multi_channel_notification(
                     user=instance.user,
                     notification_type='support_ticket',
                     subject=f'Actualización Ticket #{instance.ticket_number}',
@@ -113,28 +119,39 @@ except ImportError:
 # Signals para alertas de stock
 try:
     from shop.models import Product
+    from shop.stock import stock_changed
+    
+    def notify_critical_stock(product):
+        """Notificar a administradores que un producto tiene stock crítico"""
+        admin_users = User.objects.filter(is_superuser=True)
+        
+        for admin in admin_users:
+            NotificationFactory.dispatch_multi_channel_notification(
+                user=admin,
+                notification_type='stock_alert',
+                subject=f'⚠️ Stock Crítico: {product.name}',
+                message=f'ALERTA: El producto "{product.name}" tiene solo {product.stock} unidades en stock.',
+                channels=['email', 'whatsapp'],
+                extra_data={
+                    'product_id': product.id,
+                    'product_name': product.name,
+                    'current_stock': product.stock,
+                    'category': product.category.name if product.category else 'Sin categoría'
+                }
+            )
     
     @receiver(post_save, sender=Product)
     def send_stock_alerts(sender, instance, created, **kwargs):
         """Enviar alertas cuando el stock está bajo"""
         if not created and instance.stock <= 5:  # Stock crítico
-            # Notificar a administradores
-            admin_users = User.objects.filter(is_superuser=True)
-            
-            for admin in admin_users:
-                NotificationFactory.send_multi_channel_notification(
-                    user=admin,
-                    notification_type='stock_alert',
-                    subject=f'⚠️ Stock Crítico: {instance.name}',
-                    message=f'ALERTA: El producto "{instance.name}" tiene solo {instance.stock} unidades en stock.',
-                    channels=['email', 'whatsapp'],
-                    extra_data={
-                        'product_id': instance.id,
-                        'product_name': instance.name,
-                        'current_stock': instance.stock,
-                        'category': instance.category.name if instance.category else 'Sin categoría'
-                    }
-                )
+            notify_critical_stock(instance)
+    
+    @receiver(stock_changed)
+    def send_stock_alerts_on_stock_change(sender, products, **kwargs):
+        """Enviar alertas cuando una reserva o devolución de pedidos deja stock crítico"""
+        for product in products:
+            if product.stock <= 5:  # Stock crítico
+                notify_critical_stock(product)
                 
 except ImportError:
     logger.info("Modelo Product no disponible - signals de stock deshabilitados")
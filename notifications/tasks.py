@@ -3,8 +3,9 @@ Tareas asíncronas para envío de notificaciones usando Celery
 """
 from celery import shared_task
 from django.contrib.auth.models import User
-from .models import Notification, NotificationQueue
+from .models import Notification
 from .services import NotificationService, NotificationFactory
+from .worker import NotificationQueueWorker
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,31 +34,40 @@ def send_notification_task(self, notification_id):
 
 
 @shared_task
-def process_notification_queue():
-    """Procesar cola de notificaciones pendientes"""
-    pending_notifications = NotificationQueue.objects.filter(
-        processed=False
-    ).order_by('priority', 'scheduled_at')[:50]  # Procesar hasta 50 por vez
+def process_notification_queue(batch_size=None, max_batches=10):
+    """Procesar cola de notificaciones pendientes (reserva lotes y envía en este worker)"""
+    worker = NotificationQueueWorker(batch_size=batch_size)
+    stats = worker.run(max_batches=max_batches)
+    return stats.as_dict()
+
+
+# Notificaciones guardadas y enviadas por lote en los envíos masivos
+BULK_SEND_BATCH_SIZE = 200
+
+
+def send_notifications_in_batches(notifications, batch_size=BULK_SEND_BATCH_SIZE):
+    """
+    Guardar y enviar notificaciones por lotes.
     
-    processed_count = 0
+    Cada lote se crea con ``bulk_create`` y se envía con
+    ``NotificationService.send_batch`` (una conexión SMTP por lote).
+    Retorna los ids de usuarios con al menos un envío exitoso.
+    """
+    service = NotificationService()
+    successful_users = set()
     
-    for queue_item in pending_notifications:
+    for start in range(0, len(notifications), batch_size):
+        batch = Notification.objects.bulk_create(notifications[start:start + batch_size])
         try:
-            # Enviar notificación
-            send_notification_task.delay(queue_item.notification.id)
-            
-            # Marcar como procesado
-            queue_item.processed = True
-            queue_item.processed_at = timezone.now()
-            queue_item.save()
-            
-            processed_count += 1
-            
+            results = service.send_batch(batch)
         except Exception as e:
-            logger.error(f"Error procesando cola {queue_item.id}: {str(e)}")
+            logger.error(f"Error enviando lote de notificaciones: {str(e)}")
+            continue
+        successful_users.update(
+            notification.user_id for notification in batch if results.get(notification.id)
+        )
     
-    logger.info(f"Procesadas {processed_count} notificaciones de la cola")
-    return processed_count
+    return successful_users
 
 
 @shared_task
@@ -66,24 +76,20 @@ def send_bulk_notification(user_ids, notification_type, subject, message, channe
     if channels is None:
         channels = ['email']
     
-    users = User.objects.filter(id__in=user_ids)
-    sent_count = 0
+    users = User.objects.filter(id__in=user_ids).select_related('notification_preferences')
     
-    for user in users:
-        try:
-            results = NotificationFactory.send_multi_channel_notification(
-                user=user,
-                notification_type=notification_type,
-                subject=subject,
-                message=message,
-                channels=channels
-            )
-            
-            if any(results.values()):  # Si al menos un canal fue exitoso
-                sent_count += 1
-                
-        except Exception as e:
-            logger.error(f"Error enviando notificación masiva a usuario {user.id}: {str(e)}")
+    notifications = [
+        NotificationFactory.build_notification(
+            user=user,
+            notification_type=notification_type,
+            channel=channel,
+            subject=subject,
+            message=message
+        )
+        for user in users
+        for channel in channels
+    ]
+    sent_count = len(send_notifications_in_batches(notifications))
     
     logger.info(f"Notificación masiva enviada a {sent_count}/{len(user_ids)} usuarios")
     return sent_count
@@ -111,41 +117,30 @@ def send_promotional_campaign(campaign_data):
     # Filtrar usuarios que permiten notificaciones promocionales
     users = users.filter(
         notification_preferences__promotional_notifications=True
-    )
+    ).select_related('notification_preferences')
     
-    sent_count = 0
+    notifications = []
     
     for user in users:
-        try:
-            # Verificar preferencias del usuario para cada canal
-            prefs = getattr(user, 'notification_preferences', None)
-            if not prefs:
-                continue
-            
-            user_channels = []
-            for channel in channels:
-                if channel == 'email' and prefs.email_enabled:
-                    user_channels.append('email')
-                elif channel == 'sms' and prefs.sms_enabled:
-                    user_channels.append('sms')
-                elif channel == 'whatsapp' and prefs.whatsapp_enabled:
-                    user_channels.append('whatsapp')
-            
-            if user_channels:
-                results = NotificationFactory.send_multi_channel_notification(
+        # Verificar preferencias del usuario para cada canal
+        prefs = user.notification_preferences
+        
+        for channel in channels:
+            if (
+                (channel == 'email' and prefs.email_enabled)
+                or (channel == 'sms' and prefs.sms_enabled)
+                or (channel == 'whatsapp' and prefs.whatsapp_enabled)
+            ):
+                notifications.append(NotificationFactory.build_notification(
                     user=user,
                     notification_type='promotion',
                     subject=subject,
                     message=message,
-                    channels=user_channels,
+                    channel=channel,
                     extra_data=campaign_data.get('extra_data', {})
-                )
-                
-                if any(results.values()):
-                    sent_count += 1
-                    
-        except Exception as e:
-            logger.error(f"Error enviando campaña a usuario {user.id}: {str(e)}")
+                ))
+    
+    sent_count = len(send_notifications_in_batches(notifications))
     
     logger.info(f"Campaña promocional enviada a {sent_count} usuarios")
     return sent_count
@@ -0,0 +1,219 @@
+"""
+Pruebas del transporte HTTP de notificaciones contra un servidor HTTP local
+"""
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.test import SimpleTestCase, override_settings
+
+from dulce_bias_project.cache import cache
+
+from .models import Notification
+from .services import SMSService, WhatsAppService
+from .transport import HTTPTransport, TransportError, reset_transports
+from .worker import NotificationQueueWorker, get_worker_stats
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Responde con las respuestas encoladas en el servidor y registra cada request"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        self.server.requests.append({
+            'path': self.path,
+            'headers': dict(self.headers),
+            'body': body,
+            'at': time.monotonic(),
+        })
+        status, payload, headers = self.server.responses.pop(0) if self.server.responses else (200, {}, {})
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServerTestCase(SimpleTestCase):
+    """Levanta un servidor HTTP local por prueba"""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.requests = []
+        self.server.responses = []
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(reset_transports)
+        reset_transports()
+
+
+class HTTPTransportTests(StubServerTestCase):
+
+    def test_retries_retryable_status_codes(self):
+        self.server.responses = [
+            (503, {}, {'Retry-After': '0'}),
+            (429, {}, {'Retry-After': '0'}),
+            (200, {'message_id': 'abc'}, {}),
+        ]
+        transport = HTTPTransport('test', backoff=0)
+
+        response = transport.post(f'{self.url}/send', json={'to': '+56911111111'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'message_id': 'abc'})
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_returns_last_response_after_max_retries(self):
+        self.server.responses = [(503, {}, {})] * 3
+        transport = HTTPTransport('test', max_retries=2, backoff=0)
+
+        response = transport.post(f'{self.url}/send')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_does_not_retry_client_errors(self):
+        self.server.responses = [(400, {'error': 'bad request'}, {})]
+        transport = HTTPTransport('test', backoff=0)
+
+        response = transport.post(f'{self.url}/send')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_connection_errors_raise_after_retries(self):
+        url = self.url
+        self.server.shutdown()
+        self.server.server_close()
+        transport = HTTPTransport('test', max_retries=1, backoff=0, timeout=1)
+
+        with self.assertRaises(TransportError):
+            transport.post(f'{url}/send')
+
+    def test_rate_limit(self):
+        transport = HTTPTransport('test', rate_per_second=20)
+
+        started = time.monotonic()
+        transport.map(lambda i: transport.post(f'{self.url}/send'), range(30))
+
+        # 20 tokens iniciales y luego 20 por segundo: los 10 restantes esperan ~0.5s
+        self.assertEqual(len(self.server.requests), 30)
+        self.assertGreaterEqual(time.monotonic() - started, 0.45)
+
+
+class TwilioTransportTests(StubServerTestCase):
+
+    def get_settings(self, **kwargs):
+        return override_settings(
+            TWILIO_API_URL=self.url,
+            TWILIO_ACCOUNT_SID='AC123',
+            TWILIO_AUTH_TOKEN='secret',
+            TWILIO_FROM_NUMBER='+15550001111',
+            NOTIFICATION_TRANSPORTS={'sms': {'backoff': 0}, 'whatsapp': {'backoff': 0}},
+            **kwargs
+        )
+
+    def test_sms_goes_through_transport(self):
+        self.server.responses = [
+            (429, {}, {'Retry-After': '0'}),
+            (201, {'sid': 'SM1'}, {}),
+        ]
+        notification = Notification(channel='sms', message='Hola', recipient_phone='+56911111111')
+
+        with self.get_settings():
+            sent = SMSService().send(notification)
+
+        self.assertTrue(sent)
+        self.assertEqual(notification.external_id, 'SM1')
+        self.assertEqual(len(self.server.requests), 2)
+
+        request = self.server.requests[-1]
+        self.assertEqual(request['path'], '/Accounts/AC123/Messages.json')
+        self.assertEqual(
+            request['headers']['Authorization'],
+            'Basic ' + base64.b64encode(b'AC123:secret').decode()
+        )
+        self.assertEqual(
+            parse_qs(request['body']),
+            {'From': ['+15550001111'], 'To': ['+56911111111'], 'Body': ['Hola']}
+        )
+
+    def test_whatsapp_goes_through_transport(self):
+        self.server.responses = [(201, {'sid': 'SM2'}, {})]
+        notification = Notification(channel='whatsapp', message='Hola', recipient_phone='+56911111111')
+
+        with self.get_settings(TWILIO_WHATSAPP_ENABLED=True, WHATSAPP_FROM_NUMBER='+15550002222'):
+            sent = WhatsAppService().send(notification)
+
+        self.assertTrue(sent)
+        self.assertEqual(notification.external_id, 'SM2')
+        self.assertEqual(
+            parse_qs(self.server.requests[0]['body']),
+            {'From': ['whatsapp:+15550002222'], 'To': ['whatsapp:+56911111111'], 'Body': ['Hola']}
+        )
+
+    def test_twilio_error_fails_the_notification(self):
+        self.server.responses = [(400, {'code': 21211, 'message': 'Invalid To'}, {})]
+        notification = Notification(channel='sms', message='Hola', recipient_phone='123')
+
+        with self.get_settings():
+            sent = SMSService().send(notification)
+
+        self.assertFalse(sent)
+        self.assertEqual(len(self.server.requests), 1)
+
+
+class ConfigurationTests(SimpleTestCase):
+
+    @override_settings(TWILIO_ACCOUNT_SID='', TWILIO_AUTH_TOKEN='', SMS_API_URL='', WHATSAPP_API_URL='')
+    def test_sms_and_whatsapp_need_credentials(self):
+        results = WhatsAppService.test_configuration()
+
+        self.assertFalse(results['sms'])
+        self.assertFalse(results['whatsapp'])
+
+    @override_settings(TWILIO_ACCOUNT_SID='AC123', TWILIO_AUTH_TOKEN='secret', TWILIO_WHATSAPP_ENABLED=True)
+    def test_twilio_credentials_enable_sms_and_whatsapp(self):
+        results = WhatsAppService.test_configuration()
+
+        self.assertTrue(results['sms'])
+        self.assertTrue(results['whatsapp'])
+        self.assertEqual(results['dependencies'], {'requests': True})
+
+
+class WorkerStatsTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_concurrent_workers_keep_their_own_stats(self):
+        workers = [NotificationQueueWorker(worker_id=f'worker-{i}') for i in range(4)]
+
+        def publish(worker):
+            for sent in range(1, 51):
+                worker.stats.sent = sent
+                worker.publish_stats()
+
+        threads = [threading.Thread(target=publish, args=(worker,)) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = get_worker_stats()
+        self.assertEqual(set(stats), {worker.worker_id for worker in workers})
+        self.assertTrue(all(worker_stats['sent'] == 50 for worker_stats in stats.values()))
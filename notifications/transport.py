@@ -0,0 +1,212 @@
+"""
+Transporte HTTP para los proveedores de SMS y WhatsApp
+
+Cada proveedor usa un ``HTTPTransport`` con una ``requests.Session``
+persistente (pool de conexiones keep-alive), concurrencia acotada, límite
+de envíos por segundo (token bucket) y reintentos con backoff exponencial
+para errores de red, 429 y 5xx. Los transportes se crean una vez por proceso
+y se reutilizan entre mensajes; Twilio se usa por su API REST
+(``send_twilio_message``) sobre el mismo transporte, así que también respeta
+el límite de tasa y los reintentos.
+
+Configuración (opcional) en settings:
+
+    NOTIFICATION_TRANSPORTS = {
+        'sms': {'max_concurrency': 8, 'rate_per_second': 10},
+        'whatsapp': {'max_concurrency': 4, 'rate_per_second': 20, 'max_retries': 2},
+    }
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+    requests = None
+    HTTPAdapter = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRANSPORT_OPTIONS = {
+    'max_concurrency': 4,
+    'rate_per_second': 10,
+    'max_retries': 3,
+    'backoff': 0.5,
+    'timeout': 10,
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+TWILIO_API_URL = 'https://api.twilio.com/2010-04-01'
+
+
+class RateLimiter:
+    """Token bucket thread-safe: ``acquire()`` espera hasta que haya un token"""
+
+    def __init__(self, rate_per_second, burst=None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(burst or max(1, rate_per_second))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class TransportError(Exception):
+    """Error definitivo del transporte (tras agotar los reintentos)"""
+
+
+class HTTPTransport:
+    """
+    Cliente HTTP de un proveedor de notificaciones.
+
+    Uso:
+        transport = get_transport('sms')
+        response = transport.post(url, json=payload)
+        results = transport.map(send_function, notifications)
+    """
+
+    def __init__(self, name, max_concurrency=4, rate_per_second=10, max_retries=3, backoff=0.5, timeout=10):
+        if not HAS_REQUESTS:
+            raise TransportError("Requests no instalado. Instalar: pip install requests")
+
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate_per_second)
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        """Request con límite de tasa, concurrencia acotada y reintentos con backoff"""
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                with self.semaphore:
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise TransportError(f"{self.name}: {str(e)}") from e
+                delay = self.backoff * (2 ** attempt)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                delay = self.get_retry_after(response) or self.backoff * (2 ** attempt)
+
+            attempt += 1
+            logger.warning(f"Transporte {self.name}: reintento {attempt} en {delay:.1f}s ({url})")
+            time.sleep(delay)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    @staticmethod
+    def get_retry_after(response):
+        """Segundos indicados por el header Retry-After (número o fecha HTTP)"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+    def map(self, function, items):
+        """Aplica ``function`` a cada item con hasta ``max_concurrency`` envíos en paralelo"""
+        items = list(items)
+        if len(items) <= 1:
+            return [function(item) for item in items]
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency,
+                    thread_name_prefix=f'transport-{self.name}'
+                )
+        return list(self._executor.map(function, items))
+
+    def close(self):
+        self.session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport_options(name):
+    options = dict(DEFAULT_TRANSPORT_OPTIONS)
+    options.update(getattr(settings, 'NOTIFICATION_TRANSPORTS', {}).get(name, {}))
+    return options
+
+
+def get_transport(name):
+    """Transporte compartido (por proceso) del proveedor ``name``"""
+    transport = _transports.get(name)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(name)
+            if transport is None:
+                transport = _transports[name] = HTTPTransport(name, **get_transport_options(name))
+    return transport
+
+
+def reset_transports():
+    """Cierra y descarta los transportes (ej: al cambiar la configuración)"""
+    with _transports_lock:
+        for transport in _transports.values():
+            transport.close()
+        _transports.clear()
+
+
+def send_twilio_message(transport, account_sid, auth_token, from_, to, body):
+    """Crea un mensaje con la API REST de Twilio usando ``transport``; retorna su SID"""
+    api_url = getattr(settings, 'TWILIO_API_URL', TWILIO_API_URL).rstrip('/')
+    response = transport.post(
+        f'{api_url}/Accounts/{account_sid}/Messages.json',
+        data={'From': from_, 'To': to, 'Body': body},
+        auth=(account_sid, auth_token),
+    )
+    if response.status_code not in (200, 201):
+        raise TransportError(f"Twilio {response.status_code}: {response.text}")
+    return response.json().get('sid', '')
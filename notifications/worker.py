@@ -0,0 +1,295 @@
+"""
+Worker de la cola de notificaciones
+
+``NotificationQueueWorker`` toma lotes de ``NotificationQueue`` vencidos
+(``scheduled_at <= ahora``) con ``select_for_update(skip_locked=True)`` y
+los reserva por un tiempo (``locked_until``), de modo que varios workers
+pueden drenar la misma cola sin enviar dos veces. La reserva se renueva
+mientras el lote se envía y los resultados solo se guardan para los items
+que siguen reservados por el worker; si un worker muere, sus reservas
+vencen y otro worker reintenta esos items.
+
+El envío se hace en un pool de threads por canal (email, SMS, WhatsApp),
+con sub-lotes que reutilizan la conexión del proveedor, y los resultados
+se guardan en lote desde el thread principal. Se usa desde
+``manage.py process_notifications`` o desde la tarea de Celery
+``process_notification_queue``.
+"""
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from dulce_bias_project.cache import cache, incr
+
+from .models import NotificationQueue, NotificationStatus
+from .services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_THREADS_PER_CHANNEL = {'email': 4, 'sms': 4, 'whatsapp': 4}
+RETRY_DELAY_SECONDS = 60
+
+# Cada worker publica sus contadores en su propia llave; el número de la
+# llave sale de un contador atómico, así que dos workers nunca se pisan
+STATS_CACHE_KEY = 'notifications:worker:stats:{}'
+STATS_SLOTS_KEY = 'notifications:worker:stats:slots'
+STATS_TIMEOUT = 3600
+MAX_REPORTED_WORKERS = 100
+
+
+@dataclass
+class WorkerStats:
+    """Contadores de throughput de un worker"""
+    started_at: float = field(default_factory=time.monotonic)
+    batches: int = 0
+    claimed: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    by_channel: dict = field(default_factory=lambda: defaultdict(int))
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    @property
+    def per_second(self):
+        elapsed = self.elapsed
+        return (self.sent + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'batches': self.batches,
+            'claimed': self.claimed,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'by_channel': dict(self.by_channel),
+            'elapsed_seconds': round(self.elapsed, 2),
+            'per_second': round(self.per_second, 2),
+        }
+
+
+def get_worker_stats():
+    """Últimos contadores publicados por los workers ({worker_id: dict})"""
+    last_slot = cache.get(STATS_SLOTS_KEY) or 0
+    first_slot = max(1, last_slot - MAX_REPORTED_WORKERS + 1)
+    keys = [STATS_CACHE_KEY.format(slot) for slot in range(first_slot, last_slot + 1)]
+    return {entry['worker_id']: entry['stats'] for entry in cache.get_many(keys).values()}
+
+
+class NotificationQueueWorker:
+    """
+    Procesa la cola de notificaciones por lotes.
+
+    Uso:
+        worker = NotificationQueueWorker(batch_size=200)
+        worker.run()            # drena la cola y termina
+        worker.run(loop=True)   # sigue esperando nuevos items
+    """
+
+    def __init__(self, batch_size=None, lease_seconds=None, threads_per_channel=None, worker_id=None):
+        self.batch_size = batch_size or getattr(settings, 'NOTIFICATION_QUEUE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.lease_seconds = lease_seconds or getattr(
+            settings, 'NOTIFICATION_QUEUE_LEASE_SECONDS', DEFAULT_LEASE_SECONDS
+        )
+        self.threads_per_channel = dict(DEFAULT_THREADS_PER_CHANNEL)
+        self.threads_per_channel.update(getattr(settings, 'NOTIFICATION_THREADS_PER_CHANNEL', {}))
+        if threads_per_channel:
+            self.threads_per_channel.update(threads_per_channel)
+        self.worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+        self.service = NotificationService()
+        self.stats = WorkerStats()
+        self._executors = {}
+        self._stats_slot = None
+
+    # Reserva de items
+
+    def claim_batch(self):
+        """Reserva hasta ``batch_size`` items vencidos y los retorna con su notificación"""
+        now = timezone.now()
+        available = Q(locked_until__isnull=True) | Q(locked_until__lt=now)
+
+        with transaction.atomic():
+            candidate_ids = list(
+                NotificationQueue.objects.select_for_update(skip_locked=True)
+                .filter(available, processed=False, scheduled_at__lte=now)
+                .order_by('priority', 'scheduled_at')
+                .values_list('id', flat=True)[:self.batch_size]
+            )
+            if not candidate_ids:
+                return []
+
+            # La condición se repite en el UPDATE: en bases sin SKIP LOCKED
+            # (SQLite) evita que dos workers reserven el mismo item
+            NotificationQueue.objects.filter(available, id__in=candidate_ids).update(
+                locked_until=now + timedelta(seconds=self.lease_seconds),
+                locked_by=self.worker_id
+            )
+
+        return list(
+            NotificationQueue.objects.select_related('notification__user')
+            .filter(id__in=candidate_ids, locked_by=self.worker_id, processed=False)
+            .order_by('priority', 'scheduled_at')
+        )
+
+    def renew_lease(self, queue_items):
+        """Extiende la reserva de los items que siguen siendo de este worker; retorna cuántos"""
+        return NotificationQueue.objects.filter(
+            id__in=[queue_item.pk for queue_item in queue_items],
+            locked_by=self.worker_id,
+            processed=False
+        ).update(locked_until=timezone.now() + timedelta(seconds=self.lease_seconds))
+
+    # Envío
+
+    def get_executor(self, channel):
+        executor = self._executors.get(channel)
+        if executor is None:
+            executor = self._executors[channel] = ThreadPoolExecutor(
+                max_workers=self.threads_per_channel.get(channel, 1),
+                thread_name_prefix=f'notifications-{channel}'
+            )
+        return executor
+
+    def process_batch(self, queue_items):
+        """Envía un lote reservado y guarda los resultados (pocas consultas por lote)"""
+        by_channel = defaultdict(list)
+        for queue_item in queue_items:
+            by_channel[queue_item.notification.channel].append(queue_item.notification)
+
+        # Cada canal se reparte en tantos sub-lotes como threads tenga; cada
+        # sub-lote usa una sola conexión del proveedor (ej: una conexión SMTP)
+        futures = []
+        for channel, notifications in by_channel.items():
+            chunks = self.threads_per_channel.get(channel, 1)
+            chunk_size = max(1, -(-len(notifications) // chunks))
+            for start in range(0, len(notifications), chunk_size):
+                futures.append(self.get_executor(channel).submit(
+                    self.service.deliver_batch, notifications[start:start + chunk_size]
+                ))
+
+        # Mientras quedan envíos en curso se renueva la reserva, para que
+        # otro worker no retome el lote antes de que termine
+        results = {}
+        pending = set(futures)
+        while pending:
+            finished, pending = wait(pending, timeout=self.lease_seconds / 3)
+            for future in finished:
+                results.update(future.result())
+            if pending:
+                self.renew_lease(queue_items)
+
+        notifications = [queue_item.notification for queue_item in queue_items]
+        self.service.record_results(notifications, results)
+
+        now = timezone.now()
+        done_ids = []
+        retry_items = []
+        for queue_item in queue_items:
+            notification = queue_item.notification
+            self.stats.by_channel[notification.channel] += 1
+
+            if notification.status == NotificationStatus.SENT:
+                done_ids.append(queue_item.pk)
+                self.stats.sent += 1
+                continue
+
+            self.stats.failed += 1
+            if notification.can_retry:
+                queue_item.scheduled_at = now + timedelta(seconds=RETRY_DELAY_SECONDS * notification.retry_count)
+                queue_item.locked_until = None
+                queue_item.locked_by = ''
+                retry_items.append(queue_item)
+                self.stats.retried += 1
+            else:
+                done_ids.append(queue_item.pk)
+
+        with transaction.atomic():
+            # Solo los items que siguen reservados: si la reserva venció, otro worker los retomó
+            owned_ids = set(
+                NotificationQueue.objects.select_for_update()
+                .filter(id__in=[queue_item.pk for queue_item in queue_items], locked_by=self.worker_id)
+                .values_list('id', flat=True)
+            )
+            if len(owned_ids) < len(queue_items):
+                logger.warning(
+                    f"Worker {self.worker_id}: {len(queue_items) - len(owned_ids)} items "
+                    f"perdieron la reserva; no se guarda su resultado en la cola"
+                )
+
+            done_ids = [pk for pk in done_ids if pk in owned_ids]
+            if done_ids:
+                NotificationQueue.objects.filter(id__in=done_ids, locked_by=self.worker_id).update(
+                    processed=True, processed_at=now, locked_until=None, locked_by=''
+                )
+            NotificationQueue.objects.bulk_update(
+                [queue_item for queue_item in retry_items if queue_item.pk in owned_ids],
+                ['scheduled_at', 'locked_until', 'locked_by']
+            )
+
+        return len(queue_items)
+
+    # Ciclo principal
+
+    def run_once(self):
+        """Procesa un lote; retorna la cantidad de items procesados"""
+        queue_items = self.claim_batch()
+        if not queue_items:
+            return 0
+
+        self.stats.batches += 1
+        self.stats.claimed += len(queue_items)
+        processed = self.process_batch(queue_items)
+        self.publish_stats()
+        return processed
+
+    def run(self, loop=False, interval=5, max_batches=None):
+        """Procesa lotes hasta vaciar la cola (o indefinidamente con ``loop``)"""
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                processed = self.run_once()
+                if processed:
+                    batches += 1
+                    continue
+                if not loop:
+                    break
+                time.sleep(interval)
+        finally:
+            self.shutdown()
+
+        logger.info(
+            f"Worker {self.worker_id}: {self.stats.sent} enviadas, {self.stats.failed} fallidas "
+            f"({self.stats.per_second:.1f}/s)"
+        )
+        return self.stats
+
+    def publish_stats(self):
+        """Publica los contadores del worker en el cache (para monitoreo)"""
+        if self._stats_slot is None:
+            self._stats_slot = incr(STATS_SLOTS_KEY, timeout=None)
+        cache.set(
+            STATS_CACHE_KEY.format(self._stats_slot),
+            {'worker_id': self.worker_id, 'stats': self.stats.as_dict()},
+            STATS_TIMEOUT
+        )
+
+    def shutdown(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        self._executors = {}
@@ -5,7 +5,7 @@ from django.views.generic import ListView, DetailView, UpdateView
 from django.contrib import messages
 from django.urls import reverse_lazy
 from django.http import JsonResponse
-from django.db.models import Q, Count, Avg, Sum
+from django.db.models import Q, Count
 from django.utils import timezone
 from django.core.paginator import Paginator
 from django.views.decorators.http import require_POST
@@ -13,6 +13,8 @@ from django.views.decorators.csrf import csrf_exempt
 import json
 from datetime import timedelta
 from .models import Order
+from management.dashboard_stats import get_stats
+from .transitions import bulk_transition_orders
 from .admin_forms import OrderStatusForm, OrderNotesForm, BulkOrderUpdateForm, OrderFilterForm
 
 
@@ -88,13 +90,14 @@ class OrderManagementView(SuperuserRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
         
         # Estadísticas generales
+        counts = get_stats('orders')['orders']
         context['stats'] = {
-            'total_orders': Order.objects.count(),
-            'pending_orders': Order.objects.filter(status='pending').count(),
-            'processing_orders': Order.objects.filter(status='processing').count(),
-            'delivered_orders': Order.objects.filter(status='delivered').count(),
-            'paid_orders': Order.objects.filter(payment_status='paid').count(),
-            'unpaid_orders': Order.objects.filter(payment_status='pending').count(),
+            'total_orders': counts['total'],
+            'pending_orders': counts['by_status']['pending'],
+            'processing_orders': counts['by_status']['processing'],
+            'delivered_orders': counts['by_status']['delivered'],
+            'paid_orders': counts['by_payment_status']['paid'],
+            'unpaid_orders': counts['by_payment_status']['pending'],
         }
         
         # Filtros actuales
@@ -238,29 +241,29 @@ def bulk_update_orders(request):
             messages.error(request, 'Selecciona al menos un pedido y un estado.')
             return redirect('orders:admin_management')
         
-        # Actualizar pedidos seleccionados
-        orders = Order.objects.filter(id__in=order_ids)
-        updated_count = 0
+        if new_status not in dict(Order.STATUS_CHOICES):
+            messages.error(request, 'Estado no válido.')
+            return redirect('orders:admin_management')
         
-        for order in orders:
-            old_status = order.status
-            order.status = new_status
-            order.save()
-            
-            # Registrar en historial
-            # OrderStatusHistory.objects.create(
-            #     order=order,
-            #     status=new_status,
-            #     notes=f'Actualización masiva desde {old_status}',
-            #     changed_by=request.user
-            # )
-            
-            updated_count += 1
+        # Actualizar pedidos seleccionados (una transacción para todo el lote)
+        result = bulk_transition_orders(
+            order_ids,
+            new_status,
+            changed_by=request.user,
+            notes='Actualización masiva'
+        )
+        updated_count = len(result['updated'])
         
         messages.success(
             request, 
             f'✅ {updated_count} pedidos actualizados a "{dict(Order.STATUS_CHOICES)[new_status]}"'
         )
+        if result['skipped']:
+            skipped_numbers = ', '.join(f"#{order.order_number}" for order in result['skipped'])
+            messages.warning(
+                request,
+                f'{len(result["skipped"])} pedidos no admiten ese cambio de estado: {skipped_numbers}'
+            )
     
     return redirect('orders:admin_management')
 
@@ -268,18 +271,16 @@ def bulk_update_orders(request):
 @user_passes_test(is_superuser)
 def order_statistics(request):
     """Vista de estadísticas de pedidos"""
-    from django.db.models import Sum, Avg
-    from datetime import datetime, timedelta
-    
-    # Estadísticas generales
-    total_orders = Order.objects.count()
-    total_revenue = Order.objects.filter(payment_status='paid').aggregate(Sum('total'))['total__sum'] or 0
-    avg_order_value = Order.objects.aggregate(Avg('total'))['total__avg'] or 0
+    # Contadores cacheados del resumen diario (ver management.dashboard_stats)
+    counts = get_stats('orders')['orders']
+    total_orders = counts['total']
+    total_revenue = counts['revenue']
+    avg_order_value = counts['total_amount'] / total_orders if total_orders else 0
     
     # Estadísticas por estado
     status_stats = {}
     for status, display in Order.STATUS_CHOICES:
-        count = Order.objects.filter(status=status).count()
+        count = counts['by_status'][status]
         status_stats[status] = {
             'count': count,
             'display': display,
@@ -287,8 +288,7 @@ def order_statistics(request):
         }
     
     # Pedidos recientes (últimos 30 días)
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    recent_orders = Order.objects.filter(created_at__gte=thirty_days_ago).count()
+    recent_orders = counts['recent'][30]
     
     context = {
         'total_orders': total_orders,
@@ -327,18 +327,23 @@ def ajax_change_status(request):
             return JsonResponse({'success': False, 'error': 'ID de orden requerido'})
         
         old_status = order.status
+        update_fields = ['status', 'updated_at']
         
         order.status = new_status
+        order._changed_by = request.user
         if notes:
             order.notes = notes
+            update_fields.append('notes')
         
         # Actualizar timestamps
         if new_status == 'shipped' and old_status != 'shipped':
             order.shipped_at = timezone.now()
+            update_fields.append('shipped_at')
         elif new_status == 'delivered' and old_status != 'delivered':
             order.delivered_at = timezone.now()
+            update_fields.append('delivered_at')
         
-        order.save()
+        order.save(update_fields=update_fields)
         
         return JsonResponse({
             'success': True,
@@ -357,15 +362,9 @@ def ajax_stats(request):
     if not request.user.is_superuser:
         return JsonResponse({'error': 'Sin permisos'})
     
-    stats = {
-        'total': Order.objects.count(),
-        'pending': Order.objects.filter(status='pending').count(),
-        'confirmed': Order.objects.filter(status='confirmed').count(),
-        'processing': Order.objects.filter(status='processing').count(),
-        'shipped': Order.objects.filter(status='shipped').count(),
-        'delivered': Order.objects.filter(status='delivered').count(),
-        'cancelled': Order.objects.filter(status='cancelled').count(),
-    }
+    counts = get_stats('orders')['orders']
+    stats = {'total': counts['total']}
+    stats.update(counts['by_status'])
     
     return JsonResponse(stats)
 
@@ -420,7 +419,8 @@ def ajax_change_payment_status(request):
         else:
             status_message = ""
         
-        order.save()
+        order._changed_by = request.user
+        order.save(update_fields=['payment_status', 'status', 'updated_at'])
         
         # Crear mensaje de éxito
         action_text = "marcado como pagado" if action == "mark_paid" else "marcado como no pagado"
@@ -452,22 +452,21 @@ from .models import OrderStatusHistory, OrderPaymentStatusHistory
 @user_passes_test(is_superuser)
 def admin_orders_dashboard(request):
     """Panel de administración de órdenes con historial"""
-    # Estadísticas generales
-    total_orders = Order.objects.count()
+    # Estadísticas generales: contadores cacheados del resumen diario
+    counts = get_stats('orders')['orders']
+    total_orders = counts['total']
     recent_cutoff = timezone.now() - timedelta(days=7)
-    recent_orders = Order.objects.filter(created_at__gte=recent_cutoff).count()
+    recent_orders = counts['recent'][7]
     
     # Órdenes por estado
     status_stats = {}
     for status_code, status_name in Order.STATUS_CHOICES:
-        count = Order.objects.filter(status=status_code).count()
-        status_stats[status_name] = count
+        status_stats[status_name] = counts['by_status'][status_code]
     
     # Órdenes por estado de pago
     payment_status_stats = {}
     for payment_code, payment_name in Order.PAYMENT_STATUS_CHOICES:
-        count = Order.objects.filter(payment_status=payment_code).count()
-        payment_status_stats[payment_name] = count
+        payment_status_stats[payment_name] = counts['by_payment_status'][payment_code]
     
     # Órdenes recientes con historial
     recent_orders_with_history = Order.objects.filter(
@@ -0,0 +1,512 @@
+"""
+Resúmenes diarios de ventas
+
+``DailyOrderRollup`` guarda por día (fecha local de creación del pedido),
+estado, estado de pago, región y método de pago la cantidad de pedidos y la
+suma de subtotal, descuento, envío y total. ``DailyProductRollup`` guarda por
+día, producto y las mismas dimensiones los pedidos, unidades e ingresos de
+los items. La categoría no es parte de la clave: los reportes la toman del
+producto al consultar, así que un producto que cambia de categoría no deja
+filas bajo la anterior.
+
+Se mantienen con un ``INSERT ... ON CONFLICT DO UPDATE`` por tabla dentro de
+la misma transacción en que cambia el pedido o sus items (ver
+``orders.signals``): un cambio de estado resta la contribución del pedido en
+su fila anterior y la suma en la nueva.
+Los reportes leen estas tablas con una consulta agrupada en lugar de recorrer
+``Order``/``OrderItem``. Se considera venta un pedido con
+``payment_status='paid'``.
+
+``manage.py rebuild_sales_rollups`` las recalcula desde los pedidos.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.apps import apps as global_apps
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import DailyOrderRollup, DailyProductRollup, Order, OrderItem
+
+ORDER_DIMENSIONS = ('status', 'payment_status', 'region', 'payment_method')
+ORDER_KEY_FIELDS = ('day',) + ORDER_DIMENSIONS
+PRODUCT_KEY_FIELDS = ('day', 'product_id') + ORDER_DIMENSIONS
+
+# Medida del resumen -> campo del pedido
+ORDER_AMOUNTS = {
+    'subtotal': 'subtotal',
+    'discount': 'discount_amount',
+    'shipping': 'shipping_cost',
+    'revenue': 'total',
+}
+
+ORDER_MEASURES = ('orders',) + tuple(ORDER_AMOUNTS)
+PRODUCT_MEASURES = ('orders', 'units', 'revenue')
+
+# Se envía (después del commit) cuando cambian los resúmenes de ventas
+sales_changed = Signal()
+
+# Campos del pedido que definen su contribución
+ORDER_FIELDS = ORDER_DIMENSIONS + tuple(ORDER_AMOUNTS.values())
+
+SALE = Q(payment_status='paid')
+
+
+def get_order_day(order):
+    return timezone.localdate(order.created_at)
+
+
+def get_day_start(day):
+    """Inicio del día local ``day`` (para filtrar ``created_at`` por rango)"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class SalesDeltas:
+    """
+    Cambios pendientes de los resúmenes: {clave: {medida: +n/-n}}.
+
+    ``values`` permite usar otros valores del pedido que los actuales (ej:
+    los anteriores a un cambio, para restar su contribución).
+    """
+
+    def __init__(self):
+        self.orders = defaultdict(lambda: defaultdict(int))
+        self.products = defaultdict(lambda: defaultdict(int))
+
+    def order_key(self, order, values=None):
+        values = values or {}
+        return (get_order_day(order),) + tuple(
+            values.get(field, getattr(order, field)) for field in ORDER_DIMENSIONS
+        )
+
+    def add_order(self, order, sign=1, values=None):
+        values = values or {}
+        measures = self.orders[self.order_key(order, values)]
+        measures['orders'] += sign
+        for measure, field in ORDER_AMOUNTS.items():
+            measures[measure] += sign * values.get(field, getattr(order, field))
+
+    def add_item(self, order, item, sign=1, values=None):
+        """``item``: dict con ``product_id``, ``price`` y ``quantity``"""
+        order_key = self.order_key(order, values)
+        key = (order_key[0], item['product_id']) + order_key[1:]
+        measures = self.products[key]
+        measures['orders'] += sign
+        measures['units'] += sign * item['quantity']
+        measures['revenue'] += sign * item['price'] * item['quantity']
+
+    def apply(self):
+        changed = apply_rollup_deltas(DailyOrderRollup, ORDER_KEY_FIELDS, ORDER_MEASURES, self.orders)
+        changed |= apply_rollup_deltas(DailyProductRollup, PRODUCT_KEY_FIELDS, PRODUCT_MEASURES, self.products)
+        if changed:
+            transaction.on_commit(lambda: sales_changed.send(sender=DailyOrderRollup))
+
+
+def apply_rollup_deltas(model, key_fields, measure_fields, deltas):
+    """
+    Suma ``deltas`` ({clave: {medida: delta}}) a las filas de ``model``.
+
+    Un ``INSERT ... ON CONFLICT DO UPDATE`` por lote suma en las filas
+    existentes y crea las que faltan, también si otra transacción acaba de
+    eliminar una que había quedado sin pedidos. Luego se eliminan, con una
+    sola consulta, las filas sin pedidos de los días que restaron. Retorna si
+    hubo cambios.
+    """
+    deltas = {
+        key: {measure: delta for measure, delta in measures.items() if delta}
+        for key, measures in deltas.items()
+    }
+    deltas = {key: measures for key, measures in deltas.items() if measures}
+    if not deltas:
+        return False
+
+    fields = [model._meta.get_field(name) for name in key_fields + measure_fields + ('updated_at',)]
+    key_columns = [field.column for field in fields[:len(key_fields)]]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    updates = [
+        f'{quote(field.column)} = {table}.{quote(field.column)} + EXCLUDED.{quote(field.column)}'
+        for field in fields[len(key_fields):-1]
+    ]
+    updates.append('{0} = EXCLUDED.{0}'.format(quote('updated_at')))
+
+    now = timezone.now()
+    rows = [
+        [
+            field.get_db_prep_save(value, connection)
+            for field, value in zip(fields, key + tuple(measures.get(name, 0) for name in measure_fields) + (now,))
+        ]
+        for key, measures in deltas.items()
+    ]
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+    placeholders = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(quote(field.column) for field in fields)}) '
+                f'VALUES {", ".join([placeholders] * len(batch))} '
+                f'ON CONFLICT ({", ".join(quote(column) for column in key_columns)}) '
+                f'DO UPDATE SET {", ".join(updates)}',
+                [value for row in batch for value in row]
+            )
+
+        emptied_days = {key[0] for key, measures in deltas.items() if measures.get('orders', 0) < 0}
+        if emptied_days:
+            model.objects.filter(day__in=emptied_days, orders=0).delete()
+    return True
+
+
+def get_item_rows(items):
+    """Datos de ``OrderItem`` para ``SalesDeltas.add_item``"""
+    return [
+        {'product_id': item.product_id, 'price': item.price, 'quantity': item.quantity}
+        for item in items
+    ]
+
+
+def record_order_created(order, items=()):
+    """Suma un pedido nuevo (y sus ``items``, si ya existen)"""
+    deltas = SalesDeltas()
+    deltas.add_order(order)
+    for item in get_item_rows(items):
+        deltas.add_item(order, item)
+    deltas.apply()
+
+
+def record_order_items(order, items, sign=1):
+    """Suma (o resta, con ``sign=-1``) la contribución de ``items`` del pedido"""
+    deltas = SalesDeltas()
+    for item in get_item_rows(items):
+        deltas.add_item(order, item, sign)
+    deltas.apply()
+
+
+def record_order_changes(orders):
+    """
+    Mueve la contribución de pedidos modificados según su ``last_field_changes``
+    (ver ``Order.save`` y ``transitions.bulk_transition_orders``). Si cambió una
+    dimensión, los items de todos los pedidos se leen con una sola consulta.
+    """
+    deltas = SalesDeltas()
+    previous_values = {}
+    for order in orders:
+        changes = getattr(order, 'last_field_changes', None)
+        if not changes:
+            continue
+        previous = {field: old_value for field, (old_value, new_value) in changes.items()}
+        deltas.add_order(order, -1, previous)
+        deltas.add_order(order)
+        if any(field in changes for field in ORDER_DIMENSIONS):
+            previous_values[order.pk] = (order, previous)
+
+    if previous_values:
+        items = OrderItem.objects.filter(order_id__in=previous_values).values(
+            'order_id', 'product_id', 'price', 'quantity'
+        )
+        for item in items:
+            order, previous = previous_values[item['order_id']]
+            deltas.add_item(order, item, -1, previous)
+            deltas.add_item(order, item)
+
+    deltas.apply()
+
+
+def record_order_deleted(order, values=None):
+    """
+    Resta un pedido eliminado, con sus ``values`` en la base de datos si se
+    indican (sus items se restan al eliminarse cada uno).
+    """
+    deltas = SalesDeltas()
+    deltas.add_order(order, -1, values)
+    deltas.apply()
+
+
+def record_item_changes(item, changes):
+    """Mueve la contribución de un item según ``changes`` ({campo: (anterior, nuevo)})"""
+    old_item = OrderItem(
+        order_id=changes.get('order_id', (item.order_id,))[0],
+        product_id=changes.get('product_id', (item.product_id,))[0],
+        price=changes.get('price', (item.price,))[0],
+        quantity=changes.get('quantity', (item.quantity,))[0],
+    )
+    old_order = item.order if old_item.order_id == item.order_id else Order.objects.filter(pk=old_item.order_id).first()
+
+    deltas = SalesDeltas()
+    if old_order is not None:
+        for row in get_item_rows([old_item]):
+            deltas.add_item(old_order, row, -1)
+    for row in get_item_rows([item]):
+        deltas.add_item(item.order, row)
+    deltas.apply()
+
+
+def rebuild_sales_rollups(apps=None):
+    """
+    Recalcula los resúmenes desde los pedidos; retorna (filas de pedidos, filas de productos).
+
+    ``apps``: registro de modelos de una migración (por defecto, los modelos actuales).
+    """
+    apps = apps or global_apps
+    order_model = apps.get_model('orders', 'Order')
+    item_model = apps.get_model('orders', 'OrderItem')
+    order_rollup_model = apps.get_model('orders', 'DailyOrderRollup')
+    product_rollup_model = apps.get_model('orders', 'DailyProductRollup')
+
+    day = TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    order_rows = (
+        order_model.objects.annotate(day=day)
+        .values(*ORDER_KEY_FIELDS)
+        .annotate(
+            count=Count('id'),
+            subtotal_sum=Sum('subtotal'),
+            discount_sum=Sum('discount_amount'),
+            shipping_sum=Sum('shipping_cost'),
+            revenue_sum=Sum('total'),
+        )
+        .order_by()
+    )
+    order_rollups = [
+        order_rollup_model(
+            orders=row['count'],
+            subtotal=row['subtotal_sum'] or 0,
+            discount=row['discount_sum'] or 0,
+            shipping=row['shipping_sum'] or 0,
+            revenue=row['revenue_sum'] or 0,
+            **{field: row[field] for field in ORDER_KEY_FIELDS}
+        )
+        for row in order_rows
+    ]
+
+    item_day = TruncDate('order__created_at', tzinfo=timezone.get_current_timezone())
+    item_rows = (
+        item_model.objects.annotate(
+            day=item_day,
+            **{field: F(f'order__{field}') for field in ORDER_DIMENSIONS}
+        )
+        .values('day', 'product_id', *ORDER_DIMENSIONS)
+        .annotate(count=Count('id'), units=Sum('quantity'), revenue=Sum(F('price') * F('quantity')))
+        .order_by()
+    )
+    product_rollups = [
+        product_rollup_model(
+            orders=row['count'],
+            units=row['units'] or 0,
+            revenue=row['revenue'] or 0,
+            **{field: row[field] for field in PRODUCT_KEY_FIELDS}
+        )
+        for row in item_rows
+    ]
+
+    with transaction.atomic():
+        order_rollup_model.objects.all().delete()
+        product_rollup_model.objects.all().delete()
+        order_rollup_model.objects.bulk_create(order_rollups, batch_size=1000)
+        product_rollup_model.objects.bulk_create(product_rollups, batch_size=1000)
+        transaction.on_commit(lambda: sales_changed.send(sender=DailyOrderRollup))
+    return len(order_rollups), len(product_rollups)
+
+
+# Consultas para reportes
+
+def get_order_counts(recent_days=(7, 30)):
+    """
+    Conteos de pedidos con una consulta agrupada por estado y estado de pago.
+
+    Retorna un dict con ``total``, ``by_status`` y ``by_payment_status``
+    ({código: cantidad}, con todos los códigos), ``revenue`` (ventas pagadas),
+    ``total_amount`` (suma de todos los pedidos) y ``recent`` ({días: pedidos
+    creados en esos últimos días, incluido hoy}).
+    """
+    today = timezone.localdate()
+    annotations = {'count': Sum('orders'), 'amount': Sum('revenue')}
+    for days in recent_days:
+        annotations[f'recent_{days}'] = Sum('orders', filter=Q(day__gt=today - timedelta(days=days)))
+
+    rows = DailyOrderRollup.objects.values('status', 'payment_status').annotate(**annotations).order_by()
+
+    counts = {
+        'total': 0,
+        'revenue': 0,
+        'total_amount': 0,
+        'by_status': {code: 0 for code, display in Order.STATUS_CHOICES},
+        'by_payment_status': {code: 0 for code, display in Order.PAYMENT_STATUS_CHOICES},
+        'recent': {days: 0 for days in recent_days},
+    }
+    for row in rows:
+        count = row['count'] or 0
+        counts['total'] += count
+        counts['total_amount'] += row['amount'] or 0
+        if row['payment_status'] == 'paid':
+            counts['revenue'] += row['amount'] or 0
+        counts['by_status'][row['status']] = counts['by_status'].get(row['status'], 0) + count
+        counts['by_payment_status'][row['payment_status']] = (
+            counts['by_payment_status'].get(row['payment_status'], 0) + count
+        )
+        for days in recent_days:
+            counts['recent'][days] += row[f'recent_{days}'] or 0
+    return counts
+
+
+def get_daily_sales(start, end, category=None):
+    """
+    Ventas por día entre ``start`` y ``end`` (incluidos): {fecha: (pedidos, ingresos)}.
+
+    Sin categoría se usan los totales de los pedidos; con categoría, las
+    líneas e ingresos de los items de esa categoría.
+    """
+    if category is None:
+        queryset = DailyOrderRollup.objects.filter(SALE)
+    else:
+        queryset = DailyProductRollup.objects.filter(SALE, product__category=category)
+    rows = (
+        queryset.filter(day__gte=start, day__lte=end)
+        .values('day')
+        .annotate(count=Sum('orders'), amount=Sum('revenue'))
+        .order_by()
+    )
+    return {row['day']: (row['count'] or 0, row['amount'] or 0) for row in rows}
+
+
+def get_top_products(start, end, category=None, limit=10):
+    """Productos más vendidos del período (por ingresos), con unidades e ingresos"""
+    queryset = DailyProductRollup.objects.filter(SALE, day__gte=start, day__lte=end)
+    if category is not None:
+        queryset = queryset.filter(product__category=category)
+    return list(
+        queryset.values('product_id', 'product__name', category_name=F('product__category__name'))
+        .annotate(quantity_sold=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue', '-quantity_sold')[:limit]
+    )
+
+
+def get_category_sales(start, end):
+    """Ingresos por categoría (la actual de cada producto) del período, de mayor a menor"""
+    return list(
+        DailyProductRollup.objects.filter(SALE, day__gte=start, day__lte=end)
+        .values(category_id=F('product__category_id'), category_name=F('product__category__name'))
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-revenue')
+    )
+
+
+def count_customers(start, end, category=None):
+    """
+    Clientes distintos con ventas en el período. No se puede sumar desde los
+    resúmenes: se consulta ``Order`` por el índice de ``created_at``.
+    """
+    queryset = Order.objects.filter(
+        SALE,
+        created_at__gte=get_day_start(start),
+        created_at__lt=get_day_start(end + timedelta(days=1)),
+    )
+    if category is not None:
+        queryset = queryset.filter(items__product__category=category)
+    return queryset.values('user_id').distinct().count()
+
+
+MONTH_LABELS = ('Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic')
+
+
+def get_month_start(day, months_back=0):
+    month_index = day.year * 12 + day.month - 1 - months_back
+    return day.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def get_percent_change(current, previous):
+    if not previous:
+        return None
+    return round(float((current - previous) / previous * 100), 1)
+
+
+def get_sales_report(start, end, category=None, months=12):
+    """
+    Reporte de ventas entre ``start`` y ``end`` (incluidos).
+
+    Los totales se comparan con el período anterior de igual largo (con el
+    período por defecto, mes contra mes anterior). Las series diaria,
+    semanal y mensual (``months`` meses hasta ``end``) y ambos períodos
+    salen de una sola consulta agrupada por día.
+    """
+    length = (end - start).days + 1
+    previous_start = start - timedelta(days=length)
+    monthly_start = get_month_start(end, months - 1)
+    daily_sales = get_daily_sales(min(previous_start, monthly_start), end, category)
+
+    def get_totals(period_start, period_end):
+        orders = revenue = 0
+        for day, (day_orders, day_revenue) in daily_sales.items():
+            if period_start <= day <= period_end:
+                orders += day_orders
+                revenue += day_revenue
+        return orders, revenue
+
+    orders, revenue = get_totals(start, end)
+    previous_orders, previous_revenue = get_totals(previous_start, start - timedelta(days=1))
+    average = revenue / orders if orders else 0
+    previous_average = previous_revenue / previous_orders if previous_orders else 0
+    customers = count_customers(start, end, category)
+    previous_customers = count_customers(previous_start, start - timedelta(days=1), category)
+
+    daily = {'labels': [], 'data': []}
+    weekly = {}
+    for offset in range(length):
+        day = start + timedelta(days=offset)
+        day_revenue = daily_sales.get(day, (0, 0))[1]
+        daily['labels'].append(f'{day:%d/%m}')
+        daily['data'].append(int(day_revenue))
+        # Semanas de lunes a domingo; la primera parte en ``start``
+        label = f'Sem {max(day - timedelta(days=day.weekday()), start):%d/%m}'
+        weekly[label] = weekly.get(label, 0) + int(day_revenue)
+
+    monthly = {}
+    for months_back in range(months - 1, -1, -1):
+        month = get_month_start(end, months_back)
+        monthly[f'{MONTH_LABELS[month.month - 1]} {month:%Y}'] = 0
+    for day, (day_orders, day_revenue) in daily_sales.items():
+        if day >= monthly_start:
+            monthly[f'{MONTH_LABELS[day.month - 1]} {day:%Y}'] += int(day_revenue)
+
+    category_sales = get_category_sales(start, end)
+    if category is not None:
+        category_sales = [row for row in category_sales if row['category_id'] == category.pk]
+    items_revenue = sum(row['revenue'] or 0 for row in category_sales)
+
+    top_products = [
+        {
+            'id': row['product_id'],
+            'name': row['product__name'],
+            'category': {'name': row['category_name']},
+            'quantity_sold': row['quantity_sold'] or 0,
+            'revenue': row['revenue'] or 0,
+            'percentage': float(row['revenue'] / items_revenue * 100) if items_revenue and row['revenue'] else 0,
+        }
+        for row in get_top_products(start, end, category)
+    ]
+
+    return {
+        'total_sales': revenue,
+        'total_orders': orders,
+        'unique_customers': customers,
+        'average_order': average,
+        'sales_change': get_percent_change(revenue, previous_revenue),
+        'orders_change': get_percent_change(orders, previous_orders),
+        'customers_change': get_percent_change(customers, previous_customers),
+        'average_change': get_percent_change(average, previous_average),
+        'top_products': top_products,
+        'chart_data': {
+            'sales': {
+                'daily': daily,
+                'weekly': {'labels': list(weekly), 'data': list(weekly.values())},
+                'monthly': {'labels': list(monthly), 'data': list(monthly.values())},
+            },
+            'categories': {
+                'labels': [row['category_name'] for row in category_sales],
+                'data': [int(row['revenue'] or 0) for row in category_sales],
+            },
+        },
+    }
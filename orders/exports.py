@@ -0,0 +1,67 @@
+"""
+Exportaciones CSV/XLSX de pedidos (ver ``management.exports``)
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from management.exports import Export
+
+from .analytics import SALE, get_day_start
+from .models import Order, OrderItem
+
+
+def get_sales_orders(start, end, category=None):
+    """Pedidos pagados entre ``start`` y ``end`` (incluidos), como en el reporte de ventas"""
+    queryset = Order.objects.filter(
+        SALE,
+        created_at__gte=get_day_start(start),
+        created_at__lt=get_day_start(end + timedelta(days=1)),
+    )
+    if category is not None:
+        # Subconsulta en vez de join para no repetir pedidos con varios productos de la categoría
+        queryset = queryset.filter(pk__in=OrderItem.objects.filter(product__category=category).values('order_id'))
+    return queryset.order_by('-created_at')
+
+
+class SalesOrderExport(Export):
+    title = 'Reporte de ventas'
+    filename = 'reporte_ventas'
+    columns = [
+        ('Pedido', 'order_number'),
+        ('Fecha', 'created_at'),
+        ('Cliente', 'first_name'),
+        ('Email', 'email'),
+        ('Región', 'region'),
+        ('Método de Pago', 'payment_method'),
+        ('Estado', 'status'),
+        ('Subtotal', 'subtotal'),
+        ('Descuento', 'discount_amount'),
+        ('Envío', 'shipping_cost'),
+        ('Total', 'total'),
+    ]
+
+    REGIONS = dict(Order.REGION_CHOICES)
+    PAYMENT_METHODS = dict(Order.PAYMENT_METHOD_CHOICES)
+    STATUSES = dict(Order.STATUS_CHOICES)
+
+    def get_queryset(self):
+        return Order.objects.filter(SALE).order_by('-created_at')
+
+    def project(self, queryset):
+        return queryset.values('last_name', *[field for header, field in self.columns])
+
+    def format_row(self, row):
+        return [
+            row['order_number'],
+            timezone.localtime(row['created_at']).strftime('%d/%m/%Y %H:%M'),
+            f"{row['first_name']} {row['last_name']}",
+            row['email'],
+            self.REGIONS.get(row['region'], row['region']),
+            self.PAYMENT_METHODS.get(row['payment_method'], row['payment_method']),
+            self.STATUSES.get(row['status'], row['status']),
+            row['subtotal'],
+            row['discount_amount'],
+            row['shipping_cost'],
+            row['total'],
+        ]
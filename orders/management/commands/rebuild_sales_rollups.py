@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from orders.analytics import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes diarios de ventas (pedidos y productos) desde los pedidos'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculando resúmenes diarios de ventas...')
+        order_rows, product_rows = rebuild_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {order_rows} filas de pedidos y {product_rows} filas de productos generadas'
+        ))
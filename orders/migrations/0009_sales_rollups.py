@@ -0,0 +1,75 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_productrating'),
+        ('orders', '0008_ordernumbersequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at'], name='orders_orde_created_0e92de_idx'),
+        ),
+        migrations.CreateModel(
+            name='DailyOrderRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('confirmed', 'Confirmado'), ('processing', 'En Preparación'), ('shipped', 'Enviado'), ('delivered', 'Entregado'), ('cancelled', 'Cancelado')], max_length=20)),
+                ('payment_status', models.CharField(choices=[('pending', 'Pendiente'), ('paid', 'Pagado'), ('failed', 'Fallido'), ('refunded', 'Reembolsado')], max_length=20)),
+                ('region', models.CharField(choices=[('rm', 'Región Metropolitana'), ('v', 'V Región - Valparaíso'), ('viii', 'VIII Región - Biobío'), ('iv', 'IV Región - Coquimbo'), ('other', 'Otra Región')], max_length=10)),
+                ('payment_method', models.CharField(choices=[('webpay', 'Webpay Plus (No disponible)'), ('transfer', 'Transferencia Bancaria'), ('cash', 'Pago contra entrega')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('discount', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('shipping', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Pedidos',
+                'verbose_name_plural': 'Resúmenes Diarios de Pedidos',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pendiente'), ('confirmed', 'Confirmado'), ('processing', 'En Preparación'), ('shipped', 'Enviado'), ('delivered', 'Entregado'), ('cancelled', 'Cancelado')], max_length=20)),
+                ('payment_status', models.CharField(choices=[('pending', 'Pendiente'), ('paid', 'Pagado'), ('failed', 'Fallido'), ('refunded', 'Reembolsado')], max_length=20)),
+                ('region', models.CharField(choices=[('rm', 'Región Metropolitana'), ('v', 'V Región - Valparaíso'), ('viii', 'VIII Región - Biobío'), ('iv', 'IV Región - Coquimbo'), ('other', 'Otra Región')], max_length=10)),
+                ('payment_method', models.CharField(choices=[('webpay', 'Webpay Plus (No disponible)'), ('transfer', 'Transferencia Bancaria'), ('cash', 'Pago contra entrega')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=0, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.product')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Productos',
+                'verbose_name_plural': 'Resúmenes Diarios de Productos',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyorderrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'status', 'payment_status', 'region', 'payment_method'), name='unique_daily_order_rollup'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyproductrollup',
+            index=models.Index(fields=['day', 'category'], name='orders_dail_day_97cdf3_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product', 'category', 'status', 'payment_status', 'region', 'payment_method'), name='unique_daily_product_rollup'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+PRODUCT_KEY_FIELDS = ('day', 'product_id', 'status', 'payment_status', 'region', 'payment_method')
+
+
+def merge_product_rollups(apps, schema_editor):
+    """Une las filas del mismo producto guardadas bajo distintas categorías"""
+    DailyProductRollup = apps.get_model('orders', 'DailyProductRollup')
+    rows = (
+        DailyProductRollup.objects.values(*PRODUCT_KEY_FIELDS)
+        .annotate(orders_sum=Sum('orders'), units_sum=Sum('units'), revenue_sum=Sum('revenue'))
+        .order_by()
+    )
+    merged = [
+        DailyProductRollup(
+            orders=row['orders_sum'],
+            units=row['units_sum'],
+            revenue=row['revenue_sum'],
+            **{field: row[field] for field in PRODUCT_KEY_FIELDS}
+        )
+        for row in rows
+        if row['orders_sum']
+    ]
+    DailyProductRollup.objects.all().delete()
+    DailyProductRollup.objects.bulk_create(merged, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailyproductrollup',
+            name='unique_daily_product_rollup',
+        ),
+        migrations.RemoveIndex(
+            model_name='dailyproductrollup',
+            name='orders_dail_day_97cdf3_idx',
+        ),
+        migrations.RemoveField(
+            model_name='dailyproductrollup',
+            name='category',
+        ),
+        migrations.RunPython(merge_product_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyproductrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'product', 'status', 'payment_status', 'region', 'payment_method'), name='unique_daily_product_rollup'),
+        ),
+    ]
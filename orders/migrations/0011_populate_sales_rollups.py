@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:00
+
+from django.db import migrations
+
+
+def populate_sales_rollups(apps, schema_editor):
+    """Resúmenes de los pedidos existentes (los reportes y contadores solo leen los resúmenes)"""
+    from orders.analytics import rebuild_sales_rollups
+
+    rebuild_sales_rollups(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_remove_dailyproductrollup_category'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_sales_rollups, migrations.RunPython.noop),
+    ]
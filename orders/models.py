@@ -1,11 +1,13 @@
 from django.db import models
+from django.db.models import F, Sum
 from django.contrib.auth.models import User
 from django.utils import timezone
 from shop.models import Product
+from dulce_bias_project.tracking import FieldTrackerMixin
 import uuid
 
 
-class Order(models.Model):
+class Order(FieldTrackerMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pendiente'),
         ('confirmed', 'Confirmado'),
@@ -81,36 +83,43 @@ class Order(models.Model):
     notes = models.TextField(blank=True, help_text="Notas especiales para el pedido")
     tracking_number = models.CharField(max_length=100, blank=True)
     
+    # Los campos de estado más las dimensiones y montos de orders.analytics
+    tracked_fields = (
+        'status', 'payment_status', 'region', 'payment_method',
+        'subtotal', 'discount_amount', 'shipping_cost', 'total',
+    )
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['order_number']),
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['status']),
+            models.Index(fields=['created_at']),
         ]
     
     def __str__(self):
         return f"Pedido #{self.order_number}"
     
+    # Cálculos validados solo cuando se guarda alguno de estos campos
+    AMOUNT_FIELDS = {'subtotal', 'discount_amount', 'shipping_cost', 'total'}
+    
     def save(self, *args, **kwargs):
-        # Capturar el estado anterior para el historial
-        old_status = None
-        old_payment_status = None
-        
-        if self.pk:  # Si la orden ya existe
-            try:
-                old_order = Order.objects.get(pk=self.pk)
-                old_status = old_order.status
-                old_payment_status = old_order.payment_status
-            except Order.DoesNotExist:
-                pass
+        update_fields = kwargs.get('update_fields')
+        is_new = self._state.adding
         
         if not self.order_number:
             # Generar número de pedido único
             self.order_number = self.generate_order_number()
         
         # Validar cálculos antes de guardar
-        self.validate_calculations()
+        if update_fields is None or self.AMOUNT_FIELDS.intersection(update_fields):
+            self.validate_calculations()
+        
+        # Cambios detectados en memoria (sin volver a consultar la fila),
+        # incluidas las correcciones de montos de validate_calculations
+        changes = self.get_field_changes(update_fields)
+        self.last_field_changes = changes
         
         # Guardar la orden
         super().save(*args, **kwargs)
@@ -119,16 +128,7 @@ class Order(models.Model):
         current_user = getattr(self, '_changed_by', None)
         notes = getattr(self, '_change_notes', '')
         
-        # Registrar cambio de estado de orden
-        if old_status is not None and old_status != self.status:
-            OrderStatusHistory.objects.create(
-                order=self,
-                previous_status=old_status,
-                new_status=self.status,
-                changed_by=current_user,
-                notes=notes
-            )
-        elif old_status is None:  # Primera vez que se guarda
+        if is_new:  # Primera vez que se guarda
             OrderStatusHistory.objects.create(
                 order=self,
                 previous_status=None,
@@ -136,57 +136,55 @@ class Order(models.Model):
                 changed_by=current_user,
                 notes='Orden creada'
             )
-        
-        # Registrar cambio de estado de pago
-        if old_payment_status is not None and old_payment_status != self.payment_status:
             OrderPaymentStatusHistory.objects.create(
                 order=self,
-                previous_payment_status=old_payment_status,
+                previous_payment_status=None,
                 new_payment_status=self.payment_status,
                 changed_by=current_user,
+                notes='Estado de pago inicial'
+            )
+        
+        # Registrar cambio de estado de orden
+        if 'status' in changes:
+            OrderStatusHistory.objects.create(
+                order=self,
+                previous_status=changes['status'][0],
+                new_status=self.status,
+                changed_by=current_user,
                 notes=notes
             )
-        elif old_payment_status is None:  # Primera vez que se guarda
+        
+        # Registrar cambio de estado de pago
+        if 'payment_status' in changes:
             OrderPaymentStatusHistory.objects.create(
                 order=self,
-                previous_payment_status=None,
+                previous_payment_status=changes['payment_status'][0],
                 new_payment_status=self.payment_status,
                 changed_by=current_user,
-                notes='Estado de pago inicial'
+                notes=notes
             )
+        
+        self.reset_field_tracking(update_fields)
     
     def validate_calculations(self):
         """Valida que los cálculos del pedido sean correctos"""
         if self.pk:  # Solo validar si ya tiene items (pedido existente)
-            calculated_subtotal = sum(item.get_total_price() for item in self.items.all())
+            calculated_subtotal = self.items.aggregate(
+                subtotal=Sum(F('price') * F('quantity'))
+            )['subtotal'] or 0
             if calculated_subtotal != self.subtotal:
                 # Auto-corregir el subtotal si es diferente
                 self.subtotal = calculated_subtotal
             
-            calculated_total = self.subtotal + self.shipping_cost
+            calculated_total = self.subtotal - self.discount_amount + self.shipping_cost
             if calculated_total != self.total:
                 # Auto-corregir el total si es diferente
                 self.total = calculated_total
     
     def generate_order_number(self):
-        """Genera un número de pedido único"""
-        import datetime
-        today = datetime.date.today()
-        # Formato: DB-YYYYMMDD-XXXX
-        prefix = f"DB-{today.strftime('%Y%m%d')}"
-        
-        # Buscar el último pedido del día
-        last_order = Order.objects.filter(
-            order_number__startswith=prefix
-        ).order_by('-order_number').first()
-        
-        if last_order:
-            last_number = int(last_order.order_number.split('-')[-1])
-            new_number = last_number + 1
-        else:
-            new_number = 1
-        
-        return f"{prefix}-{new_number:04d}"
+        """Genera un número de pedido único (formato: DB-YYYYMMDD-XXXX)"""
+        from .sequences import next_order_number
+        return next_order_number()
     
     @property
     def full_name(self):
@@ -237,12 +235,14 @@ class Order(models.Model):
         return sum(item.quantity for item in self.items.all())
 
 
-class OrderItem(models.Model):
+class OrderItem(FieldTrackerMixin, models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     price = models.DecimalField(max_digits=10, decimal_places=0)  # Precio al momento de la compra
     quantity = models.PositiveIntegerField(default=1)
     
+    tracked_fields = ('order_id', 'product_id', 'price', 'quantity')
+    
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
@@ -415,3 +415,80 @@ class OrderPaymentStatusHistory(models.Model):
         old_status = dict(Order.PAYMENT_STATUS_CHOICES).get(self.previous_payment_status, 'Sin estado') if self.previous_payment_status else 'Estado inicial'
         new_status = dict(Order.PAYMENT_STATUS_CHOICES).get(self.new_payment_status, self.new_payment_status)
         return f"{old_status} → {new_status}"
+
+
+class OrderNumberSequence(models.Model):
+    """Contador diario para los números de pedido (ver orders.sequences)"""
+    day = models.DateField(unique=True)
+    last_value = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Secuencia de Números de Pedido"
+        verbose_name_plural = "Secuencias de Números de Pedido"
+        ordering = ['-day']
+    
+    def __str__(self):
+        return f"{self.day:%Y-%m-%d}: {self.last_value}"
+
+
+class DailyOrderRollup(models.Model):
+    """
+    Ventas por día y dimensiones del pedido (ver orders.analytics).
+    Se mantiene con cada cambio de pedido; ``manage.py rebuild_sales_rollups`` la recalcula.
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    region = models.CharField(max_length=10, choices=Order.REGION_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    
+    orders = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+    discount = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+    shipping = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Resumen Diario de Pedidos"
+        verbose_name_plural = "Resúmenes Diarios de Pedidos"
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'status', 'payment_status', 'region', 'payment_method'],
+                name='unique_daily_order_rollup'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.day:%Y-%m-%d} {self.status}/{self.payment_status}: {self.orders} pedidos"
+
+
+class DailyProductRollup(models.Model):
+    """Unidades e ingresos por día, producto y dimensiones del pedido (ver orders.analytics)"""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Order.PAYMENT_STATUS_CHOICES)
+    region = models.CharField(max_length=10, choices=Order.REGION_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=0, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Resumen Diario de Productos"
+        verbose_name_plural = "Resúmenes Diarios de Productos"
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'product', 'status', 'payment_status', 'region', 'payment_method'],
+                name='unique_daily_product_rollup'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.day:%Y-%m-%d} {self.product_id}: {self.units} unidades"
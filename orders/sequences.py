@@ -0,0 +1,86 @@
+"""
+Generador de números de pedido sin condiciones de carrera
+
+Cada día tiene una fila ``OrderNumberSequence`` cuyo contador se incrementa
+con un UPDATE atómico. Para no consultar la base de datos en cada pedido,
+cada proceso (worker de gunicorn) reserva bloques de números y los entrega
+desde memoria; los números quedan únicos aunque no estrictamente correlativos
+entre workers.
+
+Si la asignación ocurre dentro de una transacción (``transaction.atomic``) no
+se guarda bloque en memoria: un rollback devolvería el contador y otro proceso
+podría recibir los mismos números. En ese caso se reserva un único número y la
+fila queda bloqueada hasta el commit.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+ORDER_NUMBER_PREFIX = 'DB'
+BLOCK_SIZE = getattr(settings, 'ORDER_NUMBER_BLOCK_SIZE', 10)
+
+_lock = threading.Lock()
+_blocks = {}  # {date: [siguiente, último]}
+
+
+def format_order_number(day, number):
+    return f"{ORDER_NUMBER_PREFIX}-{day.strftime('%Y%m%d')}-{number:04d}"
+
+
+def _initial_value(day):
+    """Último correlativo ya usado ese día (pedidos previos a la secuencia)"""
+    from .models import Order
+    prefix = f"{ORDER_NUMBER_PREFIX}-{day.strftime('%Y%m%d')}-"
+    last_number = Order.objects.filter(
+        order_number__startswith=prefix
+    ).aggregate(last=Max('order_number'))['last']
+    if last_number:
+        return int(last_number.split('-')[-1])
+    return 0
+
+
+def allocate_block(day, size):
+    """
+    Reserva ``size`` números consecutivos para el día indicado.
+
+    Retorna (primero, último) del bloque reservado.
+    """
+    from .models import OrderNumberSequence
+
+    with transaction.atomic():
+        updated = OrderNumberSequence.objects.filter(day=day).update(
+            last_value=F('last_value') + size, updated_at=timezone.now()
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    OrderNumberSequence.objects.create(day=day, last_value=_initial_value(day) + size)
+            except IntegrityError:
+                # Otro proceso creó la fila del día al mismo tiempo
+                OrderNumberSequence.objects.filter(day=day).update(
+                    last_value=F('last_value') + size, updated_at=timezone.now()
+                )
+        last_value = OrderNumberSequence.objects.filter(day=day).values_list('last_value', flat=True).get()
+    return last_value - size + 1, last_value
+
+
+def next_order_number(day=None):
+    """Retorna el siguiente número de pedido con formato DB-YYYYMMDD-XXXX"""
+    day = day or timezone.localdate()
+
+    if connection.in_atomic_block or BLOCK_SIZE <= 1:
+        number, _ = allocate_block(day, 1)
+        return format_order_number(day, number)
+
+    with _lock:
+        block = _blocks.get(day)
+        if block is None or block[0] > block[1]:
+            # Descartar bloques de días anteriores
+            _blocks.clear()
+            block = _blocks[day] = list(allocate_block(day, BLOCK_SIZE))
+        number = block[0]
+        block[0] += 1
+    return format_order_number(day, number)
@@ -0,0 +1,53 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import analytics
+from .models import Order, OrderItem
+
+
+# Mantener los resúmenes diarios de ventas (ver orders.analytics)
+
+@receiver(post_save, sender=Order)
+def update_sales_rollups_on_order_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        analytics.record_order_created(instance)
+    else:
+        analytics.record_order_changes([instance])
+
+
+@receiver(pre_delete, sender=Order)
+def cache_order_values_before_deletion(sender, instance, **kwargs):
+    # La instancia puede estar desactualizada: se resta lo que está en la base de datos
+    instance._sales_values = Order.objects.filter(pk=instance.pk).values(*analytics.ORDER_FIELDS).first()
+
+
+@receiver(post_delete, sender=Order)
+def update_sales_rollups_on_order_delete(sender, instance, **kwargs):
+    values = getattr(instance, '_sales_values', None)
+    if values is not None:
+        analytics.record_order_deleted(instance, values)
+
+
+@receiver(pre_save, sender=OrderItem)
+def track_order_item_changes(sender, instance, update_fields=None, **kwargs):
+    instance._sales_changes = instance.get_field_changes(update_fields)
+
+
+@receiver(post_save, sender=OrderItem)
+def update_sales_rollups_on_item_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        analytics.record_order_items(instance.order, [instance])
+    elif getattr(instance, '_sales_changes', None):
+        analytics.record_item_changes(instance, instance._sales_changes)
+    instance.reset_field_tracking(update_fields)
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_sales_rollups_on_item_delete(sender, instance, **kwargs):
+    order = Order.objects.filter(pk=instance.order_id).first()
+    if order is not None:
+        analytics.record_order_items(order, [instance], sign=-1)
@@ -1,3 +1,246 @@
-from django.test import TestCase
+import datetime
+import threading
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection, connections, transaction
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from shop.models import Category, Product
+
+from . import analytics, sequences, transitions
+from .models import (
+    DailyOrderRollup, DailyProductRollup, Order, OrderItem, OrderNumberSequence, OrderStatusHistory
+)
+
+
+def create_product(category, name, **kwargs):
+    kwargs.setdefault('slug', name.lower().replace(' ', '-'))
+    kwargs.setdefault('description', '')
+    kwargs.setdefault('ingredients', '')
+    kwargs.setdefault('price', Decimal('1000'))
+    kwargs.setdefault('stock', 10)
+    kwargs.setdefault('image', 'products/test.jpg')
+    return Product.objects.create(category=category, name=name, **kwargs)
+
+
+def create_order(user, items=(), **kwargs):
+    """Pedido con sus items y montos calculados ([(producto, precio, cantidad)])"""
+    subtotal = sum(price * quantity for product, price, quantity in items)
+    kwargs.setdefault('region', 'rm')
+    order = Order.objects.create(
+        user=user, first_name='Ana', last_name='Pérez', email='ana@example.com', phone='912345678',
+        address='Calle 1', city='Santiago', subtotal=subtotal, total=subtotal, **kwargs
+    )
+    for product, price, quantity in items:
+        OrderItem.objects.create(order=order, product=product, price=price, quantity=quantity)
+    return order
+
+
+class OrderTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='cliente', email='cliente@example.com')
+        cls.category = Category.objects.create(name='Galletas', slug='galletas')
+        cls.product = create_product(cls.category, 'Galleta avena', price=Decimal('1000'))
+        cls.other_product = create_product(cls.category, 'Galleta chocolate', price=Decimal('1500'))
+
+
+class FieldTrackingTests(OrderTestCase):
+
+    def test_status_change_is_detected_without_refetching_the_order(self):
+        order = Order.objects.get(pk=create_order(self.user).pk)
+
+        order.status = 'confirmed'
+        with CaptureQueriesContext(connection) as queries:
+            order.save(update_fields=['status', 'updated_at'])
+
+        selects = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "orders_order"' in query['sql']
+        ]
+        self.assertEqual(selects, [])
+        self.assertEqual(order.last_field_changes, {'status': ('pending', 'confirmed')})
+        self.assertTrue(
+            OrderStatusHistory.objects.filter(order=order, previous_status='pending', new_status='confirmed').exists()
+        )
+
+    def test_saving_without_changes_records_no_history(self):
+        order = Order.objects.get(pk=create_order(self.user).pk)
+        history_count = OrderStatusHistory.objects.filter(order=order).count()
+
+        order.save()
+
+        self.assertEqual(order.last_field_changes, {})
+        self.assertEqual(OrderStatusHistory.objects.filter(order=order).count(), history_count)
+
+    def test_foreign_key_names_in_update_fields(self):
+        order = create_order(self.user, [(self.product, Decimal('1000'), 1)])
+        item = OrderItem.objects.get(order=order)
+
+        item.product = self.other_product
+        self.assertEqual(
+            item.get_field_changes(update_fields=['product']),
+            {'product_id': (self.product.pk, self.other_product.pk)}
+        )
+
+
+
+class SalesRollupTests(OrderTestCase):
+
+    def get_rollups(self):
+        """Filas de ambos resúmenes, sin id ni fecha de actualización"""
+        return (
+            sorted(
+                tuple(row.values())
+                for row in DailyOrderRollup.objects.values(*analytics.ORDER_KEY_FIELDS, *analytics.ORDER_MEASURES)
+            ),
+            sorted(
+                tuple(row.values())
+                for row in DailyProductRollup.objects.values(*analytics.PRODUCT_KEY_FIELDS, *analytics.PRODUCT_MEASURES)
+            ),
+        )
+
+    def assertMatchesRebuild(self):
+        live = self.get_rollups()
+        analytics.rebuild_sales_rollups()
+        self.assertEqual(live, self.get_rollups())
+
+    def test_status_and_payment_changes_move_the_order(self):
+        order = create_order(self.user, [(self.product, Decimal('1000'), 2), (self.other_product, Decimal('1500'), 1)])
+        other = create_order(self.user, [(self.product, Decimal('1000'), 1)])
+        self.assertEqual(analytics.get_order_counts()['by_status']['pending'], 2)
+        self.assertMatchesRebuild()
+
+        order.status = 'confirmed'
+        order.save()
+        order.payment_status = 'paid'
+        order.save(update_fields=['payment_status', 'updated_at'])
+
+        counts = analytics.get_order_counts()
+        self.assertEqual((counts['by_status']['pending'], counts['by_status']['confirmed']), (1, 1))
+        self.assertEqual((counts['revenue'], counts['total_amount']), (Decimal('3500'), Decimal('4500')))
+        day = analytics.get_order_day(order)
+        self.assertEqual(
+            analytics.get_top_products(day, day),
+            [
+                {
+                    'product_id': self.product.pk, 'product__name': 'Galleta avena', 'category_name': 'Galletas',
+                    'quantity_sold': 2, 'revenue': Decimal('2000'),
+                },
+                {
+                    'product_id': self.other_product.pk, 'product__name': 'Galleta chocolate',
+                    'category_name': 'Galletas', 'quantity_sold': 1, 'revenue': Decimal('1500'),
+                },
+            ]
+        )
+        self.assertMatchesRebuild()
+
+        transitions.bulk_transition_orders([order.pk, other.pk], 'cancelled', notify=False)
+        self.assertEqual(analytics.get_order_counts()['by_status']['cancelled'], 2)
+        self.assertMatchesRebuild()
+
+    def test_item_changes_move_their_contribution(self):
+        order = create_order(self.user, [(self.product, Decimal('1000'), 2)])
+        other = create_order(self.user, [(self.other_product, Decimal('1500'), 1)])
+        item = OrderItem.objects.get(order=order)
+
+        item.quantity = 3
+        item.price = Decimal('900')
+        item.save()
+        self.assertMatchesRebuild()
+
+        item.product = self.other_product
+        item.save(update_fields=['product'])
+        self.assertMatchesRebuild()
+
+        item.order = other
+        item.save()
+        self.assertMatchesRebuild()
+
+        OrderItem.objects.create(order=order, product=self.product, price=Decimal('1000'), quantity=1)
+        item.delete()
+        self.assertMatchesRebuild()
+
+    def test_deleted_orders_leave_no_empty_rows(self):
+        order = create_order(self.user, [(self.product, Decimal('1000'), 2)])
+        order.payment_status = 'paid'
+        order.save()
+
+        Order.objects.get(pk=order.pk).delete()
+
+        self.assertEqual(self.get_rollups(), ([], []))
+        self.assertEqual(analytics.get_order_counts()['total'], 0)
+
+
+class OrderNumberSequenceTests(TransactionTestCase):
+    day = datetime.date(2026, 10, 18)
+
+    def setUp(self):
+        sequences._blocks.clear()
+        self.addCleanup(sequences._blocks.clear)
+
+    def test_threads_share_the_in_memory_block(self):
+        numbers = []
+        errors = []
+
+        def work():
+            try:
+                for _ in range(25):
+                    numbers.append(sequences.next_order_number(self.day))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(sequences, 'BLOCK_SIZE', 10):
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(numbers), [sequences.format_order_number(self.day, n) for n in range(1, 201)])
+        self.assertEqual(OrderNumberSequence.objects.get(day=self.day).last_value, 200)
+
+    def test_workers_get_disjoint_blocks(self):
+        with mock.patch.object(sequences, 'BLOCK_SIZE', 10):
+            first = [sequences.next_order_number(self.day) for _ in range(3)]
+            # Otro worker: su propio bloque en memoria
+            sequences._blocks.clear()
+            second = [sequences.next_order_number(self.day) for _ in range(3)]
+
+        self.assertEqual([number[-4:] for number in first + second], ['0001', '0002', '0003', '0011', '0012', '0013'])
+
+    def test_inside_a_transaction_allocates_one_number(self):
+        with transaction.atomic():
+            number = sequences.next_order_number(self.day)
+
+        self.assertEqual(number, 'DB-20261018-0001')
+        self.assertEqual(sequences._blocks, {})
+        self.assertEqual(OrderNumberSequence.objects.get(day=self.day).last_value, 1)
+
+    def test_continues_after_orders_numbered_before_the_sequence(self):
+        user = User.objects.create(username='cliente')
+        create_order(user, order_number='DB-20261018-0041')
+
+        self.assertEqual(sequences.allocate_block(self.day, 1), (42, 42))
+
+    def test_day_row_created_concurrently_by_another_process(self):
+        # Otro proceso crea la fila del día entre nuestro UPDATE (0 filas) y nuestro INSERT
+        OrderNumberSequence.objects.create(day=self.day, last_value=5)
+        update = QuerySet.update
+        calls = []
+
+        def update_missing_the_row(queryset, **kwargs):
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update_missing_the_row):
+            self.assertEqual(sequences.allocate_block(self.day, 2), (6, 7))
+        self.assertEqual(len(calls), 2)
@@ -5,6 +5,7 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.utils import timezone
 from orders.models import Order, TransferPayment
+from management.dashboard_stats import get_stats
 from django.contrib.auth.models import User
 
 
@@ -114,11 +115,10 @@ def transfer_management_view(request):
         'transfer_payments': transfer_payments,
         'status_choices': TransferPayment.TRANSFER_STATUS_CHOICES,
         'current_status': status_filter,
-        'pending_count': TransferPayment.objects.filter(status='pending').count(),
-        'verified_count': TransferPayment.objects.filter(status='verified').count(),
-        'approved_count': TransferPayment.objects.filter(status='approved').count(),
-        'rejected_count': TransferPayment.objects.filter(status='rejected').count(),
-        'expired_count': TransferPayment.objects.filter(status='expired').count(),
     }
+    # Contadores cacheados, una sola consulta (ver management.dashboard_stats)
+    transfer_counts = get_stats('transfers')['transfers']
+    for status, display in TransferPayment.TRANSFER_STATUS_CHOICES:
+        context[f'{status}_count'] = transfer_counts[status]
     
     return render(request, 'orders/admin/transfer_management.html', context)
@@ -0,0 +1,158 @@
+"""
+Transiciones de estado de pedidos
+
+``ORDER_STATUS_TRANSITIONS`` define qué cambios de estado están permitidos.
+``bulk_transition_orders`` aplica una transición a muchos pedidos dentro de
+una sola transacción con un número de consultas independiente de la
+cantidad de pedidos: un único UPDATE para el nuevo estado, el historial con
+``bulk_create``, los movimientos de stock agregados por producto
+(``shop.stock.apply_orders_stock``) y las notificaciones en lote (encoladas o,
+en modo de despacho 'sync', enviadas después del commit).
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from shop import stock
+
+# Estados alcanzables desde cada estado
+ORDER_STATUS_TRANSITIONS = {
+    'pending': {'confirmed', 'processing', 'cancelled'},
+    'confirmed': {'pending', 'processing', 'shipped', 'cancelled'},
+    'processing': {'confirmed', 'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': {'pending'},
+}
+
+# Estados en los que el pedido mantiene stock reservado
+STOCK_RESERVED_STATUSES = {'pending', 'confirmed', 'processing'}
+
+
+def can_transition(old_status, new_status):
+    """Indica si un pedido puede pasar de ``old_status`` a ``new_status``"""
+    return new_status in ORDER_STATUS_TRANSITIONS.get(old_status, set())
+
+
+def get_stock_operation(old_status, new_status):
+    """Operación de stock asociada a un cambio de estado (o None)"""
+    if new_status == 'cancelled' and old_status in STOCK_RESERVED_STATUSES:
+        return stock.RESTORE
+    if old_status == 'cancelled' and new_status in STOCK_RESERVED_STATUSES:
+        return stock.RESERVE
+    if new_status == 'delivered' and old_status != 'delivered':
+        return stock.CONFIRM_DELIVERY
+    return None
+
+
+def bulk_transition_orders(order_ids, new_status, changed_by=None, notes='', notify=True):
+    """
+    Cambia el estado de varios pedidos de una sola vez.
+
+    Los pedidos cuya transición no está permitida (o que ya están en
+    ``new_status``) se omiten. Retorna un dict con las listas ``updated`` y
+    ``skipped`` de pedidos.
+    """
+    from cart.summary import invalidate_cart_summary
+    from notifications.models import Notification
+    from notifications.services import (
+        NotificationFactory, NotificationService, get_dispatch_mode, wake_up_notification_worker
+    )
+    from . import analytics
+    from .models import Order, OrderStatusHistory
+
+    if new_status not in dict(Order.STATUS_CHOICES):
+        raise ValueError(f'Estado de pedido desconocido: {new_status}')
+
+    now = timezone.now()
+    updated = []
+    skipped = []
+
+    with transaction.atomic():
+        orders = list(
+            Order.objects.select_for_update(of=('self',))
+            .select_related('user__notification_preferences')
+            .filter(id__in=order_ids)
+            .order_by('id')
+        )
+
+        for order in orders:
+            if can_transition(order.status, new_status):
+                updated.append(order)
+            else:
+                skipped.append(order)
+
+        if not updated:
+            return {'updated': updated, 'skipped': skipped}
+
+        previous_statuses = {order.pk: order.status for order in updated}
+
+        # Un UPDATE para el estado; las fechas de envío/entrega se fijan solo si faltaban
+        Order.objects.filter(pk__in=previous_statuses).update(status=new_status, updated_at=now)
+        for date_field, status in (('shipped_at', 'shipped'), ('delivered_at', 'delivered')):
+            if new_status == status:
+                Order.objects.filter(pk__in=previous_statuses, **{f'{date_field}__isnull': True}).update(
+                    **{date_field: now}
+                )
+
+        for order in updated:
+            order.status = new_status
+            order.updated_at = now
+            if new_status == 'shipped' and not order.shipped_at:
+                order.shipped_at = now
+            elif new_status == 'delivered' and not order.delivered_at:
+                order.delivered_at = now
+            order.last_field_changes = {'status': (previous_statuses[order.pk], new_status)}
+            order.reset_field_tracking()
+
+        # El UPDATE no pasa por Order.save: los resúmenes de ventas se mueven aquí
+        analytics.record_order_changes(updated)
+        # ... y tampoco dispara post_save (cart.signals): invalidar el resumen del carrito
+        user_ids = {order.user_id for order in updated}
+        transaction.on_commit(lambda: invalidate_cart_summary(*user_ids))
+
+        OrderStatusHistory.objects.bulk_create([
+            OrderStatusHistory(
+                order=order,
+                previous_status=previous_statuses[order.pk],
+                new_status=new_status,
+                changed_by=changed_by,
+                notes=notes
+            )
+            for order in updated
+        ])
+
+        # Movimientos de stock agrupados por operación (una pasada por producto)
+        orders_by_operation = {}
+        for order in updated:
+            operation = get_stock_operation(previous_statuses[order.pk], new_status)
+            if operation:
+                orders_by_operation.setdefault(operation, []).append(order)
+        for operation, operation_orders in orders_by_operation.items():
+            stock.apply_orders_stock(operation_orders, operation)
+
+        if notify:
+            status_display = dict(Order.STATUS_CHOICES)[new_status]
+            notifications = [
+                NotificationFactory.build_notification(
+                    user=order.user,
+                    notification_type='order_update',
+                    channel='email',
+                    subject=f'Actualización de Pedido #{order.id}',
+                    message=f'Tu pedido #{order.id} ha cambiado a: {status_display}',
+                    extra_data={
+                        'order_id': order.id,
+                        'new_status': new_status
+                    }
+                )
+                for order in updated
+            ]
+            # Igual que el despacho de un pedido: en modo 'sync' se envían después
+            # del commit; en modo 'queue' las envía el worker
+            if get_dispatch_mode() == 'sync':
+                notifications = Notification.objects.bulk_create(notifications)
+                transaction.on_commit(lambda: NotificationService().send_batch(notifications))
+            else:
+                NotificationFactory.queue_notifications(notifications)
+                transaction.on_commit(wake_up_notification_worker)
+
+    return {'updated': updated, 'skipped': skipped}
@@ -108,6 +108,7 @@ from django.db.models import Count
 from django.utils import timezone
 from datetime import timedelta
 from .models import OrderStatusHistory, OrderPaymentStatusHistory
+from management.dashboard_stats import get_stats
 
 
 def is_superuser(user):
@@ -118,22 +119,21 @@ def is_superuser(user):
 @user_passes_test(is_superuser)
 def admin_orders_dashboard(request):
     """Panel de administración de órdenes con historial"""
-    # Estadísticas generales
-    total_orders = Order.objects.count()
+    # Estadísticas generales: contadores cacheados del resumen diario
+    counts = get_stats('orders')['orders']
+    total_orders = counts['total']
     recent_cutoff = timezone.now() - timedelta(days=7)
-    recent_orders = Order.objects.filter(created_at__gte=recent_cutoff).count()
+    recent_orders = counts['recent'][7]
     
     # Órdenes por estado
     status_stats = {}
     for status_code, status_name in Order.STATUS_CHOICES:
-        count = Order.objects.filter(status=status_code).count()
-        status_stats[status_name] = count
+        status_stats[status_name] = counts['by_status'][status_code]
     
     # Órdenes por estado de pago
     payment_status_stats = {}
     for payment_code, payment_name in Order.PAYMENT_STATUS_CHOICES:
-        count = Order.objects.filter(payment_status=payment_code).count()
-        payment_status_stats[payment_name] = count
+        payment_status_stats[payment_name] = counts['by_payment_status'][payment_code]
     
     # Órdenes recientes con historial
     recent_orders_with_history = Order.objects.filter(
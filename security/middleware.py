@@ -5,143 +5,76 @@ import logging
 import time
 from datetime import datetime, timedelta
 from django.http import HttpResponseForbidden, HttpResponse
-from django.core.cache import cache
 from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 from django.shortcuts import render
 from django.contrib.auth.signals import user_login_failed
 from django.dispatch import receiver
+from .ratelimit import get_rate_limiter
+from .screening import find_suspicious_pattern, get_client_ip
 import json
 
 logger = logging.getLogger('security')
 
 
+class RequestScreeningMiddleware:
+    """
+    Inspección única de cada request (ver security.screening): fija la IP del
+    cliente y registra las rutas con patrones sospechosos.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        ip = get_client_ip(request)
+        pattern = find_suspicious_pattern(request)
+        if pattern is not None:
+            logger.warning(
+                f'Suspicious request detected: {request.method} {request.get_full_path()} '
+                f'from IP: {ip} '
+                f'User-Agent: {request.META.get("HTTP_USER_AGENT", "Unknown")}'
+            )
+        return self.get_response(request)
+
+
 class SecurityLogMiddleware(MiddlewareMixin):
     """Middleware para logging de actividades de seguridad"""
     
     def process_request(self, request):
-        # Log de requests sospechosos
-        suspicious_patterns = [
-            '/admin/login',
-            '/.env',
-            '/wp-admin',
-            '/phpmyadmin',
-            '/config',
-            '/../',
-            '/etc/passwd',
-            'eval(',
-            '<script',
-            'javascript:',
-            'onload=',
-            'onerror=',
-        ]
-        
-        path = request.get_full_path().lower()
-        for pattern in suspicious_patterns:
-            if pattern in path:
-                logger.warning(
-                    f'Suspicious request detected: {request.method} {path} '
-                    f'from IP: {self.get_client_ip(request)} '
-                    f'User-Agent: {request.META.get("HTTP_USER_AGENT", "Unknown")}'
-                )
-                break
-        
         # Log intentos de acceso a admin (después de autenticación)
         if '/admin/' in request.path and request.method == 'POST':
             user = getattr(request, 'user', None)
             username = getattr(user, 'username', 'Anonymous') if user else 'Anonymous'
             logger.info(
                 f'Admin access attempt: {request.path} '
-                f'from IP: {self.get_client_ip(request)} '
+                f'from IP: {get_client_ip(request)} '
                 f'User: {username}'
             )
         
         return None
-    
-    def get_client_ip(self, request):
-        """Obtener IP real del cliente"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
 
 
 class RateLimitMiddleware(MiddlewareMixin):
-    """Middleware para rate limiting"""
+    """Middleware para rate limiting (reglas y algoritmos en security.ratelimit)"""
     
     def process_request(self, request):
         if not getattr(settings, 'RATELIMIT_ENABLE', True):
             return None
         
-        ip = self.get_client_ip(request)
-        
-        # Rate limiting para diferentes endpoints
-        limits = {
-            '/accounts/login/': getattr(settings, 'RATE_LIMIT_LOGIN', '5/m'),
-            '/accounts/password-reset/': getattr(settings, 'RATE_LIMIT_PASSWORD_RESET', '3/h'),
-            '/support/contact/': getattr(settings, 'RATE_LIMIT_CONTACT_FORM', '10/h'),
-            '/admin/shop/taxconfiguration/': getattr(settings, 'RATE_LIMIT_ADMIN_TAX', '10/m'),
-            '/admin/shop/discountcoupon/': getattr(settings, 'RATE_LIMIT_ADMIN_COUPONS', '15/m'),
-            '/admin/shop/supplier/': getattr(settings, 'RATE_LIMIT_ADMIN_SUPPLIERS', '10/m'),
-            '/admin/shop/productstock/': getattr(settings, 'RATE_LIMIT_ADMIN_STOCK', '20/m'),
-            '/admin/shop/productsupplier/': getattr(settings, 'RATE_LIMIT_ADMIN_RELATIONS', '15/m'),
-            '/management/': getattr(settings, 'RATE_LIMIT_MANAGEMENT', '30/m'),
-            '/management/tax/': getattr(settings, 'RATE_LIMIT_MANAGEMENT_TAX', '15/m'),
-            '/management/coupon/': getattr(settings, 'RATE_LIMIT_MANAGEMENT_COUPONS', '15/m'),
-            '/management/supplier/': getattr(settings, 'RATE_LIMIT_MANAGEMENT_SUPPLIERS', '15/m'),
-            '/management/stock/': getattr(settings, 'RATE_LIMIT_MANAGEMENT_STOCK', '20/m'),
-            '/management/relations/': getattr(settings, 'RATE_LIMIT_MANAGEMENT_RELATIONS', '15/m'),
-        }
-        
-        for path, limit in limits.items():
-            if request.path.startswith(path):
-                if self.is_rate_limited(ip, path, limit):
-                    logger.warning(f'Rate limit exceeded for IP {ip} on {path}')
-                    return HttpResponseForbidden(
-                        '<h1>Too Many Requests</h1><p>Please try again later.</p>',
-                        content_type='text/html'
-                    )
+        ip = get_client_ip(request)
+        result = get_rate_limiter().check(ip, request.path)
+        if result is None:
+            return None
         
-        return None
-    
-    def get_client_ip(self, request):
-        """Obtener IP real del cliente"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
-    
-    def is_rate_limited(self, ip, path, limit):
-        """Verificar si la IP excede el rate limit"""
-        try:
-            requests, period = limit.split('/')
-            requests = int(requests)
-            
-            # Convertir período a segundos
-            if period.endswith('s'):
-                seconds = int(period[:-1])
-            elif period.endswith('m'):
-                seconds = int(period[:-1]) * 60
-            elif period.endswith('h'):
-                seconds = int(period[:-1]) * 3600
-            else:
-                seconds = 60  # Default 1 minuto
-            
-            cache_key = f'rate_limit:{ip}:{path}'
-            current_requests = cache.get(cache_key, 0)
-            
-            if current_requests >= requests:
-                return True
-            
-            cache.set(cache_key, current_requests + 1, seconds)
-            return False
-            
-        except (ValueError, AttributeError):
-            return False
+        logger.warning(f'Rate limit exceeded for IP {ip} on {result.rule.prefix}')
+        response = HttpResponse(
+            '<h1>Too Many Requests</h1><p>Please try again later.</p>',
+            content_type='text/html',
+            status=429
+        )
+        response['Retry-After'] = str(result.retry_after)
+        return response
 
 
 class SecurityHeadersMiddleware(MiddlewareMixin):
@@ -172,7 +105,7 @@ class IPWhitelistMiddleware(MiddlewareMixin):
         if settings.DEBUG or not request.path.startswith('/admin/'):
             return None
         
-        ip = self.get_client_ip(request)
+        ip = get_client_ip(request)
         whitelist = getattr(settings, 'ADMIN_IP_WHITELIST', [])
         
         if whitelist and ip not in whitelist:
@@ -183,15 +116,6 @@ class IPWhitelistMiddleware(MiddlewareMixin):
             )
         
         return None
-    
-    def get_client_ip(self, request):
-        """Obtener IP real del cliente"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
 
 
 class AdminModulesAccessMiddleware(MiddlewareMixin):
@@ -226,7 +150,7 @@ class AdminModulesAccessMiddleware(MiddlewareMixin):
         if not user.is_authenticated:
             logger.warning(
                 f'Unauthorized access attempt to {request.path} '
-                f'from IP: {self.get_client_ip(request)}'
+                f'from IP: {get_client_ip(request)}'
             )
             return None  # Django manejará la redirección al login
         
@@ -246,7 +170,7 @@ class AdminModulesAccessMiddleware(MiddlewareMixin):
             logger.warning(
                 f'Non-superuser access denied to {request.path} '
                 f'for user: {user.username} '
-                f'from IP: {self.get_client_ip(request)}'
+                f'from IP: {get_client_ip(request)}'
             )
             return HttpResponseForbidden(
                 '''
@@ -277,7 +201,7 @@ class AdminModulesAccessMiddleware(MiddlewareMixin):
             logger.warning(
                 f'Non-staff access denied to {request.path} '
                 f'for user: {user.username} '
-                f'from IP: {self.get_client_ip(request)}'
+                f'from IP: {get_client_ip(request)}'
             )
             return HttpResponseForbidden(
                 '''
@@ -301,16 +225,7 @@ class AdminModulesAccessMiddleware(MiddlewareMixin):
         logger.info(
             f'Admin module access granted: {request.path} '
             f'for user: {user.username} (superuser: {user.is_superuser}) '
-            f'from IP: {self.get_client_ip(request)}'
+            f'from IP: {get_client_ip(request)}'
         )
         
         return None
-    
-    def get_client_ip(self, request):
-        """Obtener IP real del cliente"""
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        return ip
@@ -0,0 +1,241 @@
+"""
+Rate limiting por IP y ruta
+
+Las reglas se compilan una vez en un trie de segmentos de ruta
+(``RouteTrie``), así que encontrar las reglas de una request cuesta lo que
+la profundidad de la ruta y no la cantidad de reglas. Una ruta aplica todas
+las reglas de sus prefijos (ej: ``/management/tax/`` cuenta para
+``/management/`` y para ``/management/tax/``).
+
+Cada regla se escribe como ``"<cantidad>/<período> [algoritmo]"``:
+
+- ``"20/m"`` o ``"20/m sliding"``: ventana deslizante (dos ventanas fijas
+  ponderadas; un ``incr`` atómico y una lectura por request)
+- ``"5/m fixed"``: ventana fija (un ``incr``; el TTL no se renueva)
+- ``"30/m bucket=10"``: token bucket con ráfagas de hasta 10 requests y
+  recarga de 30 por minuto (GCRA sobre ``atomic_update``)
+
+Períodos: ``s``, ``m``, ``h``, ``d``, opcionalmente con multiplicador
+(``10s``, ``15m``). Los contadores viven en el cache compartido (ver
+``dulce_bias_project.cache``), así que el límite es el mismo con cualquier
+cantidad de workers.
+"""
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from dulce_bias_project.cache import atomic_update, cache, incr
+
+logger = logging.getLogger('security')
+
+# (prefijo, setting, valor por defecto)
+DEFAULT_RULES = (
+    ('/accounts/login/', 'RATE_LIMIT_LOGIN', '5/m'),
+    ('/accounts/password-reset/', 'RATE_LIMIT_PASSWORD_RESET', '3/h'),
+    ('/support/contact/', 'RATE_LIMIT_CONTACT_FORM', '10/h'),
+    ('/admin/shop/taxconfiguration/', 'RATE_LIMIT_ADMIN_TAX', '10/m'),
+    ('/admin/shop/discountcoupon/', 'RATE_LIMIT_ADMIN_COUPONS', '15/m'),
+    ('/admin/shop/supplier/', 'RATE_LIMIT_ADMIN_SUPPLIERS', '10/m'),
+    ('/admin/shop/productstock/', 'RATE_LIMIT_ADMIN_STOCK', '20/m'),
+    ('/admin/shop/productsupplier/', 'RATE_LIMIT_ADMIN_RELATIONS', '15/m'),
+    ('/management/', 'RATE_LIMIT_MANAGEMENT', '30/m'),
+    ('/management/tax/', 'RATE_LIMIT_MANAGEMENT_TAX', '15/m'),
+    ('/management/coupon/', 'RATE_LIMIT_MANAGEMENT_COUPONS', '15/m'),
+    ('/management/supplier/', 'RATE_LIMIT_MANAGEMENT_SUPPLIERS', '15/m'),
+    ('/management/stock/', 'RATE_LIMIT_MANAGEMENT_STOCK', '20/m'),
+    ('/management/relations/', 'RATE_LIMIT_MANAGEMENT_RELATIONS', '15/m'),
+)
+
+SLIDING = 'sliding'
+FIXED = 'fixed'
+BUCKET = 'bucket'
+
+PERIOD_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+RULE_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*(?:(sliding|fixed|bucket)(?:\s*=\s*(\d+))?)?\s*$')
+
+KEY_PREFIX = 'ratelimit'
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    prefix: str
+    limit: int
+    period: int
+    algorithm: str = SLIDING
+    burst: int = 0
+
+    @property
+    def key(self):
+        return f'{KEY_PREFIX}:{self.prefix}'
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    rule: RateLimitRule
+    allowed: bool
+    retry_after: int = 0
+
+
+def parse_rule(prefix, spec):
+    """``RateLimitRule`` desde ``"5/m"``, ``"10/15m fixed"``, ``"30/m bucket=10"``"""
+    match = RULE_RE.match(spec or '')
+    if not match:
+        raise ValueError(f'Regla de rate limit inválida para {prefix}: {spec!r}')
+    limit, multiplier, unit, algorithm, burst = match.groups()
+    algorithm = algorithm or SLIDING
+    return RateLimitRule(
+        prefix=prefix,
+        limit=int(limit),
+        period=int(multiplier or 1) * PERIOD_SECONDS[unit],
+        algorithm=algorithm,
+        burst=int(burst or limit) if algorithm == BUCKET else 0,
+    )
+
+
+def split_path(path):
+    return [segment for segment in path.split('/') if segment]
+
+
+class RouteTrie:
+    """Trie de segmentos de ruta: cada nodo guarda las reglas de ese prefijo"""
+
+    RULES = None  # Llave de las reglas dentro de cada nodo (los segmentos son str)
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, prefix, rule):
+        node = self.root
+        for segment in split_path(prefix):
+            node = node.setdefault(segment, {})
+        node.setdefault(self.RULES, []).append(rule)
+
+    def match(self, path):
+        """Reglas de todos los prefijos de ``path``, del más corto al más largo"""
+        node = self.root
+        rules = list(node.get(self.RULES, ()))
+        for segment in split_path(path):
+            node = node.get(segment)
+            if node is None:
+                break
+            rules.extend(node.get(self.RULES, ()))
+        return rules
+
+
+# Algoritmos: cada uno retorna (permitido, segundos para reintentar)
+
+def hit_fixed_window(rule, client, now):
+    window = int(now // rule.period)
+    # La llave es de la ventana: el TTL se fija al crearla y no se renueva
+    count = incr(f'{rule.key}:{client}:{window}', 1, rule.period)
+    if count <= rule.limit:
+        return True, 0
+    return False, math.ceil((window + 1) * rule.period - now)
+
+
+def hit_sliding_window(rule, client, now):
+    window = int(now // rule.period)
+    elapsed = now - window * rule.period
+    key = f'{rule.key}:{client}:{window}'
+
+    current = incr(key, 1, 2 * rule.period)
+    previous = cache.get(f'{rule.key}:{client}:{window - 1}', 0)
+    weight = 1 - elapsed / rule.period
+    if previous * weight + current <= rule.limit:
+        return True, 0
+
+    # Las requests rechazadas no consumen cupo
+    cache.decr(key)
+    current -= 1
+    if current >= rule.limit:
+        # Hasta que la ventana actual pase a ser la anterior y pese menos
+        retry_after = rule.period - elapsed + rule.period * (1 - (rule.limit - 1) / max(current, 1))
+    else:
+        # Hasta que el peso de la ventana anterior deje espacio para una request
+        retry_after = rule.period * (1 - (rule.limit - current - 1) / previous) - elapsed
+    return False, max(1, math.ceil(retry_after))
+
+
+def hit_token_bucket(rule, client, now):
+    """GCRA: equivalente a un token bucket de ``burst`` fichas que se recarga a limit/period"""
+    interval = rule.period / rule.limit
+    tolerance = interval * rule.burst
+
+    def update(tat):
+        tat = max(tat or now, now)
+        new_tat = tat + interval
+        wait = new_tat - now - tolerance
+        if wait > 0:
+            return None, (False, max(1, math.ceil(wait)))
+        return new_tat, (True, 0)
+
+    return atomic_update(f'{rule.key}:{client}', update, math.ceil(tolerance + interval))
+
+
+ALGORITHMS = {
+    FIXED: hit_fixed_window,
+    SLIDING: hit_sliding_window,
+    BUCKET: hit_token_bucket,
+}
+
+
+class RateLimiter:
+    """Reglas compiladas; ``check(client, path)`` aplica las que correspondan"""
+
+    def __init__(self, rules):
+        self.trie = RouteTrie()
+        for rule in rules:
+            self.trie.add(rule.prefix, rule)
+
+    @classmethod
+    def from_settings(cls):
+        specs = {prefix: getattr(settings, name, default) for prefix, name, default in DEFAULT_RULES}
+        # Reglas adicionales o que reemplazan a las anteriores: {prefijo: regla}
+        specs.update(getattr(settings, 'RATE_LIMIT_RULES', {}))
+
+        rules = []
+        for prefix, spec in specs.items():
+            if not spec:
+                continue
+            try:
+                rules.append(parse_rule(prefix, spec))
+            except ValueError as e:
+                logger.error(str(e))
+        return cls(rules)
+
+    def check(self, client, path, now=None):
+        """
+        Registra la request y retorna el ``RateLimitResult`` de la primera regla
+        excedida (o None si ninguna lo está).
+        """
+        now = time.time() if now is None else now
+        for rule in self.trie.match(path):
+            allowed, retry_after = ALGORITHMS[rule.algorithm](rule, client, now)
+            if not allowed:
+                return RateLimitResult(rule=rule, allowed=False, retry_after=retry_after)
+        return None
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """Limitador compartido por el proceso (las reglas se compilan una vez)"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter.from_settings()
+    return _rate_limiter
+
+
+@receiver(setting_changed)
+def reset_rate_limiter(setting, **kwargs):
+    global _rate_limiter
+    if setting.startswith('RATE_LIMIT'):
+        _rate_limiter = None
@@ -0,0 +1,56 @@
+"""
+Inspección de requests
+
+``RequestScreeningMiddleware`` (ver ``security.middleware``) corre una sola
+vez por request, antes del resto del stack de seguridad:
+
+- calcula la IP del cliente y la deja en ``request.client_ip``; el resto de
+  los middlewares y vistas la leen con ``get_client_ip(request)``
+- busca patrones sospechosos en la ruta y la query string, pasando a
+  minúsculas una sola vez y sin reconstruir la URL con ``get_full_path()``
+  (que vuelve a codificar la ruta en cada llamada)
+
+Los avisos se escriben en el logger ``security``, que envía los registros a
+un ``QueueHandler`` (ver ``dulce_bias_project.log``): la request no espera
+la escritura del archivo.
+"""
+SUSPICIOUS_PATTERNS = (
+    '/admin/login',
+    '/.env',
+    '/wp-admin',
+    '/phpmyadmin',
+    '/config',
+    '/../',
+    '/etc/passwd',
+    'eval(',
+    '<script',
+    'javascript:',
+    'onload=',
+    'onerror=',
+)
+
+# Nota: en CPython una expresión regular con todos los patrones (alternación
+# compilada) es más lenta que buscar cada patrón con ``in``, que usa la
+# búsqueda de substrings en C; para una docena de patrones se prefiere ``in``.
+
+
+def get_client_ip(request):
+    """IP real del cliente (primera de X-Forwarded-For); se calcula una vez por request"""
+    ip = getattr(request, 'client_ip', None)
+    if ip is None:
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            ip = x_forwarded_for.split(',', 1)[0].strip()
+        else:
+            ip = request.META.get('REMOTE_ADDR')
+        request.client_ip = ip
+    return ip
+
+
+def find_suspicious_pattern(request):
+    """Primer patrón sospechoso presente en la ruta o la query string, o None"""
+    target = f"{request.path}?{request.META.get('QUERY_STRING', '')}".lower()
+    for pattern in SUSPICIOUS_PATTERNS:
+        if pattern in target:
+            return pattern
+    return None
@@ -0,0 +1,143 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from dulce_bias_project.cache import cache
+
+from .ratelimit import BUCKET, FIXED, SLIDING, RateLimiter, RateLimitRule, parse_rule
+
+
+class ParseRuleTests(SimpleTestCase):
+
+    def test_parses_limit_period_and_algorithm(self):
+        self.assertEqual(parse_rule('/a/', '5/m'), RateLimitRule('/a/', 5, 60, SLIDING))
+        self.assertEqual(parse_rule('/a/', '10 / 15m fixed'), RateLimitRule('/a/', 10, 900, FIXED))
+        self.assertEqual(parse_rule('/a/', '30/h bucket=10'), RateLimitRule('/a/', 30, 3600, BUCKET, burst=10))
+        self.assertEqual(parse_rule('/a/', '30/h bucket').burst, 30)
+
+    def test_rejects_invalid_rules(self):
+        for spec in ('', '5', '5/w', 'm/5', '5/m leaky'):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_rule('/a/', spec)
+
+
+class RateLimiterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def get_limiter(self, *rules):
+        return RateLimiter([parse_rule(prefix, spec) for prefix, spec in rules])
+
+    def hit(self, limiter, now, path='/login/', client='10.0.0.1'):
+        """Segundos para reintentar, o None si la request se permite"""
+        result = limiter.check(client, path, now=now)
+        return None if result is None else result.retry_after
+
+
+class RouteMatchingTests(RateLimiterTestCase):
+
+    def test_applies_the_rules_of_every_prefix(self):
+        limiter = self.get_limiter(('/management/', '3/m fixed'), ('/management/tax/', '1/m fixed'))
+
+        self.assertEqual(self.hit(limiter, 120, '/management/tax/1/'), None)
+        self.assertEqual(self.hit(limiter, 120, '/management/tax/1/'), 60)
+        # La regla más general ya contó las dos requests anteriores
+        self.assertEqual(self.hit(limiter, 120, '/management/orders/'), None)
+        self.assertEqual(self.hit(limiter, 120, '/management/orders/'), 60)
+
+    def test_matches_whole_segments_only(self):
+        limiter = self.get_limiter(('/management/', '1/m fixed'))
+
+        self.assertEqual(self.hit(limiter, 120, '/managementx/'), None)
+        self.assertEqual(self.hit(limiter, 120, '/managementx/'), None)
+
+    def test_counts_each_client_separately(self):
+        limiter = self.get_limiter(('/login/', '1/m fixed'))
+
+        self.assertEqual(self.hit(limiter, 120, client='10.0.0.1'), None)
+        self.assertEqual(self.hit(limiter, 120, client='10.0.0.2'), None)
+        self.assertEqual(self.hit(limiter, 120, client='10.0.0.1'), 60)
+
+
+class FixedWindowTests(RateLimiterTestCase):
+
+    def test_resets_at_the_window_boundary(self):
+        limiter = self.get_limiter(('/login/', '3/m fixed'))
+
+        self.assertEqual([self.hit(limiter, 120) for _ in range(3)], [None] * 3)
+        self.assertEqual(self.hit(limiter, 150), 30)
+        self.assertEqual(self.hit(limiter, 179.5), 1)
+        self.assertEqual(self.hit(limiter, 180), None)
+
+
+class SlidingWindowTests(RateLimiterTestCase):
+
+    def assertRetryAfterIsExact(self, limiter, now, retry_after):
+        """Se rechaza hasta justo antes de ``retry_after`` y se permite en ese momento"""
+        self.assertEqual(self.hit(limiter, now + retry_after - 0.5), 1)
+        self.assertEqual(self.hit(limiter, now + retry_after), None)
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        limiter = self.get_limiter(('/login/', '10/m'))
+        self.assertEqual([self.hit(limiter, 60) for _ in range(10)], [None] * 10)
+
+        # A mitad de la ventana siguiente la anterior pesa 10 * 0.5 = 5
+        self.assertEqual([self.hit(limiter, 150) for _ in range(5)], [None] * 5)
+        # Con 5 en la ventana actual: 60 * (1 - 4/10) - 30 = 6 segundos
+        self.assertEqual(self.hit(limiter, 150), 6)
+        self.assertRetryAfterIsExact(limiter, 150, 6)
+
+    def test_full_current_window_waits_for_it_to_become_the_previous_one(self):
+        limiter = self.get_limiter(('/login/', '3/m'))
+        self.assertEqual([self.hit(limiter, 120) for _ in range(3)], [None] * 3)
+
+        # 60 - 0 + 60 * (1 - 2/3) = 80 segundos
+        self.assertEqual(self.hit(limiter, 120), 80)
+        self.assertRetryAfterIsExact(limiter, 120, 80)
+
+    def test_rejected_requests_do_not_use_up_quota(self):
+        limiter = self.get_limiter(('/login/', '2/m'))
+        self.assertEqual([self.hit(limiter, 120) for _ in range(2)], [None] * 2)
+
+        for _ in range(20):
+            self.hit(limiter, 125)
+
+        # Sin las rechazadas, a los 60 s de la ventana siguiente la anterior ya no pesa
+        self.assertEqual([self.hit(limiter, 240) for _ in range(2)], [None] * 2)
+
+
+class TokenBucketTests(RateLimiterTestCase):
+
+    def test_allows_a_burst_then_one_request_per_interval(self):
+        # Recarga de una ficha cada 10 s, ráfagas de hasta 3
+        limiter = self.get_limiter(('/login/', '6/m bucket=3'))
+
+        self.assertEqual([self.hit(limiter, 1000) for _ in range(3)], [None] * 3)
+        self.assertEqual(self.hit(limiter, 1000), 10)
+        self.assertEqual(self.hit(limiter, 1009.5), 1)
+        self.assertEqual(self.hit(limiter, 1010), None)
+        self.assertEqual(self.hit(limiter, 1010), 10)
+
+    def test_idle_time_refills_up_to_the_burst(self):
+        limiter = self.get_limiter(('/login/', '6/m bucket=3'))
+        self.assertEqual([self.hit(limiter, 1000) for _ in range(3)], [None] * 3)
+
+        self.assertEqual([self.hit(limiter, 2000) for _ in range(3)], [None] * 3)
+        self.assertEqual(self.hit(limiter, 2000), 10)
+
+
+@override_settings(RATE_LIMIT_LOGIN='2/d fixed', RATELIMIT_ENABLE=True)
+class RateLimitMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_limited_requests_get_429_with_retry_after(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/accounts/login/').status_code, 200)
+
+        response = self.client.get('/accounts/login/')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 86400)
@@ -2,17 +2,18 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.db.models import Q, Sum, Count
-from django.http import HttpResponse
 from django.shortcuts import render
 from django.urls import path, reverse
 from django.utils import timezone
 from django.contrib import messages
 from django.db import transaction
+from management.exports import export_response
+from . import catalog_cache
+from .exports import CouponReportExport, LowStockReportExport, ProductStockReportExport, StockMovementExport
 from .models import (
     Category, Product, ProductImage, Review, TaxConfiguration,
     DiscountCoupon, CouponUsage, ProductStock, Supplier, ProductSupplier
 )
-import csv
 from datetime import datetime, timedelta
 
 class LowStockFilter(admin.SimpleListFilter):
@@ -113,7 +114,8 @@ class ProductAdmin(admin.ModelAdmin):
     
     actions = [
         'make_featured', 'remove_featured', 'make_available', 'make_unavailable',
-        'increase_stock', 'decrease_stock', 'export_stock_report', 'export_low_stock_report',
+        'increase_stock', 'decrease_stock', 'export_stock_report', 'export_stock_report_excel',
+        'export_low_stock_report', 'export_low_stock_report_excel',
         'apply_tax_exempt', 'remove_tax_exempt', 'bulk_price_update'
     ]
     
@@ -230,9 +232,16 @@ class ProductAdmin(admin.ModelAdmin):
     stock_display.short_description = 'Estado Stock'
     stock_display.admin_order_field = 'stock'
     
+    def update_catalog_products(self, queryset, **fields):
+        """UPDATE masivo que invalida las páginas cacheadas del catálogo"""
+        product_ids = list(queryset.values_list('id', flat=True))
+        updated = queryset.update(updated_at=timezone.now(), **fields)
+        transaction.on_commit(lambda: catalog_cache.invalidate_products(product_ids))
+        return updated
+    
     # Acciones personalizadas
     def make_featured(self, request, queryset):
-        updated = queryset.update(featured=True)
+        updated = self.update_catalog_products(queryset, featured=True)
         self.message_user(
             request, 
             f'{updated} productos marcados como destacados. Aparecerán en la página de inicio.'
@@ -240,17 +249,17 @@ class ProductAdmin(admin.ModelAdmin):
     make_featured.short_description = "⭐ Marcar como destacados"
     
     def remove_featured(self, request, queryset):
-        updated = queryset.update(featured=False)
+        updated = self.update_catalog_products(queryset, featured=False)
         self.message_user(request, f'{updated} productos removidos de destacados.')
     remove_featured.short_description = "❌ Quitar de destacados"
     
     def make_available(self, request, queryset):
-        updated = queryset.update(available=True)
+        updated = self.update_catalog_products(queryset, available=True)
         self.message_user(request, f'{updated} productos marcados como disponibles.')
     make_available.short_description = "✅ Marcar como disponibles"
     
     def make_unavailable(self, request, queryset):
-        updated = queryset.update(available=False)
+        updated = self.update_catalog_products(queryset, available=False)
         self.message_user(request, f'{updated} productos marcados como no disponibles.')
     make_unavailable.short_description = "🚫 Marcar como no disponibles"
     
@@ -273,59 +282,24 @@ class ProductAdmin(admin.ModelAdmin):
     
     def export_stock_report(self, request, queryset):
         """Exportar reporte de stock a CSV"""
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="reporte_stock.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Producto', 'Categoría', 'Stock', 'Precio', 'Estado', 'Última Actualización'])
-        
-        for product in queryset:
-            status = 'Agotado' if product.stock == 0 else 'Crítico' if product.stock <= 5 else 'Bajo' if product.stock <= 10 else 'Normal'
-            writer.writerow([
-                product.name,
-                product.category.name,
-                product.stock,
-                product.price,
-                status,
-                product.updated_at.strftime('%d/%m/%Y %H:%M')
-            ])
-        
-        return response
+        return export_response(request, ProductStockReportExport(), queryset, 'csv')
     export_stock_report.short_description = "📊 Exportar reporte de stock"
     
+    def export_stock_report_excel(self, request, queryset):
+        """Exportar reporte de stock a Excel"""
+        return export_response(request, ProductStockReportExport(), queryset, 'xlsx')
+    export_stock_report_excel.short_description = "📊 Exportar reporte de stock (Excel)"
+    
     def export_low_stock_report(self, request, queryset):
         """Exportar productos con stock bajo"""
-        low_stock_products = queryset.filter(stock__lte=10)
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="productos_stock_bajo.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Producto', 'Categoría', 'Stock Actual', 'Precio', 'Estado', 'Acción Requerida'])
-        
-        for product in low_stock_products:
-            if product.stock == 0:
-                action = 'REABASTECER URGENTE'
-                status = 'AGOTADO'
-            elif product.stock <= 5:
-                action = 'Reabastecer pronto'
-                status = 'CRÍTICO'
-            else:
-                action = 'Monitorear'
-                status = 'BAJO'
-                
-            writer.writerow([
-                product.name,
-                product.category.name,
-                product.stock,
-                f'${product.price:,.0f}',
-                status,
-                action
-            ])
-        
-        return response
+        return export_response(request, LowStockReportExport(), queryset, 'csv')
     export_low_stock_report.short_description = "📋 Exportar productos stock bajo"
     
+    def export_low_stock_report_excel(self, request, queryset):
+        """Exportar productos con stock bajo a Excel"""
+        return export_response(request, LowStockReportExport(), queryset, 'xlsx')
+    export_low_stock_report_excel.short_description = "📋 Exportar productos stock bajo (Excel)"
+    
     def apply_tax_exempt(self, request, queryset):
         updated = queryset.update(is_tax_exempt=True)
         self.message_user(request, f'{updated} productos marcados como exentos de impuesto.')
@@ -488,7 +462,7 @@ class DiscountCouponAdmin(admin.ModelAdmin):
     
     actions = [
         'activate_coupons', 'deactivate_coupons', 'reset_usage_count', 
-        'export_coupon_report', 'extend_validity'
+        'export_coupon_report', 'export_coupon_report_excel', 'extend_validity'
     ]
     
     fieldsets = (
@@ -621,32 +595,12 @@ class DiscountCouponAdmin(admin.ModelAdmin):
     reset_usage_count.short_description = "🔄 Reiniciar contador de uso"
     
     def export_coupon_report(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="reporte_cupones.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Código', 'Nombre', 'Tipo', 'Valor', 'Estado', 'Usos Actuales', 
-            'Usos Máximos', 'Válido Desde', 'Válido Hasta', 'Descuento Total'
-        ])
-        
-        for coupon in queryset:
-            total_discount = coupon.usages.aggregate(total=Sum('discount_amount'))['total'] or 0
-            writer.writerow([
-                coupon.code,
-                coupon.name,
-                coupon.get_discount_type_display(),
-                coupon.discount_value,
-                coupon.status_display,
-                coupon.current_uses,
-                coupon.max_uses or 'Ilimitado',
-                coupon.valid_from.strftime('%d/%m/%Y'),
-                coupon.valid_until.strftime('%d/%m/%Y'),
-                f'${int(total_discount):,}'
-            ])
-        
-        return response
+        return export_response(request, CouponReportExport(), queryset, 'csv')
     export_coupon_report.short_description = "📊 Exportar reporte de cupones"
+    
+    def export_coupon_report_excel(self, request, queryset):
+        return export_response(request, CouponReportExport(), queryset, 'xlsx')
+    export_coupon_report_excel.short_description = "📊 Exportar reporte de cupones (Excel)"
 
 
 @admin.register(ProductStock)
@@ -660,7 +614,7 @@ class ProductStockAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     autocomplete_fields = ('product', 'user')
     
-    actions = ['export_stock_movements']
+    actions = ['export_stock_movements', 'export_stock_movements_excel']
     
     def movement_type_display(self, obj):
         colors = {
@@ -710,30 +664,12 @@ class ProductStockAdmin(admin.ModelAdmin):
     stock_change.short_description = 'Cambio de Stock'
     
     def export_stock_movements(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="movimientos_stock.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Producto', 'Tipo', 'Cantidad', 'Stock Anterior', 'Stock Nuevo', 
-            'Motivo', 'Referencia', 'Usuario', 'Fecha'
-        ])
-        
-        for movement in queryset:
-            writer.writerow([
-                movement.product.name,
-                movement.get_movement_type_display(),
-                movement.quantity,
-                movement.previous_stock,
-                movement.new_stock,
-                movement.reason,
-                movement.reference,
-                movement.user.username if movement.user else 'Sistema',
-                movement.created_at.strftime('%d/%m/%Y %H:%M')
-            ])
-        
-        return response
+        return export_response(request, StockMovementExport(), queryset, 'csv')
     export_stock_movements.short_description = "📊 Exportar movimientos"
+    
+    def export_stock_movements_excel(self, request, queryset):
+        return export_response(request, StockMovementExport(), queryset, 'xlsx')
+    export_stock_movements_excel.short_description = "📊 Exportar movimientos (Excel)"
 
 
 @admin.register(Supplier)
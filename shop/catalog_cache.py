@@ -0,0 +1,249 @@
+"""
+Cache del catálogo para visitantes anónimos
+
+Las páginas del catálogo (inicio, listado, categoría y detalle) se guardan
+renderizadas en el cache para los usuarios anónimos, con una llave que
+incluye la ruta, los parámetros de la consulta que usa la vista y la
+versión de cada etiqueta de la que depende la página:
+
+- ``catalog``: todo el catálogo (rebuilds y backfills)
+- ``categories``: nombres y navegación de categorías
+- ``products``: listados de productos (inicio, listado, categoría)
+- ``product:<slug>``: detalle de un producto
+
+Invalidar una etiqueta incrementa su versión, así que las páginas que
+dependen de ella dejan de encontrarse en el cache sin tener que borrarlas.
+Las invalidaciones se disparan desde los signals de ``Product``,
+``Category`` y ``Review`` y desde ``shop.stock.stock_changed`` (ver
+``shop.signals``).
+
+La página cacheada no contiene datos de la sesión: el token CSRF y el
+contador del carrito se renderizan como marcadores (``HOLES``) que se
+reemplazan en cada respuesta, sin volver a renderizar la template.
+
+Las tarjetas de producto y la navegación de categorías además se guardan
+como fragmentos (``{% cache %}``), que también aprovechan los usuarios
+autenticados.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Q
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.html import escape
+
+from dulce_bias_project.cache import cache
+
+CATALOG_TAG = 'catalog'
+CATEGORIES_TAG = 'categories'
+PRODUCTS_TAG = 'products'
+
+PAGE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300)
+FRAGMENT_TIMEOUT = getattr(settings, 'CATALOG_FRAGMENT_TIMEOUT', 3600)
+
+VERSION_KEY = 'catalog:version:{}'
+PAGE_KEY = 'catalog:page:{}'
+
+# Marcadores de las partes de la página que dependen de la sesión
+CSRF_HOLE = '__catalog_hole_csrf_token__'
+CART_COUNT_HOLE = '__catalog_hole_cart_items_count__'
+CART_TOTAL_HOLE = '__catalog_hole_cart_total__'
+
+HOLES = {
+    'csrf_token': CSRF_HOLE,
+    'cart_items_count': CART_COUNT_HOLE,
+    'cart_total': CART_TOTAL_HOLE,
+}
+
+
+def is_enabled():
+    return getattr(settings, 'CATALOG_CACHE_ENABLED', True)
+
+
+def product_tag(slug):
+    return f'product:{slug}'
+
+
+# Versiones de las etiquetas
+
+def new_version():
+    # Basada en la hora para no repetir versiones si el cache perdió la llave
+    return time.time_ns() // 1000
+
+
+def get_versions(tags):
+    """{etiqueta: versión} con una sola lectura del cache"""
+    keys = {tag: VERSION_KEY.format(tag) for tag in tags}
+    found = cache.get_many(keys.values())
+
+    versions = {}
+    for tag, key in keys.items():
+        if key not in found:
+            cache.add(key, new_version(), None)
+            found[key] = cache.get(key)
+        versions[tag] = found[key]
+    return versions
+
+
+def invalidate(*tags):
+    """Invalida las páginas que dependen de alguna de las etiquetas"""
+    for tag in tags:
+        key = VERSION_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_version(), None)
+
+
+def invalidate_all():
+    invalidate(CATALOG_TAG)
+
+
+def invalidate_categories():
+    invalidate(CATEGORIES_TAG)
+
+
+def get_product_page_slugs(product_ids):
+    """Slugs de los productos y de los productos que los muestran como relacionados"""
+    from .models import Product
+
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    return list(
+        Product.objects.filter(
+            Q(id__in=product_ids) | Q(related_entries__related_id__in=product_ids)
+        ).values_list('slug', flat=True).distinct()
+    )
+
+
+def invalidate_products(product_ids=(), slugs=(), listings=True):
+    """
+    Invalida las páginas de detalle de los productos indicados (y de los
+    productos que los muestran como relacionados) y, con ``listings``, los
+    listados.
+    """
+    slugs = set(slugs) | set(get_product_page_slugs(product_ids))
+    tags = [product_tag(slug) for slug in slugs]
+    if listings:
+        tags.append(PRODUCTS_TAG)
+    invalidate(*tags)
+
+
+# Páginas
+
+def has_pending_messages(request):
+    """Indica si la respuesta debe mostrar mensajes de ``django.contrib.messages``"""
+    if (
+        settings.SESSION_COOKIE_NAME not in request.COOKIES and
+        getattr(settings, 'MESSAGE_COOKIE_NAME', 'messages') not in request.COOKIES
+    ):
+        return False
+    return len(messages.get_messages(request)) > 0
+
+
+def is_cacheable_request(request, bypass_params=()):
+    if not is_enabled() or request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    if any(request.GET.get(param) for param in bypass_params):
+        return False
+    return not has_pending_messages(request)
+
+
+def get_page_cache_key(request, query_params, versions):
+    """Llave de la página: ruta, parámetros usados por la vista y versiones"""
+    params = '&'.join(
+        f'{param}={value}'
+        for param in sorted(query_params)
+        for value in request.GET.getlist(param)
+    )
+    tags = '&'.join(f'{tag}={version}' for tag, version in sorted(versions.items()))
+    digest = hashlib.md5(f'{request.path}?{params}#{tags}'.encode()).hexdigest()
+    return PAGE_KEY.format(digest)
+
+
+def get_hole_values(request):
+    """Valores reales de los marcadores para esta request"""
+    from cart.models import SessionCart
+    from cart.summary import format_clp
+
+    cart_items_count = 0
+    cart_total = format_clp(0)
+    # Sin cookie de sesión no hay carrito: no se toca la sesión
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.session.get('cart'):
+        session_cart = SessionCart(request)
+        cart_items_count = len(session_cart)
+        cart_total = format_clp(session_cart.get_total_price())
+
+    return {
+        CSRF_HOLE: get_token(request),
+        CART_COUNT_HOLE: str(cart_items_count),
+        CART_TOTAL_HOLE: escape(cart_total),
+    }
+
+
+def fill_holes(request, content):
+    for hole, value in get_hole_values(request).items():
+        content = content.replace(hole.encode(), value.encode())
+    return content
+
+
+class CatalogCacheMixin:
+    """
+    Mixin para vistas del catálogo con cache de página para anónimos.
+
+    - ``cache_query_params``: parámetros GET que forman parte de la llave
+      (los demás, ej: utm_*, se ignoran)
+    - ``bypass_query_params``: si vienen en la request no se usa el cache
+      (ej: búsquedas, que no se repiten entre visitantes)
+    - ``get_cache_tags()``: etiquetas de las que depende la página
+    """
+    cache_query_params = ()
+    bypass_query_params = ()
+
+    def get_cache_tags(self):
+        return [CATALOG_TAG, CATEGORIES_TAG, PRODUCTS_TAG]
+
+    def dispatch(self, request, *args, **kwargs):
+        self.catalog_versions = get_versions(self.get_cache_tags())
+        self.render_cache_holes = False
+
+        if not is_cacheable_request(request, self.bypass_query_params):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = get_page_cache_key(request, self.cache_query_params, self.catalog_versions)
+        page = cache.get(key)
+        if page is not None:
+            response = self.build_cached_response(page)
+            response['X-Catalog-Cache'] = 'HIT'
+            return response
+
+        self.render_cache_holes = True
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or not hasattr(response, 'render'):
+            return response
+
+        response.render()
+        cache.set(key, {'content': response.content, 'content_type': response['Content-Type']}, PAGE_TIMEOUT)
+        response.content = fill_holes(request, response.content)
+        response['X-Catalog-Cache'] = 'MISS'
+        return response
+
+    def build_cached_response(self, page):
+        return HttpResponse(fill_holes(self.request, page['content']), content_type=page['content_type'])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # El contexto de la vista tiene prioridad sobre los context processors
+        if self.render_cache_holes:
+            context.update(HOLES)
+        context['catalog_versions'] = {
+            tag: version for tag, version in self.catalog_versions.items() if ':' not in tag
+        }
+        context['catalog_fragment_timeout'] = FRAGMENT_TIMEOUT
+        return context
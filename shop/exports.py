@@ -0,0 +1,195 @@
+"""
+Exportaciones CSV/XLSX del catálogo y el inventario
+
+Las usan las acciones del admin, los reportes de ``management`` y el comando
+``stock_report`` (ver ``management.exports``).
+"""
+from django.db.models import Sum
+
+from management.exports import Export
+
+from .models import DiscountCoupon, Product, ProductStock
+from .stock_alerts import get_alerts_queryset, parse_filters
+
+
+def get_stock_status(stock):
+    if stock == 0:
+        return 'Agotado'
+    if stock <= 5:
+        return 'Crítico'
+    if stock <= 10:
+        return 'Bajo'
+    return 'Normal'
+
+
+class ProductStockReportExport(Export):
+    title = 'Reporte de stock'
+    filename = 'reporte_stock'
+    columns = [
+        ('Producto', 'name'),
+        ('Categoría', 'category__name'),
+        ('Stock', 'stock'),
+        ('Precio', 'price'),
+        ('Última Actualización', 'updated_at'),
+    ]
+
+    def get_queryset(self):
+        return Product.objects.order_by('name')
+
+    def get_headers(self):
+        headers = super().get_headers()
+        return headers[:4] + ['Estado'] + headers[4:]
+
+    def format_row(self, row):
+        return [
+            row['name'],
+            row['category__name'],
+            row['stock'],
+            row['price'],
+            get_stock_status(row['stock']),
+            row['updated_at'].strftime('%d/%m/%Y %H:%M'),
+        ]
+
+
+class LowStockReportExport(Export):
+    title = 'Productos con stock bajo'
+    filename = 'productos_stock_bajo'
+    columns = [
+        ('Producto', 'name'),
+        ('Categoría', 'category__name'),
+        ('Stock Actual', 'stock'),
+        ('Precio', 'price'),
+    ]
+
+    ACTIONS = {
+        'Agotado': ('AGOTADO', 'REABASTECER URGENTE'),
+        'Crítico': ('CRÍTICO', 'Reabastecer pronto'),
+        'Bajo': ('BAJO', 'Monitorear'),
+    }
+
+    def get_queryset(self):
+        return Product.objects.order_by('stock', 'name')
+
+    def project(self, queryset):
+        return super().project(queryset.filter(stock__lte=10))
+
+    def get_headers(self):
+        return super().get_headers() + ['Estado', 'Acción Requerida']
+
+    def format_row(self, row):
+        status, action = self.ACTIONS[get_stock_status(row['stock'])]
+        return [row['name'], row['category__name'], row['stock'], f"${row['price']:,.0f}", status, action]
+
+
+class CouponReportExport(Export):
+    title = 'Reporte de cupones'
+    filename = 'reporte_cupones'
+    columns = [
+        ('Código', 'code'),
+        ('Nombre', 'name'),
+        ('Tipo', 'discount_type'),
+        ('Valor', 'discount_value'),
+        ('Estado', 'is_active'),
+        ('Usos Actuales', 'current_uses'),
+        ('Usos Máximos', 'max_uses'),
+        ('Válido Desde', 'valid_from'),
+        ('Válido Hasta', 'valid_until'),
+        ('Descuento Total', 'total_discount'),
+    ]
+
+    def get_queryset(self):
+        return DiscountCoupon.objects.order_by('-created_at')
+
+    def project(self, queryset):
+        # Instancias (para status_display) con el total de descuentos en la misma consulta
+        return (
+            queryset
+            .annotate(total_discount=Sum('usages__discount_amount'))
+            .only(*[field for header, field in self.columns if field != 'total_discount'])
+        )
+
+    def format_row(self, coupon):
+        return [
+            coupon.code,
+            coupon.name,
+            coupon.get_discount_type_display(),
+            coupon.discount_value,
+            coupon.status_display,
+            coupon.current_uses,
+            coupon.max_uses or 'Ilimitado',
+            coupon.valid_from.strftime('%d/%m/%Y'),
+            coupon.valid_until.strftime('%d/%m/%Y'),
+            f'${int(coupon.total_discount or 0):,}',
+        ]
+
+
+class StockMovementExport(Export):
+    title = 'Movimientos de stock'
+    filename = 'movimientos_stock'
+    columns = [
+        ('Producto', 'product__name'),
+        ('Tipo', 'movement_type'),
+        ('Cantidad', 'quantity'),
+        ('Stock Anterior', 'previous_stock'),
+        ('Stock Nuevo', 'new_stock'),
+        ('Motivo', 'reason'),
+        ('Referencia', 'reference'),
+        ('Usuario', 'user__username'),
+        ('Fecha', 'created_at'),
+    ]
+
+    MOVEMENT_TYPES = dict(ProductStock.MOVEMENT_TYPE_CHOICES)
+
+    def get_queryset(self):
+        return ProductStock.objects.order_by('-created_at')
+
+    def format_row(self, row):
+        return [
+            row['product__name'],
+            self.MOVEMENT_TYPES.get(row['movement_type'], row['movement_type']),
+            row['quantity'],
+            row['previous_stock'],
+            row['new_stock'],
+            row['reason'] or '',
+            row['reference'] or '',
+            row['user__username'] or 'Sistema',
+            row['created_at'].strftime('%d/%m/%Y %H:%M'),
+        ]
+
+
+class StockAlertsExport(Export):
+    title = 'Alertas de stock'
+    filename = 'alertas_stock'
+    columns = [
+        ('Producto', 'name'),
+        ('Categoría', 'category__name'),
+        ('Tipo', 'alert_type'),
+        ('Prioridad', 'alert_priority'),
+        ('Stock Actual', 'stock'),
+        ('Stock Mínimo', 'min_stock_alert'),
+        ('Venta Diaria', 'daily_velocity'),
+        ('Días de Cobertura', 'days_of_cover'),
+        ('Orden Sugerida', 'recommended_order'),
+    ]
+
+    ALERT_TYPES = {'out': 'Agotado', 'critical': 'Crítico', 'low': 'Bajo'}
+    PRIORITIES = {'high': 'Alta', 'medium': 'Media', 'low': 'Baja'}
+
+    def __init__(self, params=None):
+        self.filters = parse_filters(params or {})
+
+    def get_queryset(self):
+        return get_alerts_queryset(**self.filters)
+
+    def format_row(self, row):
+        return [
+            row['name'],
+            row['category__name'],
+            self.ALERT_TYPES[row['alert_type']],
+            self.PRIORITIES[row['alert_priority']],
+            row['stock'],
+            row['min_stock_alert'],
+            round(row['daily_velocity'], 1) if row['daily_velocity'] is not None else None,
+            round(row['days_of_cover'], 1) if row['days_of_cover'] is not None else None,
+            row['recommended_order'],
+        ]
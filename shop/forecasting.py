@@ -0,0 +1,169 @@
+"""
+Pronóstico de demanda y reposición
+
+Calcula por producto la velocidad de venta diaria (unidades) desde los
+movimientos de stock de venta y devolución de los últimos ``HISTORY_DAYS``
+días, con una sola consulta agrupada por producto y día:
+
+- Estacionalidad semanal: factor de cada día de la semana respecto del
+  promedio, suavizado hacia 1 con ``SEASONALITY_PRIOR_DAYS`` días ficticios
+  para que pocas semanas de historia no den factores extremos.
+- Velocidad: promedio exponencial (span ``SMOOTHING_SPAN_DAYS``) de la serie
+  diaria sin estacionalidad, así que las ventas recientes pesan más.
+
+Con el proveedor del producto (el principal, o el de menor tiempo de entrega)
+se obtiene la demanda durante la entrega, el punto de pedido (entrega más
+``SAFETY_DAYS`` de seguridad) y el stock objetivo (además ``REVIEW_DAYS`` de
+cobertura después de recibir el pedido). Los productos sin proveedor usan
+``DEFAULT_LEAD_TIME_DAYS``.
+
+El resultado se guarda como snapshot en ``ProductDemandForecast``, que
+``manage.py check_stock_alerts`` recalcula y las alertas de stock leen (ver
+``shop.stock_alerts``).
+"""
+import math
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import catalog_cache
+from .models import Product, ProductDemandForecast, ProductStock, ProductSupplier
+
+HISTORY_DAYS = 56
+SMOOTHING_SPAN_DAYS = 14
+SEASONALITY_PRIOR_DAYS = 2
+DEFAULT_LEAD_TIME_DAYS = 7
+SAFETY_DAYS = 3
+REVIEW_DAYS = 14
+
+DEMAND_MOVEMENTS = ('sale', 'return')
+
+# Versión del snapshot, para el ETag de las alertas de stock
+FORECAST_TAG = 'forecast'
+
+
+def get_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def get_daily_units(start, end):
+    """{product_id: {día: unidades vendidas}} entre ``start`` y ``end`` (incluidos), netas de devoluciones"""
+    rows = (
+        ProductStock.objects
+        .filter(
+            movement_type__in=DEMAND_MOVEMENTS,
+            created_at__gte=get_day_start(start),
+            created_at__lt=get_day_start(end + timedelta(days=1)),
+        )
+        .annotate(day=TruncDate('created_at'))
+        .values('product_id', 'day')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+
+    units = {}
+    for row in rows:
+        # Las ventas son negativas y las devoluciones positivas
+        units.setdefault(row['product_id'], {})[row['day']] = max(-row['quantity'], 0)
+    return units
+
+
+def get_weekday_factors(series):
+    """Factor de demanda de lunes a domingo para ``series`` [(día, unidades)]"""
+    total = sum(units for day, units in series)
+    if not total:
+        return [1.0] * 7
+
+    average = total / len(series)
+    sums = [0] * 7
+    counts = [0] * 7
+    for day, units in series:
+        sums[day.weekday()] += units
+        counts[day.weekday()] += 1
+
+    return [
+        (sums[weekday] + average * SEASONALITY_PRIOR_DAYS) / (counts[weekday] + SEASONALITY_PRIOR_DAYS) / average
+        for weekday in range(7)
+    ]
+
+
+def get_velocity(series, factors):
+    """Promedio exponencial de las unidades diarias sin estacionalidad"""
+    alpha = 2 / (SMOOTHING_SPAN_DAYS + 1)
+    values = [units / factors[day.weekday()] for day, units in series]
+
+    # Parte del promedio de la primera semana
+    level = sum(values[:7]) / len(values[:7])
+    for value in values[7:]:
+        level = alpha * value + (1 - alpha) * level
+    return level
+
+
+def get_expected_demand(velocity, factors, start, days):
+    """Unidades esperadas en los ``days`` días desde ``start``"""
+    return sum(velocity * factors[(start + timedelta(days=i)).weekday()] for i in range(days))
+
+
+def get_suppliers():
+    """{product_id: proveedor} con el principal o, si no hay, el de menor tiempo de entrega"""
+    rows = (
+        ProductSupplier.objects
+        .filter(supplier__is_active=True)
+        .order_by('product_id', '-is_primary', 'lead_time_days')
+        .values('product_id', 'supplier_id', 'lead_time_days', 'minimum_order_quantity')
+    )
+    suppliers = {}
+    for row in rows:
+        suppliers.setdefault(row['product_id'], row)
+    return suppliers
+
+
+def build_forecast(product, daily_units, supplier, today):
+    """``ProductDemandForecast`` de un producto con la historia hasta ayer"""
+    first_day = max(today - timedelta(days=HISTORY_DAYS), timezone.localdate(product['created_at']))
+    series = [
+        (first_day + timedelta(days=i), daily_units.get(first_day + timedelta(days=i), 0))
+        for i in range((today - first_day).days)
+    ]
+
+    factors = get_weekday_factors(series)
+    velocity = get_velocity(series, factors) if series else 0
+
+    lead_time = supplier['lead_time_days'] if supplier else DEFAULT_LEAD_TIME_DAYS
+    lead_time_demand = get_expected_demand(velocity, factors, today, lead_time)
+    reorder_demand = get_expected_demand(velocity, factors, today, lead_time + SAFETY_DAYS)
+    target_demand = get_expected_demand(velocity, factors, today, lead_time + SAFETY_DAYS + REVIEW_DAYS)
+
+    return ProductDemandForecast(
+        product_id=product['id'],
+        supplier_id=supplier['supplier_id'] if supplier else None,
+        daily_velocity=round(velocity, 3),
+        weekday_factors=[round(factor, 3) for factor in factors],
+        history_days=len(series),
+        lead_time_days=lead_time,
+        minimum_order_quantity=supplier['minimum_order_quantity'] if supplier else 1,
+        lead_time_demand=round(lead_time_demand, 2),
+        reorder_point=math.ceil(reorder_demand),
+        target_stock=math.ceil(target_demand),
+    )
+
+
+def refresh_demand_forecasts(today=None):
+    """Recalcula el snapshot de todos los productos disponibles; retorna la cantidad de productos"""
+    today = today or timezone.localdate()
+    units = get_daily_units(today - timedelta(days=HISTORY_DAYS), today - timedelta(days=1))
+    suppliers = get_suppliers()
+
+    forecasts = [
+        build_forecast(product, units.get(product['id'], {}), suppliers.get(product['id']), today)
+        for product in Product.objects.filter(available=True).values('id', 'created_at')
+    ]
+
+    with transaction.atomic():
+        ProductDemandForecast.objects.all().delete()
+        ProductDemandForecast.objects.bulk_create(forecasts, batch_size=1000)
+        transaction.on_commit(lambda: catalog_cache.invalidate(FORECAST_TAG))
+    return len(forecasts)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from shop.ratings import backfill_product_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen de reseñas (cantidad, promedio y distribución) de cada producto'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculando resúmenes de reseñas...')
+        count = backfill_product_ratings()
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} productos con reseñas actualizados'))
@@ -1,9 +1,12 @@
 from django.core.management.base import BaseCommand
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import Abs
 from shop.models import Product, ProductStock
-from orders.models import Order
-from datetime import datetime, timedelta
+from shop.forecasting import HISTORY_DAYS, refresh_demand_forecasts
+from shop.stock_alerts import LOW_STOCK_FACTOR, build_alert, get_alerts_queryset
+from datetime import timedelta
 from django.utils import timezone
 
 
@@ -19,13 +22,18 @@ class Command(BaseCommand):
         parser.add_argument(
             '--critical-only',
             action='store_true',
-            help='Solo mostrar productos con stock crítico (≤5 o agotados)',
+            help='Solo mostrar productos con stock crítico (≤ stock mínimo o agotados)',
         )
         parser.add_argument(
             '--create-movements',
             action='store_true',
             help='Crear movimientos de stock para alertas registradas',
         )
+        parser.add_argument(
+            '--skip-forecast',
+            action='store_true',
+            help='No recalcular el pronóstico de demanda (usa el último guardado)',
+        )
 
     def handle(self, *args, **options):
         send_email = options['send_email']
@@ -34,172 +42,159 @@ class Command(BaseCommand):
         
         self.stdout.write('Verificando alertas de stock...')
         
-        # Definir umbrales
-        CRITICAL_THRESHOLD = 5
-        LOW_THRESHOLD = 10
-        
-        # Obtener productos según filtros
-        if critical_only:
-            critical_products = Product.objects.filter(
-                stock__lte=CRITICAL_THRESHOLD,
-                available=True
-            ).order_by('stock', 'name')
-            low_products = Product.objects.none()
-        else:
-            critical_products = Product.objects.filter(
-                stock__lte=CRITICAL_THRESHOLD,
-                available=True
-            ).order_by('stock', 'name')
-            low_products = Product.objects.filter(
-                stock__gt=CRITICAL_THRESHOLD,
-                stock__lte=LOW_THRESHOLD,
-                available=True
-            ).order_by('stock', 'name')
-        
-        out_of_stock = critical_products.filter(stock=0)
-        critical_stock = critical_products.filter(stock__gt=0, stock__lte=CRITICAL_THRESHOLD)
+        # Pronóstico de demanda que leen las alertas (ver shop.forecasting)
+        if not options['skip_forecast']:
+            count = refresh_demand_forecasts()
+            self.stdout.write(f'🔮 Pronóstico de demanda recalculado para {count} productos (últimos {HISTORY_DAYS} días)')
+        
+        # Una sola consulta clasifica todos los productos según su stock mínimo (ver shop.stock_alerts)
+        types = ('out', 'critical') if critical_only else ('out', 'critical', 'low')
+        alerts = [build_alert(product) for product in get_alerts_queryset(types=types)]
+        
+        out_of_stock = [alert['product'] for alert in alerts if alert['type'] == 'out']
+        critical_stock = [alert['product'] for alert in alerts if alert['type'] == 'critical']
+        low_products = [alert['product'] for alert in alerts if alert['type'] == 'low']
+        critical_products = out_of_stock + critical_stock
         
         # Estadísticas generales
         total_products = Product.objects.filter(available=True).count()
-        good_stock = total_products - critical_products.count() - low_products.count()
+        good_stock = total_products - len(critical_products) - len(low_products)
         
         # Mostrar resumen
         self.stdout.write('\n' + '='*60)
         self.stdout.write('REPORTE DE ESTADO DE STOCK')
         self.stdout.write('='*60)
         self.stdout.write(f'Total de productos activos: {total_products}')
-        self.stdout.write(f'Productos con buen stock (>{LOW_THRESHOLD}): {good_stock}')
-        
         if not critical_only:
+            self.stdout.write(f'Productos con buen stock (sin alertas): {good_stock}')
             self.stdout.write(
                 self.style.WARNING(
-                    f'Productos con stock bajo ({CRITICAL_THRESHOLD+1}-{LOW_THRESHOLD}): {low_products.count()}'
+                    f'Productos con stock bajo (≤{LOW_STOCK_FACTOR}× mínimo o punto de pedido): {len(low_products)}'
                 )
             )
         
         self.stdout.write(
-            self.style.ERROR(f'Productos con stock crítico (1-{CRITICAL_THRESHOLD}): {critical_stock.count()}')
+            self.style.ERROR(f'Productos con stock crítico (≤ mínimo): {len(critical_stock)}')
         )
         self.stdout.write(
-            self.style.ERROR(f'Productos agotados (0): {out_of_stock.count()}')
+            self.style.ERROR(f'Productos agotados (0): {len(out_of_stock)}')
         )
         
+        movements = []
+        reference = f'ALERT-{timezone.now().strftime("%Y%m%d-%H%M%S")}'
+        
         # Mostrar productos agotados
-        if out_of_stock.exists():
+        if out_of_stock:
             self.stdout.write('\n' + '🔴 PRODUCTOS AGOTADOS:')
             self.stdout.write('-' * 40)
             for product in out_of_stock:
                 self.stdout.write(f'❌ {product.name} - Categoría: {product.category.name}')
                 
                 if create_movements:
-                    ProductStock.objects.create(
+                    movements.append(ProductStock(
                         product=product,
                         movement_type='adjustment',
                         quantity=0,
                         previous_stock=0,
                         new_stock=0,
                         reason='Alerta automática: Producto agotado',
-                        reference=f'ALERT-{timezone.now().strftime("%Y%m%d-%H%M%S")}',
+                        reference=reference,
                         user=None
-                    )
+                    ))
         
         # Mostrar productos con stock crítico
-        if critical_stock.exists():
+        if critical_stock:
             self.stdout.write('\n' + '⚠️  PRODUCTOS CON STOCK CRÍTICO:')
             self.stdout.write('-' * 40)
             for product in critical_stock:
-                self.stdout.write(f'⚡ {product.name} - Stock: {product.stock} - Categoría: {product.category.name}')
+                self.stdout.write(
+                    f'⚡ {product.name} - Stock: {product.stock}/{product.min_stock_alert} - '
+                    f'Categoría: {product.category.name}'
+                )
                 
                 if create_movements:
-                    ProductStock.objects.create(
+                    movements.append(ProductStock(
                         product=product,
                         movement_type='adjustment',
                         quantity=0,
                         previous_stock=product.stock,
                         new_stock=product.stock,
                         reason=f'Alerta automática: Stock crítico ({product.stock} unidades)',
-                        reference=f'ALERT-{timezone.now().strftime("%Y%m%d-%H%M%S")}',
+                        reference=reference,
                         user=None
-                    )
+                    ))
         
         # Mostrar productos con stock bajo (si no es solo crítico)
-        if low_products.exists() and not critical_only:
+        if low_products:
             self.stdout.write('\n' + '📉 PRODUCTOS CON STOCK BAJO:')
             self.stdout.write('-' * 40)
             for product in low_products:
-                self.stdout.write(f'📦 {product.name} - Stock: {product.stock} - Categoría: {product.category.name}')
+                self.stdout.write(
+                    f'📦 {product.name} - Stock: {product.stock}/{product.min_stock_alert} - '
+                    f'Categoría: {product.category.name}'
+                )
         
-        # Análisis de ventas recientes
+        # Análisis de ventas recientes: una consulta agrupada por producto
         self.stdout.write('\n' + '📊 ANÁLISIS DE VENTAS RECIENTES (últimos 7 días):')
         self.stdout.write('-' * 50)
         
-        recent_sales = ProductStock.objects.filter(
-            movement_type='sale',
-            created_at__gte=timezone.now() - timedelta(days=7)
-        ).values('product').distinct()
+        recent_sales = (
+            ProductStock.objects
+            .filter(movement_type='sale', created_at__gte=timezone.now() - timedelta(days=7))
+            .values('product', 'product__name', 'product__stock', 'product__min_stock_alert')
+            .annotate(total_sold=Sum(Abs('quantity')))
+            .order_by('product__name')
+        )
         
-        if recent_sales.exists():
+        if recent_sales:
             for sale in recent_sales:
-                product = Product.objects.get(pk=sale['product'])
-                recent_movements = ProductStock.objects.filter(
-                    product=product,
-                    movement_type='sale',
-                    created_at__gte=timezone.now() - timedelta(days=7)
-                )
-                total_sold = sum(abs(m.quantity) for m in recent_movements)
+                stock = sale['product__stock']
+                is_critical = stock <= sale['product__min_stock_alert']
                 
-                if product.stock <= CRITICAL_THRESHOLD or total_sold >= product.stock:
-                    status = "🔥 URGENTE" if product.stock <= CRITICAL_THRESHOLD else "⚠️  MONITOREAR"
+                if is_critical or sale['total_sold'] >= stock:
+                    status = "🔥 URGENTE" if is_critical else "⚠️  MONITOREAR"
                     self.stdout.write(
-                        f'{status} {product.name}: Vendido {total_sold} unidades, '
-                        f'Stock actual: {product.stock}'
+                        f'{status} {sale["product__name"]}: Vendido {sale["total_sold"]} unidades, '
+                        f'Stock actual: {stock}'
                     )
         else:
             self.stdout.write('No hay ventas registradas en los últimos 7 días')
         
-        # Recomendaciones de reabastecimiento
-        if critical_products.exists() or low_products.exists():
+        # Recomendaciones de reabastecimiento (las alertas ya vienen ordenadas por prioridad)
+        if alerts:
             self.stdout.write('\n' + '💡 RECOMENDACIONES DE REABASTECIMIENTO:')
             self.stdout.write('-' * 50)
             
-            # Productos más críticos primero
-            all_alert_products = list(critical_products) + list(low_products)
-            
-            for product in all_alert_products[:10]:  # Top 10 más críticos
-                # Calcular sugerencia de reabastecimiento basada en ventas
-                recent_sales_qty = ProductStock.objects.filter(
-                    product=product,
-                    movement_type='sale',
-                    created_at__gte=timezone.now() - timedelta(days=30)
-                ).count()
+            for alert in alerts[:10]:  # Top 10 más críticos
+                priority = "🔥 ALTA" if alert['priority'] == 'high' else "📝 MEDIA"
                 
-                if recent_sales_qty > 0:
-                    monthly_avg = recent_sales_qty
-                    suggested_order = max(50, monthly_avg * 2)  # Al menos 50 o 2 meses de inventario
+                if alert['days_of_cover'] is not None:
+                    forecast = (
+                        f'Venta diaria: {alert["daily_velocity"]} u, cobertura: {alert["days_of_cover"]} días, '
+                        f'entrega: {alert["lead_time_days"]} días'
+                    )
                 else:
-                    suggested_order = 50  # Cantidad base
-                
-                priority = "🔥 ALTA" if product.stock <= CRITICAL_THRESHOLD else "📝 MEDIA"
+                    forecast = 'Sin ventas recientes'
                 
                 self.stdout.write(
-                    f'{priority} {product.name}: Ordenar {suggested_order} unidades '
-                    f'(Ventas mensuales aprox: {recent_sales_qty})'
+                    f'{priority} {alert["product"].name}: Ordenar {alert["recommended_order"]} unidades ({forecast})'
                 )
         
         # Enviar email si está configurado
-        if send_email and (critical_products.exists() or low_products.exists()):
-            self.send_stock_alert_email(critical_products, low_products, out_of_stock)
+        if send_email and alerts:
+            self.send_stock_alert_email(critical_stock, low_products, out_of_stock)
         
         # Mensaje de confirmación
         if create_movements:
+            ProductStock.objects.bulk_create(movements)
             self.stdout.write(
                 self.style.SUCCESS(
-                    f'\n✓ Se crearon {critical_products.count()} movimientos de alerta en el sistema'
+                    f'\n✓ Se crearon {len(movements)} movimientos de alerta en el sistema'
                 )
             )
         
         self.stdout.write('\n' + '='*60)
-        if critical_products.exists():
+        if critical_products:
             self.stdout.write(
                 self.style.ERROR('⚠️  ACCIÓN REQUERIDA: Hay productos que necesitan reabastecimiento urgente')
             )
@@ -210,29 +205,29 @@ class Command(BaseCommand):
         
         self.stdout.write('Comando completado.')
 
-    def send_stock_alert_email(self, critical_products, low_products, out_of_stock):
+    def send_stock_alert_email(self, critical_stock, low_products, out_of_stock):
         """Envía email con alertas de stock"""
         try:
-            subject = f'🚨 Alerta de Stock - {out_of_stock.count()} agotados, {critical_products.count()} críticos'
+            subject = f'🚨 Alerta de Stock - {len(out_of_stock)} agotados, {len(critical_stock)} críticos'
             
             message = f"""
             ALERTA DE STOCK - {timezone.now().strftime('%d/%m/%Y %H:%M')}
             
-            PRODUCTOS AGOTADOS ({out_of_stock.count()}):
+            PRODUCTOS AGOTADOS ({len(out_of_stock)}):
             """
             
             for product in out_of_stock:
                 message += f"\n❌ {product.name}"
             
-            message += f"\n\nPRODUCTOS CON STOCK CRÍTICO ({critical_products.filter(stock__gt=0).count()}):"
+            message += f"\n\nPRODUCTOS CON STOCK CRÍTICO ({len(critical_stock)}):"
             
-            for product in critical_products.filter(stock__gt=0):
-                message += f"\n⚠️  {product.name}: {product.stock} unidades"
+            for product in critical_stock:
+                message += f"\n⚠️  {product.name}: {product.stock} unidades (mínimo {product.min_stock_alert})"
             
-            message += f"\n\nPRODUCTOS CON STOCK BAJO ({low_products.count()}):"
+            message += f"\n\nPRODUCTOS CON STOCK BAJO ({len(low_products)}):"
             
             for product in low_products:
-                message += f"\n📦 {product.name}: {product.stock} unidades"
+                message += f"\n📦 {product.name}: {product.stock} unidades (mínimo {product.min_stock_alert})"
             
             message += "\n\nRevisa el panel de administración para tomar acciones."
             
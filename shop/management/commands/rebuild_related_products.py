@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shop.related import rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el índice de productos relacionados (por categoría e ingredientes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Cantidad de productos recalculados por lote',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculando productos relacionados...')
+        count = rebuild_related_products(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} relaciones guardadas'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from shop import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Cantidad de productos indexados por lote',
+        )
+
+    def handle(self, *args, **options):
+        if search.get_backend() is None:
+            self.stdout.write(self.style.WARNING(
+                'El motor de base de datos no soporta el índice; la búsqueda usa icontains'
+            ))
+            return
+
+        self.stdout.write('Reconstruyendo índice de búsqueda...')
+        count = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} productos indexados'))
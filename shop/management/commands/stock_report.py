@@ -1,10 +1,11 @@
 from django.core.management.base import BaseCommand
 from django.db.models import Sum, Count, Q
+from management.exports import iter_export
+from shop.exports import StockMovementExport
 from shop.models import Product, ProductStock
 from orders.models import Order, OrderItem
 from datetime import datetime, timedelta
 from django.utils import timezone
-import csv
 import os
 
 
@@ -28,6 +29,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Exportar resultados a archivo CSV',
         )
+        parser.add_argument(
+            '--export-xlsx',
+            action='store_true',
+            help='Exportar resultados a archivo Excel (.xlsx)',
+        )
         parser.add_argument(
             '--movement-type',
             choices=['sale', 'entry', 'return', 'adjustment', 'cancellation'],
@@ -43,6 +49,7 @@ class Command(BaseCommand):
         days = options['days']
         product_id = options['product_id']
         export_csv = options['export_csv']
+        export_xlsx = options['export_xlsx']
         movement_type = options['movement_type']
         summary_only = options['summary_only']
         
@@ -203,9 +210,11 @@ class Command(BaseCommand):
                 units = abs(product_data['units_sold'])
                 self.stdout.write(f"{i}. {product_data['product__name']}: {units} unidades")
         
-        # Exportar a CSV si se solicita
+        # Exportar a CSV / Excel si se solicita
         if export_csv:
-            self.export_to_csv(movements, days)
+            self.export_movements(movements, days, 'csv')
+        if export_xlsx:
+            self.export_movements(movements, days, 'xlsx')
         
         # Alertas y recomendaciones
         self.stdout.write('\n' + '='*80)
@@ -248,41 +257,16 @@ class Command(BaseCommand):
             self.style.SUCCESS(f'✅ Reporte completado. Procesados {movements.count()} movimientos.')
         )
 
-    def export_to_csv(self, movements, days):
-        """Exporta los movimientos a un archivo CSV"""
+    def export_movements(self, movements, days, file_format):
+        """Exporta los movimientos a un archivo CSV o Excel, escribiendo por bloques"""
+        export = StockMovementExport()
         try:
             timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'stock_movements_{days}days_{timestamp}.csv'
+            filename = f'stock_movements_{days}days_{timestamp}.{file_format}'
             
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                
-                # Headers
-                writer.writerow([
-                    'Fecha',
-                    'Producto',
-                    'Tipo de Movimiento',
-                    'Cantidad',
-                    'Stock Anterior',
-                    'Stock Nuevo',
-                    'Motivo',
-                    'Referencia',
-                    'Usuario'
-                ])
-                
-                # Datos
-                for movement in movements:
-                    writer.writerow([
-                        movement.created_at.strftime('%d/%m/%Y %H:%M:%S'),
-                        movement.product.name,
-                        dict(ProductStock.MOVEMENT_CHOICES)[movement.movement_type],
-                        movement.quantity,
-                        movement.previous_stock,
-                        movement.new_stock,
-                        movement.reason or '',
-                        movement.reference or '',
-                        movement.user.username if movement.user else 'Sistema'
-                    ])
+            with open(filename, 'wb') as output:
+                for chunk in iter_export(export, file_format, export.iter_rows(movements)):
+                    output.write(chunk)
             
             self.stdout.write(
                 self.style.SUCCESS(f'✅ Datos exportados a: {filename}')
@@ -290,5 +274,5 @@ class Command(BaseCommand):
             
         except Exception as e:
             self.stdout.write(
-                self.style.ERROR(f'❌ Error exportando CSV: {str(e)}')
+                self.style.ERROR(f'❌ Error exportando {file_format.upper()}: {str(e)}')
             )
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts "
+                "USING fts5(product_id UNINDEXED, name, body, tokenize='unicode61')"
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS shop_product_search ("
+                "product_id bigint PRIMARY KEY REFERENCES shop_product(id) ON DELETE CASCADE "
+                "DEFERRABLE INITIALLY DEFERRED, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS shop_product_search_document_idx "
+                "ON shop_product_search USING GIN (document)"
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute("DROP TABLE IF EXISTS shop_product_fts")
+        elif connection.vendor == 'postgresql':
+            cursor.execute("DROP TABLE IF EXISTS shop_product_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_supplier_taxconfiguration_product_is_tax_exempt_and_more'),
+    ]
+
+    operations = [
+        # El índice se llena en 0008_populate_search_index
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_productrating'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDemandForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='demand_forecast', serialize=False, to='shop.product')),
+                ('daily_velocity', models.FloatField(default=0, help_text='Unidades diarias (promedio exponencial sin estacionalidad)')),
+                ('weekday_factors', models.JSONField(blank=True, default=list, help_text='Factor de demanda de lunes a domingo')),
+                ('history_days', models.PositiveIntegerField(default=0, help_text='Días de historia usados')),
+                ('lead_time_days', models.PositiveIntegerField(default=0, help_text='Días de entrega del proveedor')),
+                ('minimum_order_quantity', models.PositiveIntegerField(default=1)),
+                ('lead_time_demand', models.FloatField(default=0, help_text='Demanda esperada durante la entrega')),
+                ('reorder_point', models.PositiveIntegerField(default=0, help_text='Stock con el que hay que pedir')),
+                ('target_stock', models.PositiveIntegerField(default=0, help_text='Stock a alcanzar al reponer')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('supplier', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='demand_forecasts', to='shop.supplier')),
+            ],
+            options={
+                'verbose_name': 'Pronóstico de Demanda',
+                'verbose_name_plural': 'Pronósticos de Demanda',
+            },
+        ),
+    ]
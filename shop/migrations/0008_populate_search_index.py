@@ -0,0 +1,85 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:00
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Copia de la normalización de shop.search al momento de esta migración:
+# la migración no debe cambiar si ese módulo cambia
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'sin', 'su', 'sus', 'un', 'una', 'unos', 'unas', 'y',
+}
+
+TOKEN_RE = re.compile(r'[a-z0-9ñ]+')
+
+
+def strip_accents(text):
+    text = text.replace('ñ', '\0').replace('Ñ', '\0')
+    text = ''.join(
+        char for char in unicodedata.normalize('NFKD', text)
+        if not unicodedata.combining(char)
+    )
+    return text.replace('\0', 'ñ')
+
+
+def stem(word):
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith('z'):
+        word = word[:-1] + 'c'
+    return word
+
+
+def normalize(text):
+    text = strip_accents((text or '').lower())
+    return ' '.join(stem(token) for token in TOKEN_RE.findall(text) if token not in STOPWORDS)
+
+
+def populate_search_index(apps, schema_editor):
+    """Indexa los productos existentes (sin esto toda búsqueda retorna vacío)"""
+    vendor = schema_editor.connection.vendor
+    if vendor not in ('sqlite', 'postgresql'):
+        return
+
+    Product = apps.get_model('shop', 'Product')
+    products = Product.objects.select_related('category').only(
+        'id', 'name', 'description', 'ingredients', 'category__name'
+    ).order_by('id')
+    rows = [
+        (
+            product.pk,
+            normalize(product.name),
+            normalize(' '.join([product.category.name, product.description or '', product.ingredients or ''])),
+        )
+        for product in products.iterator(chunk_size=500)
+    ]
+
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute("DELETE FROM shop_product_fts")
+            cursor.executemany(
+                "INSERT INTO shop_product_fts (product_id, name, body) VALUES (%s, %s, %s)",
+                rows
+            )
+        else:
+            cursor.execute("DELETE FROM shop_product_search")
+            cursor.executemany(
+                "INSERT INTO shop_product_search (product_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))",
+                rows
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_productdemandforecast'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
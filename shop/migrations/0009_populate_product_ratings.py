@@ -0,0 +1,35 @@
+# Generated by Django 4.2.20 on 2026-10-18 12:00
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def populate_product_ratings(apps, schema_editor):
+    """Calcula el resumen de las reseñas existentes (sin esto las páginas de producto no las muestran)"""
+    Review = apps.get_model('shop', 'Review')
+    ProductRating = apps.get_model('shop', 'ProductRating')
+
+    summaries = {}
+    rows = Review.objects.values('product_id', 'rating').annotate(total=Count('id')).order_by()
+    for row in rows:
+        summary = summaries.setdefault(row['product_id'], ProductRating(product_id=row['product_id']))
+        setattr(summary, f"stars_{row['rating']}", row['total'])
+        summary.review_count += row['total']
+        summary.rating_sum += row['rating'] * row['total']
+
+    for summary in summaries.values():
+        summary.average = summary.rating_sum / summary.review_count
+
+    ProductRating.objects.all().delete()
+    ProductRating.objects.bulk_create(summaries.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_populate_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_product_ratings, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,11 @@
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from django.contrib.auth.models import User
 from decimal import Decimal
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.core.exceptions import ValidationError
+from dulce_bias_project.tracking import FieldTrackerMixin
 
 
 class TaxConfiguration(models.Model):
@@ -53,7 +54,7 @@ class Category(models.Model):
         return reverse('shop:category_detail', args=[self.slug])
 
 
-class Product(models.Model):
+class Product(FieldTrackerMixin, models.Model):
     CATEGORY_CHOICES = [
         ('bestseller', 'Más Vendidas'),
         ('premium', 'Premium'),
@@ -89,6 +90,10 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # El cache del catálogo invalida también la página del slug anterior; categoría,
+    # ingredientes y disponibilidad recalculan los productos relacionados (shop.signals)
+    tracked_fields = ('slug', 'category_id', 'ingredients', 'available')
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
@@ -214,7 +219,27 @@ class ProductImage(models.Model):
         return f"Imagen de {self.product.name}"
 
 
-class Review(models.Model):
+class RelatedProduct(models.Model):
+    """Productos relacionados precalculados (ver shop.related)"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField(help_text="Similitud por categoría e ingredientes")
+    position = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        verbose_name = "Producto Relacionado"
+        verbose_name_plural = "Productos Relacionados"
+        ordering = ['product', 'position']
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', 'position']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name} → {self.related.name} ({self.score:.2f})"
+
+
+class Review(FieldTrackerMixin, models.Model):
     RATING_CHOICES = [
         (1, '1 - Muy malo'),
         (2, '2 - Malo'),
@@ -226,6 +251,9 @@ class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     rating = models.IntegerField(choices=RATING_CHOICES)
+    
+    # Cambios detectados en memoria para mantener ProductRating
+    tracked_fields = ('product_id', 'rating')
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -235,6 +263,62 @@ class Review(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.product.name} ({self.rating}⭐)"
+    
+    def save(self, *args, **kwargs):
+        # El resumen de reseñas (ver shop.ratings) se actualiza en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class ProductRating(models.Model):
+    """Resumen de reseñas de un producto (mantenido por shop.ratings)"""
+    product = models.OneToOneField(
+        Product, 
+        on_delete=models.CASCADE, 
+        primary_key=True, 
+        related_name='rating_summary'
+    )
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    average = models.FloatField(default=0, db_index=True)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Resumen de Reseñas"
+        verbose_name_plural = "Resúmenes de Reseñas"
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.average:.1f}⭐ ({self.review_count})"
+    
+    @property
+    def formatted_average(self):
+        return f"{self.average:.1f}".replace('.', ',')
+    
+    @property
+    def full_stars(self):
+        """Cantidad de estrellas completas a mostrar (promedio redondeado)"""
+        return int(self.average + 0.5)
+    
+    @property
+    def distribution(self):
+        """[(estrellas, cantidad, porcentaje)] de 5 a 1 estrellas"""
+        return [
+            (
+                stars,
+                getattr(self, f'stars_{stars}'),
+                round(getattr(self, f'stars_{stars}') * 100 / self.review_count) if self.review_count else 0
+            )
+            for stars in range(5, 0, -1)
+        ]
 
 
 class DiscountCoupon(models.Model):
@@ -486,3 +570,36 @@ class ProductSupplier(models.Model):
     @property
     def formatted_profit_margin(self):
         return f"{self.profit_margin:.1f}%"
+
+
+class ProductDemandForecast(models.Model):
+    """Pronóstico de demanda y reposición de un producto (snapshot de shop.forecasting)"""
+    product = models.OneToOneField(
+        Product, 
+        on_delete=models.CASCADE, 
+        primary_key=True, 
+        related_name='demand_forecast'
+    )
+    supplier = models.ForeignKey(
+        Supplier, 
+        on_delete=models.SET_NULL, 
+        null=True, 
+        blank=True, 
+        related_name='demand_forecasts'
+    )
+    daily_velocity = models.FloatField(default=0, help_text="Unidades diarias (promedio exponencial sin estacionalidad)")
+    weekday_factors = models.JSONField(default=list, blank=True, help_text="Factor de demanda de lunes a domingo")
+    history_days = models.PositiveIntegerField(default=0, help_text="Días de historia usados")
+    lead_time_days = models.PositiveIntegerField(default=0, help_text="Días de entrega del proveedor")
+    minimum_order_quantity = models.PositiveIntegerField(default=1)
+    lead_time_demand = models.FloatField(default=0, help_text="Demanda esperada durante la entrega")
+    reorder_point = models.PositiveIntegerField(default=0, help_text="Stock con el que hay que pedir")
+    target_stock = models.PositiveIntegerField(default=0, help_text="Stock a alcanzar al reponer")
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Pronóstico de Demanda"
+        verbose_name_plural = "Pronósticos de Demanda"
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.daily_velocity:.1f} u/día"
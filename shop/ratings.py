@@ -0,0 +1,109 @@
+"""
+Resumen de reseñas por producto
+
+``ProductRating`` guarda por producto la cantidad de reseñas, la suma de
+ratings, el promedio y la distribución por estrellas. Se mantiene dentro de
+la misma transacción en que se crea, modifica o elimina una ``Review`` (ver
+``shop.signals``) con actualizaciones ``F()`` atómicas, así que los listados
+muestran y ordenan por rating sin consultas adicionales
+(``select_related('rating_summary')``).
+
+Se llena en la migración ``0009_populate_product_ratings`` y
+``manage.py backfill_product_ratings`` lo recalcula desde las reseñas.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from . import catalog_cache
+from .models import ProductRating, Review
+
+STAR_FIELDS = {stars: f'stars_{stars}' for stars in range(1, 6)}
+
+
+def average_expression():
+    return Case(
+        When(review_count__gt=0, then=Cast(F('rating_sum'), FloatField()) / F('review_count')),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+
+def apply_rating_deltas(deltas):
+    """
+    Aplica cambios de reseñas: ``deltas`` es {product_id: {estrellas: +n/-n}}.
+
+    Solo se crean filas de resumen para productos que suman reseñas, de modo
+    que eliminar un producto (y sus reseñas en cascada) no crea filas nuevas.
+    """
+    deltas = {
+        product_id: {stars: delta for stars, delta in star_deltas.items() if delta}
+        for product_id, star_deltas in deltas.items()
+    }
+    deltas = {product_id: star_deltas for product_id, star_deltas in deltas.items() if star_deltas}
+    if not deltas:
+        return
+
+    now = timezone.now()
+    with transaction.atomic():
+        new_product_ids = [
+            product_id for product_id, star_deltas in deltas.items()
+            if sum(star_deltas.values()) > 0
+        ]
+        if new_product_ids:
+            ProductRating.objects.bulk_create(
+                [ProductRating(product_id=product_id) for product_id in new_product_ids],
+                ignore_conflicts=True
+            )
+
+        for product_id, star_deltas in deltas.items():
+            updates = {
+                'review_count': F('review_count') + sum(star_deltas.values()),
+                'rating_sum': F('rating_sum') + sum(stars * delta for stars, delta in star_deltas.items()),
+                'updated_at': now,
+            }
+            for stars, delta in star_deltas.items():
+                updates[STAR_FIELDS[stars]] = F(STAR_FIELDS[stars]) + delta
+            ProductRating.objects.filter(product_id=product_id).update(**updates)
+
+        ProductRating.objects.filter(product_id__in=deltas).update(average=average_expression())
+
+
+def get_review_deltas(review, created=False, deleted=False, changes=None):
+    """Deltas de ``apply_rating_deltas`` para el guardado o eliminación de una reseña"""
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    if created:
+        deltas[review.product_id][review.rating] += 1
+    elif deleted:
+        deltas[review.product_id][review.rating] -= 1
+    elif changes:
+        old_product_id = changes.get('product_id', (review.product_id,))[0]
+        old_rating = changes.get('rating', (review.rating,))[0]
+        deltas[old_product_id][old_rating] -= 1
+        deltas[review.product_id][review.rating] += 1
+
+    return deltas
+
+
+def backfill_product_ratings():
+    """Recalcula todos los resúmenes desde las reseñas; retorna la cantidad de productos"""
+    summaries = {}
+    rows = Review.objects.values('product_id', 'rating').annotate(total=Count('id')).order_by()
+    for row in rows:
+        summary = summaries.setdefault(row['product_id'], ProductRating(product_id=row['product_id']))
+        setattr(summary, STAR_FIELDS[row['rating']], row['total'])
+        summary.review_count += row['total']
+        summary.rating_sum += row['rating'] * row['total']
+
+    for summary in summaries.values():
+        summary.average = summary.rating_sum / summary.review_count if summary.review_count else 0
+
+    with transaction.atomic():
+        ProductRating.objects.all().delete()
+        ProductRating.objects.bulk_create(summaries.values(), batch_size=1000)
+        transaction.on_commit(catalog_cache.invalidate_all)
+    return len(summaries)
@@ -0,0 +1,146 @@
+"""
+Índice de productos relacionados
+
+Para cada producto disponible se precalculan los ``RELATED_LIMIT`` productos
+más parecidos y se guardan en ``RelatedProduct``, de modo que la vista de
+detalle los lee con una sola consulta indexada.
+
+La similitud combina la categoría (misma categoría suma 1) y los
+ingredientes (índice de Jaccard entre los tokens normalizados de
+``shop.search``, entre 0 y 1). Los empates se resuelven por id.
+
+El índice se recalcula completo con ``manage.py rebuild_related_products``
+y de forma incremental cuando se guarda o elimina un producto (ver
+``shop.signals``): solo se recalculan el producto modificado y los
+productos cuyo top cambia por él.
+"""
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+
+from . import catalog_cache
+from .models import Product, RelatedProduct
+from .search import tokenize
+
+RELATED_LIMIT = getattr(settings, 'RELATED_PRODUCTS_LIMIT', 8)
+
+CATEGORY_WEIGHT = 1.0
+
+# Palabras de más de 3 letras, como en la búsqueda por ingredientes original
+MIN_TOKEN_LENGTH = 4
+
+
+def ingredient_tokens(ingredients):
+    return frozenset(token for token in tokenize(ingredients) if len(token) >= MIN_TOKEN_LENGTH)
+
+
+def load_catalog():
+    """{product_id: (category_id, tokens)} de los productos disponibles (1 consulta)"""
+    rows = Product.objects.filter(available=True).values_list('id', 'category_id', 'ingredients')
+    return {
+        product_id: (category_id, ingredient_tokens(ingredients))
+        for product_id, category_id, ingredients in rows
+    }
+
+
+def similarity(entry, other):
+    category_id, tokens = entry
+    other_category_id, other_tokens = other
+
+    score = CATEGORY_WEIGHT if category_id == other_category_id else 0.0
+    if tokens and other_tokens:
+        shared = len(tokens & other_tokens)
+        if shared:
+            score += shared / len(tokens | other_tokens)
+    return score
+
+
+def top_related(product_id, catalog, limit=RELATED_LIMIT):
+    """[(score, related_id)] de los productos más parecidos, de mayor a menor"""
+    entry = catalog.get(product_id)
+    if entry is None:
+        return []
+
+    scored = (
+        (similarity(entry, other), other_id)
+        for other_id, other in catalog.items()
+        if other_id != product_id
+    )
+    # Mayor puntaje primero; a igual puntaje, menor id
+    best = heapq.nsmallest(limit, ((-score, other_id) for score, other_id in scored if score > 0))
+    return [(-negative_score, other_id) for negative_score, other_id in best]
+
+
+def save_related(product_ids, catalog):
+    """Reemplaza las filas de ``RelatedProduct`` de los productos indicados"""
+    product_ids = list(product_ids)
+    rows = [
+        RelatedProduct(product_id=product_id, related_id=related_id, score=score, position=position)
+        for product_id in product_ids
+        for position, (score, related_id) in enumerate(top_related(product_id, catalog))
+    ]
+    with transaction.atomic():
+        RelatedProduct.objects.filter(product_id__in=product_ids).delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild_related_products(batch_size=200):
+    """Recalcula el índice completo; retorna la cantidad de filas creadas"""
+    catalog = load_catalog()
+    product_ids = list(catalog)
+    count = 0
+
+    with transaction.atomic():
+        # Los productos no disponibles no muestran relacionados
+        RelatedProduct.objects.filter(product__available=False).delete()
+        for start in range(0, len(product_ids), batch_size):
+            count += save_related(product_ids[start:start + batch_size], catalog)
+
+    transaction.on_commit(catalog_cache.invalidate_all)
+    return count
+
+
+def update_related_products(product_id):
+    """
+    Actualización incremental tras guardar o eliminar ``product_id``.
+
+    Recalcula el producto y los productos que lo tenían en su top o que
+    ahora lo tendrían (puntaje mayor al mínimo de su top actual).
+    """
+    catalog = load_catalog()
+
+    affected = set(
+        RelatedProduct.objects.filter(related_id=product_id).values_list('product_id', flat=True)
+    )
+
+    entry = catalog.get(product_id)
+    if entry is not None:
+        affected.add(product_id)
+        current = {
+            row['product_id']: (row['entries'], row['min_score'])
+            for row in RelatedProduct.objects.values('product_id').annotate(
+                entries=Count('id'), min_score=Min('score')
+            )
+        }
+        for other_id, other in catalog.items():
+            if other_id == product_id:
+                continue
+            score = similarity(other, entry)
+            if score <= 0:
+                continue
+            entries, min_score = current.get(other_id, (0, 0))
+            if entries < RELATED_LIMIT or score >= min_score:
+                affected.add(other_id)
+    else:
+        # El producto ya no está disponible: sin relacionados propios
+        RelatedProduct.objects.filter(product_id=product_id).delete()
+
+    affected = [other_id for other_id in affected if other_id in catalog]
+    if affected:
+        save_related(affected, catalog)
+        # Las páginas de detalle muestran los relacionados
+        transaction.on_commit(lambda: catalog_cache.invalidate_products(affected, listings=False))
+    return affected
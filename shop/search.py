@@ -0,0 +1,284 @@
+"""
+Índice de búsqueda de productos
+
+Mantiene un índice invertido de los productos en la misma base de datos:
+
+- SQLite: tabla virtual FTS5 ``shop_product_fts`` (ranking con ``bm25``)
+- PostgreSQL: tabla ``shop_product_search`` con un ``tsvector`` e índice GIN
+  (ranking con ``ts_rank``)
+
+El texto se normaliza antes de indexarlo y antes de buscar: minúsculas, sin
+tildes, sin palabras vacías y con un stemming liviano del español que lleva
+singular y plural a la misma raíz ("galleta"/"galletas" → "galleta",
+"dulce"/"dulces" → "dulc", "nuez"/"nueces" → "nuec"), así que el motor de la
+base de datos solo compara tokens ya normalizados.
+
+El índice se llena al migrar, se actualiza con los signals de ``Product`` y
+``Category`` (ver ``shop.signals``) y se reconstruye con
+``manage.py rebuild_search_index``.
+En otros motores de base de datos se usa la búsqueda con ``icontains``.
+"""
+import logging
+import re
+import unicodedata
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Case, IntegerField, Q, When
+
+logger = logging.getLogger(__name__)
+
+SQLITE_TABLE = 'shop_product_fts'
+POSTGRES_TABLE = 'shop_product_search'
+
+# Cantidad máxima de resultados rankeados por búsqueda
+MAX_RESULTS = 500
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'sin', 'su', 'sus', 'un', 'una', 'unos', 'unas', 'y',
+}
+
+TOKEN_RE = re.compile(r'[a-z0-9ñ]+')
+
+
+def strip_accents(text):
+    """Quita tildes y diéresis conservando la ñ"""
+    text = text.replace('ñ', '\0').replace('Ñ', '\0')
+    text = ''.join(
+        char for char in unicodedata.normalize('NFKD', text)
+        if not unicodedata.combining(char)
+    )
+    return text.replace('\0', 'ñ')
+
+
+def stem(word):
+    """
+    Stemming liviano del español: solo unifica singular y plural.
+
+    Se quita la ``s`` final y luego la ``e`` final, y la ``z`` final pasa a
+    ``c``, de modo que ambas formas quedan en la misma raíz: galletas →
+    galleta, dulce/dulces → dulc, limon/limones → limon, nuez/nueces → nuec.
+    """
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith('e'):
+        word = word[:-1]
+    if len(word) > 3 and word.endswith('z'):
+        word = word[:-1] + 'c'
+    return word
+
+
+def tokenize(text):
+    """Tokens normalizados (sin tildes, sin palabras vacías, con stemming)"""
+    text = strip_accents((text or '').lower())
+    return [stem(token) for token in TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+def normalize(text):
+    return ' '.join(tokenize(text))
+
+
+def get_backend():
+    """'sqlite', 'postgresql' o None si el motor no tiene índice"""
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return connection.vendor
+    return None
+
+
+# Estructura del índice
+
+def create_index(schema_editor=None):
+    """Crea la tabla del índice si no existe (usado por la migración y el rebuild)"""
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} "
+                f"USING fts5(product_id UNINDEXED, name, body, tokenize='unicode61')"
+            )
+        elif conn.vendor == 'postgresql':
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ("
+                f"product_id bigint PRIMARY KEY REFERENCES shop_product(id) ON DELETE CASCADE "
+                f"DEFERRABLE INITIALLY DEFERRED, "
+                f"document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_idx "
+                f"ON {POSTGRES_TABLE} USING GIN (document)"
+            )
+
+
+def drop_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+        elif conn.vendor == 'postgresql':
+            cursor.execute(f"DROP TABLE IF EXISTS {POSTGRES_TABLE}")
+
+
+# Mantención del índice
+
+def get_document(product):
+    """(nombre, cuerpo) normalizados de un producto"""
+    category_name = product.category.name if product.category_id else ''
+    body = ' '.join([category_name, product.description or '', product.ingredients or ''])
+    return normalize(product.name), normalize(body)
+
+
+def index_products(products):
+    """Agrega o actualiza productos en el índice"""
+    backend = get_backend()
+    if backend is None:
+        return
+
+    rows = [(product.pk,) + get_document(product) for product in products]
+    if not rows:
+        return
+
+    with connection.cursor() as cursor:
+        if backend == 'sqlite':
+            cursor.execute(
+                f"DELETE FROM {SQLITE_TABLE} WHERE product_id IN ({', '.join(['%s'] * len(rows))})",
+                [row[0] for row in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (product_id, name, body) VALUES (%s, %s, %s)",
+                rows
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (product_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')) "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows
+            )
+
+
+def remove_products(product_ids):
+    """Quita productos del índice"""
+    backend = get_backend()
+    product_ids = list(product_ids)
+    if backend is None or not product_ids:
+        return
+
+    table = SQLITE_TABLE if backend == 'sqlite' else POSTGRES_TABLE
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE product_id IN ({', '.join(['%s'] * len(product_ids))})",
+            product_ids
+        )
+
+
+def rebuild_index(batch_size=500):
+    """Reconstruye el índice completo; retorna la cantidad de productos indexados"""
+    from .models import Product
+
+    if get_backend() is None:
+        return 0
+
+    create_index()
+    table = SQLITE_TABLE if get_backend() == 'sqlite' else POSTGRES_TABLE
+    count = 0
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table}")
+
+        products = Product.objects.select_related('category').only(
+            'id', 'name', 'description', 'ingredients', 'category__name'
+        ).order_by('id')
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                index_products(batch)
+                count += len(batch)
+                batch = []
+        index_products(batch)
+        count += len(batch)
+
+    return count
+
+
+# Consultas
+
+def build_match_query(tokens, backend, any_term=False):
+    """Consulta de prefijos para FTS5 o ``to_tsquery`` (todos los términos o cualquiera)"""
+    if backend == 'sqlite':
+        joiner = ' OR ' if any_term else ' AND '
+        return joiner.join(f'"{token}"*' for token in tokens)
+    joiner = ' | ' if any_term else ' & '
+    return joiner.join(f"{token}:*" for token in tokens)
+
+
+def search_product_ids(query, any_term=False, limit=MAX_RESULTS):
+    """
+    Ids de productos que coinciden con ``query``, ordenados por relevancia.
+
+    Retorna None si no hay índice disponible (el llamador usa ``icontains``).
+    """
+    backend = get_backend()
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if backend is None:
+        return None
+    if not tokens:
+        return []
+
+    match = build_match_query(tokens, backend, any_term=any_term)
+    if backend == 'sqlite':
+        sql = (
+            f"SELECT product_id FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+            f"ORDER BY bm25({SQLITE_TABLE}, 0, 10.0, 1.0) LIMIT %s"
+        )
+    else:
+        sql = (
+            f"SELECT product_id FROM {POSTGRES_TABLE} WHERE document @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC LIMIT %s"
+        )
+
+    params = [match, limit] if backend == 'sqlite' else [match, match, limit]
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return [int(row[0]) for row in cursor.fetchall()]
+    except DatabaseError as e:
+        logger.warning(f"Índice de búsqueda no disponible ({str(e)}); usando icontains")
+        return None
+
+
+def icontains_filter(query):
+    return (
+        Q(name__icontains=query) |
+        Q(description__icontains=query) |
+        Q(ingredients__icontains=query)
+    )
+
+
+def order_by_ids(queryset, product_ids):
+    """Ordena el queryset según la posición de cada id en ``product_ids``"""
+    if not product_ids:
+        return queryset
+    return queryset.annotate(
+        search_rank=Case(
+            *[When(id=product_id, then=position) for position, product_id in enumerate(product_ids)],
+            output_field=IntegerField()
+        )
+    ).order_by('search_rank')
+
+
+def search_products(queryset, query, ranked=True):
+    """
+    Filtra ``queryset`` por la búsqueda usando el índice.
+
+    Con ``ranked`` los resultados quedan ordenados por relevancia.
+    """
+    product_ids = search_product_ids(query)
+    if product_ids is None:
+        queryset = queryset.filter(icontains_filter(query))
+        return queryset.order_by('-created_at') if ranked else queryset
+
+    queryset = queryset.filter(id__in=product_ids)
+    return order_by_ids(queryset, product_ids) if ranked else queryset
@@ -1,24 +1,13 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+import logging
+from django.db import DatabaseError, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from orders.models import Order, OrderItem
-from shop.models import Product, ProductStock
+from shop.models import Category, Product, ProductStock, Review
+from shop import catalog_cache, ratings, related, search, stock
 
-
-# Guardar el estado anterior de la orden antes de que se modifique
-@receiver(pre_save, sender=Order)
-def cache_old_order_status(sender, instance, **kwargs):
-    """
-    Guarda el estado anterior de la orden para detectar cambios
-    """
-    if instance.pk:
-        try:
-            old_order = Order.objects.get(pk=instance.pk)
-            instance._old_status = old_order.status
-        except Order.DoesNotExist:
-            instance._old_status = None
-    else:
-        instance._old_status = None
+logger = logging.getLogger(__name__)
 
 
 @receiver(post_save, sender=Order)
@@ -27,55 +16,22 @@ def handle_order_status_change(sender, instance, created, **kwargs):
     Maneja los cambios de estado de las órdenes para actualizar el stock automáticamente
     """
     if created:
-        # Nueva orden creada - reservar stock
-        reserve_stock_for_order(instance)
+        # Nueva orden creada - reservar stock (el checkout lo hace después de crear los items)
+        if not getattr(instance, '_defer_stock_reservation', False):
+            reserve_stock_for_order(instance)
     else:
-        # Orden existente - manejar cambios de estado
-        old_status = getattr(instance, '_old_status', None)
+        # Orden existente - manejar cambios de estado (detectados por Order.save en memoria)
+        status_change = getattr(instance, 'last_field_changes', {}).get('status')
         
-        if old_status and old_status != instance.status:
-            handle_order_status_stock_update(instance, old_status, instance.status)
+        if status_change and status_change[0]:
+            handle_order_status_stock_update(instance, status_change[0], instance.status)
 
 
 def reserve_stock_for_order(order):
     """
     Reserva stock cuando se crea una nueva orden
     """
-    for item in order.items.all():
-        product = item.product
-        
-        # Verificar que hay suficiente stock
-        if product.stock >= item.quantity:
-            # Guardar stock anterior
-            previous_stock = product.stock
-            
-            # Reducir stock
-            product.stock -= item.quantity
-            product.save()
-            
-            # Registrar movimiento de stock
-            ProductStock.objects.create(
-                product=product,
-                movement_type='sale',
-                quantity=-item.quantity,  # Negativo porque es una salida
-                previous_stock=previous_stock,
-                new_stock=product.stock,
-                reason=f'Venta - Pedido #{order.order_number}',
-                reference=order.order_number,
-                user=order.user
-            )
-        else:
-            # Stock insuficiente - registrar alerta pero no bloquear la orden
-            ProductStock.objects.create(
-                product=product,
-                movement_type='adjustment',
-                quantity=0,
-                previous_stock=product.stock,
-                new_stock=product.stock,
-                reason=f'ALERTA: Stock insuficiente para pedido #{order.order_number}. Solicitado: {item.quantity}, Disponible: {product.stock}',
-                reference=order.order_number,
-                user=order.user
-            )
+    return stock.reserve_stock_for_order(order)
 
 
 def handle_order_status_stock_update(order, old_status, new_status):
@@ -99,48 +55,25 @@ def restore_stock_for_cancelled_order(order):
     """
     Devuelve el stock cuando una orden se cancela
     """
-    for item in order.items.all():
-        product = item.product
-        previous_stock = product.stock
-        
-        # Devolver stock
-        product.stock += item.quantity
-        product.save()
-        
-        # Registrar movimiento de stock
-        ProductStock.objects.create(
-            product=product,
-            movement_type='return',
-            quantity=item.quantity,  # Positivo porque es una devolución
-            previous_stock=previous_stock,
-            new_stock=product.stock,
-            reason=f'Devolución por cancelación - Pedido #{order.order_number}',
-            reference=order.order_number,
-            user=order.user
-        )
+    return stock.restore_stock_for_order(order)
 
 
 def confirm_delivery_stock_movement(order):
     """
     Registra la confirmación de entrega (el stock ya fue descontado)
     """
-    for item in order.items.all():
-        product = item.product
-        
-        # Solo registrar el movimiento de confirmación
-        ProductStock.objects.create(
-            product=product,
-            movement_type='sale',
-            quantity=0,  # Cero porque ya fue descontado
-            previous_stock=product.stock,
-            new_stock=product.stock,
-            reason=f'Entrega confirmada - Pedido #{order.order_number}',
-            reference=order.order_number,
-            user=order.user
-        )
+    return stock.confirm_delivery_for_order(order)
 
 
 # Manejar eliminación de órdenes (devolver stock)
+@receiver(pre_delete, sender=Order)
+def cache_order_quantities_before_deletion(sender, instance, **kwargs):
+    """
+    Guarda las cantidades del pedido antes de que se eliminen sus items en cascada
+    """
+    instance._stock_quantities = stock.get_order_quantities(instance)
+
+
 @receiver(post_delete, sender=Order)
 def handle_order_deletion(sender, instance, **kwargs):
     """
@@ -148,25 +81,135 @@ def handle_order_deletion(sender, instance, **kwargs):
     """
     if instance.status not in ['cancelled', 'delivered']:
         # Solo devolver stock si la orden no estaba cancelada o entregada
-        for item in instance.items.all():
-            product = item.product
-            previous_stock = product.stock
-            
-            # Devolver stock
-            product.stock += item.quantity
-            product.save()
-            
-            # Registrar movimiento de stock
-            ProductStock.objects.create(
-                product=product,
-                movement_type='return',
-                quantity=item.quantity,
-                previous_stock=previous_stock,
-                new_stock=product.stock,
-                reason=f'Devolución por eliminación de orden #{instance.order_number}',
-                reference=instance.order_number,
-                user=instance.user
-            )
+        stock.restore_stock_for_order(
+            instance,
+            reason=f'Devolución por eliminación de orden #{instance.order_number}',
+            quantities=getattr(instance, '_stock_quantities', None) or {}
+        )
+
+
+# Mantener el índice de búsqueda de productos
+
+def update_search_index(function, *args):
+    """Actualiza el índice después del commit; un error del índice no bloquea el guardado"""
+    def update():
+        try:
+            with transaction.atomic():
+                function(*args)
+        except DatabaseError as e:
+            logger.warning(f"No se pudo actualizar el índice de búsqueda: {str(e)}")
+    
+    transaction.on_commit(update)
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+    update_search_index(search.index_products, [instance])
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+    update_search_index(search.remove_products, [instance.pk])
+
+
+# Mantener el índice de productos relacionados
+
+RELATED_PRODUCT_FIELDS = ('category_id', 'ingredients', 'available')
+
+
+@receiver(pre_save, sender=Product)
+def track_related_product_changes(sender, instance, update_fields=None, **kwargs):
+    changes = instance.get_field_changes(update_fields)
+    instance._related_product_changes = {name: changes[name] for name in RELATED_PRODUCT_FIELDS if name in changes}
+
+
+@receiver(post_save, sender=Product)
+def update_related_products_on_save(sender, instance, created, **kwargs):
+    # Solo si cambió algo que afecta la similitud (no en cada guardado del admin o de stock)
+    if not created and not getattr(instance, '_related_product_changes', None):
+        return
+    product_id = instance.pk
+    transaction.on_commit(lambda: related.update_related_products(product_id))
+
+
+@receiver(post_delete, sender=Product)
+def update_related_products_on_delete(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: related.update_related_products(product_id))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    """El nombre de la categoría forma parte del texto indexado de sus productos"""
+    if not created:
+        update_search_index(
+            lambda category_id: search.index_products(
+                Product.objects.select_related('category').filter(category_id=category_id)
+            ),
+            instance.pk
+        )
+
+
+# Mantener el resumen de reseñas de cada producto
+
+@receiver(pre_save, sender=Review)
+def track_review_rating_changes(sender, instance, update_fields=None, **kwargs):
+    instance._rating_changes = instance.get_field_changes(update_fields)
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, created, update_fields=None, **kwargs):
+    deltas = ratings.get_review_deltas(
+        instance, created=created, changes=getattr(instance, '_rating_changes', None)
+    )
+    ratings.apply_rating_deltas(deltas)
+    instance.reset_field_tracking(update_fields)
+    invalidate_catalog_cache(catalog_cache.invalidate_products, list(deltas))
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, **kwargs):
+    deltas = ratings.get_review_deltas(instance, deleted=True)
+    ratings.apply_rating_deltas(deltas)
+    invalidate_catalog_cache(catalog_cache.invalidate_products, list(deltas))
+
+
+# Invalidar el cache del catálogo (ver shop.catalog_cache)
+
+def invalidate_catalog_cache(function, *args, **kwargs):
+    """Invalida después del commit, para no cachear datos que aún no son visibles"""
+    transaction.on_commit(lambda: function(*args, **kwargs))
+
+
+@receiver(post_save, sender=Product)
+def invalidate_catalog_cache_on_product_save(sender, instance, created, update_fields=None, **kwargs):
+    slugs = {instance.slug}
+    if not created:
+        # Si cambió el slug, también la página con el slug anterior
+        previous_slug = instance.get_field_changes(update_fields).get('slug', (None,))[0]
+        if previous_slug:
+            slugs.add(previous_slug)
+    instance.reset_field_tracking(update_fields)
+    invalidate_catalog_cache(catalog_cache.invalidate_products, [instance.pk], slugs=slugs)
+
+
+@receiver(pre_delete, sender=Product)
+def invalidate_catalog_cache_on_product_delete(sender, instance, **kwargs):
+    # Antes de la eliminación en cascada de los productos relacionados
+    slugs = catalog_cache.get_product_page_slugs([instance.pk])
+    invalidate_catalog_cache(catalog_cache.invalidate_products, slugs=slugs + [instance.slug])
+
+
+@receiver(stock.stock_changed)
+def invalidate_catalog_cache_on_stock_change(sender, products, **kwargs):
+    # stock_changed ya se envía después del commit
+    catalog_cache.invalidate_products([product.pk for product in products])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache_on_category_change(sender, instance, **kwargs):
+    invalidate_catalog_cache(catalog_cache.invalidate_categories)
 
 
 # Funciones auxiliares para gestión manual de stock
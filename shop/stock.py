@@ -0,0 +1,215 @@
+"""
+Servicio de reservas de stock para pedidos
+
+Todas las operaciones de stock asociadas a pedidos (reserva al crear,
+devolución al cancelar o eliminar y confirmación de entrega) pasan por
+``apply_orders_stock``: bloquea los productos de los pedidos con una sola
+consulta ``select_for_update``, aplica actualizaciones condicionales con
+``F('stock')`` y registra todos los movimientos con ``bulk_create`` dentro
+de una misma transacción.
+"""
+from django.db import transaction
+from django.db.models import F, Sum
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Product, ProductStock
+
+# Se envía (después del commit) con los productos cuyo stock cambió.
+# Argumentos: products (lista de Product con el stock actualizado)
+stock_changed = Signal()
+
+RESERVE = 'reserve'
+RESTORE = 'restore'
+CONFIRM_DELIVERY = 'confirm_delivery'
+
+
+def get_order_quantities(order):
+    """Retorna {product_id: cantidad total} de los items del pedido (1 consulta)"""
+    rows = order.items.values('product_id').annotate(total_quantity=Sum('quantity'))
+    return {row['product_id']: row['total_quantity'] for row in rows}
+
+
+def get_orders_quantities(orders):
+    """Retorna {order_id: {product_id: cantidad}} para varios pedidos (1 consulta)"""
+    from orders.models import OrderItem
+
+    quantities_by_order = {order.pk: {} for order in orders}
+    rows = (
+        OrderItem.objects.filter(order_id__in=quantities_by_order)
+        .values('order_id', 'product_id')
+        .annotate(total_quantity=Sum('quantity'))
+    )
+    for row in rows:
+        quantities_by_order[row['order_id']][row['product_id']] = row['total_quantity']
+    return quantities_by_order
+
+
+def _default_reason(operation, order):
+    if operation == RESERVE:
+        return f'Venta - Pedido #{order.order_number}'
+    if operation == RESTORE:
+        return f'Devolución por cancelación - Pedido #{order.order_number}'
+    return f'Entrega confirmada - Pedido #{order.order_number}'
+
+
+def apply_orders_stock(orders, operation, reason=None, quantities_by_order=None):
+    """
+    Aplica una operación de stock a todos los productos de uno o más pedidos.
+
+    - RESERVE: descuenta el stock si alcanza; si no, registra una alerta
+    - RESTORE: devuelve al stock las cantidades del pedido
+    - CONFIRM_DELIVERY: solo registra la confirmación (el stock ya fue descontado)
+
+    Las cantidades se agregan por producto: cada producto recibe un único
+    UPDATE aunque aparezca en muchos pedidos, y se registra un movimiento por
+    pedido y producto. Retorna la lista de movimientos ``ProductStock`` creados.
+    """
+    if operation not in (RESERVE, RESTORE, CONFIRM_DELIVERY):
+        raise ValueError(f'Operación de stock desconocida: {operation}')
+
+    orders = list(orders)
+    if quantities_by_order is None:
+        quantities_by_order = get_orders_quantities(orders)
+
+    product_ids = {
+        product_id
+        for quantities in quantities_by_order.values()
+        for product_id in quantities
+    }
+    if not product_ids:
+        return []
+
+    now = timezone.now()
+    movements = []
+    changed_products = []
+
+    with transaction.atomic():
+        # Orden por id para que transacciones concurrentes bloqueen en el mismo orden
+        products = {
+            product.id: product
+            for product in Product.objects.select_for_update().filter(id__in=product_ids).order_by('id')
+        }
+
+        for product in products.values():
+            previous_stock = product.stock
+            available = previous_stock
+            product_movements = []
+
+            for order in orders:
+                quantity = quantities_by_order.get(order.pk, {}).get(product.id)
+                if not quantity:
+                    continue
+
+                if operation == RESERVE:
+                    if available >= quantity:
+                        product_movements.append(ProductStock(
+                            product=product,
+                            movement_type='sale',
+                            quantity=-quantity,  # Negativo porque es una salida
+                            previous_stock=available,
+                            new_stock=available - quantity,
+                            reason=reason or _default_reason(operation, order),
+                            reference=order.order_number,
+                            user_id=order.user_id
+                        ))
+                        available -= quantity
+                    else:
+                        # Stock insuficiente - registrar alerta pero no bloquear la orden
+                        movements.append(ProductStock(
+                            product=product,
+                            movement_type='adjustment',
+                            quantity=0,
+                            previous_stock=available,
+                            new_stock=available,
+                            reason=(
+                                f'ALERTA: Stock insuficiente para pedido #{order.order_number}. '
+                                f'Solicitado: {quantity}, Disponible: {available}'
+                            ),
+                            reference=order.order_number,
+                            user_id=order.user_id
+                        ))
+
+                elif operation == RESTORE:
+                    product_movements.append(ProductStock(
+                        product=product,
+                        movement_type='return',
+                        quantity=quantity,  # Positivo porque es una devolución
+                        previous_stock=available,
+                        new_stock=available + quantity,
+                        reason=reason or _default_reason(operation, order),
+                        reference=order.order_number,
+                        user_id=order.user_id
+                    ))
+                    available += quantity
+
+                else:
+                    movements.append(ProductStock(
+                        product=product,
+                        movement_type='sale',
+                        quantity=0,  # Cero porque ya fue descontado
+                        previous_stock=available,
+                        new_stock=available,
+                        reason=reason or _default_reason(operation, order),
+                        reference=order.order_number,
+                        user_id=order.user_id
+                    ))
+
+            delta = available - previous_stock
+            if not delta:
+                continue
+
+            # Actualización condicional: si otro proceso cambió el stock (ej: SQLite
+            # sin bloqueo de filas) y ya no alcanza, no se descuenta nada
+            updated = Product.objects.filter(pk=product.pk, stock__gte=-delta).update(
+                stock=F('stock') + delta, updated_at=now
+            )
+            if updated:
+                product.stock = available
+                changed_products.append(product)
+                movements.extend(product_movements)
+            else:
+                movements.extend(
+                    ProductStock(
+                        product=product,
+                        movement_type='adjustment',
+                        quantity=0,
+                        previous_stock=previous_stock,
+                        new_stock=previous_stock,
+                        reason=f'ALERTA: Stock insuficiente para pedido #{movement.reference}',
+                        reference=movement.reference,
+                        user_id=movement.user_id
+                    )
+                    for movement in product_movements
+                )
+
+        ProductStock.objects.bulk_create(movements)
+
+        if changed_products:
+            transaction.on_commit(
+                lambda: stock_changed.send(sender=Product, products=changed_products)
+            )
+
+    return movements
+
+
+def apply_order_stock(order, operation, reason=None, quantities=None):
+    """Aplica una operación de stock a un solo pedido (ver ``apply_orders_stock``)"""
+    if quantities is None:
+        quantities = get_order_quantities(order)
+    return apply_orders_stock([order], operation, reason=reason, quantities_by_order={order.pk: quantities})
+
+
+def reserve_stock_for_order(order, quantities=None):
+    """Reserva stock cuando se crea (o reactiva) un pedido"""
+    return apply_order_stock(order, RESERVE, quantities=quantities)
+
+
+def restore_stock_for_order(order, reason=None, quantities=None):
+    """Devuelve el stock de un pedido cancelado o eliminado"""
+    return apply_order_stock(order, RESTORE, reason=reason, quantities=quantities)
+
+
+def confirm_delivery_for_order(order, quantities=None):
+    """Registra la confirmación de entrega de un pedido"""
+    return apply_order_stock(order, CONFIRM_DELIVERY, quantities=quantities)
@@ -0,0 +1,231 @@
+"""
+Alertas de stock
+
+Clasifica los productos disponibles con una sola consulta (``Case``/``When``)
+usando el umbral propio de cada producto (``Product.min_stock_alert``):
+
+- ``out``: sin stock
+- ``critical``: stock hasta ``min_stock_alert``
+- ``low``: stock hasta ``LOW_STOCK_FACTOR`` veces ``min_stock_alert`` o hasta
+  el punto de pedido del pronóstico de demanda
+
+Prioridad ``high`` para los agotados, los críticos con stock hasta la mitad
+del mínimo y los que se agotan antes de que llegue un pedido, ``medium``
+para el resto de los críticos y ``low`` para el stock bajo. La orden sugerida repone hasta el stock objetivo del pronóstico
+(``ProductDemandForecast``, ver ``shop.forecasting``), al menos
+``RESTOCK_FACTOR`` veces el mínimo y no menos que el pedido mínimo del
+proveedor. Los días de cobertura dividen el stock actual por la velocidad
+de venta del pronóstico.
+
+Los filtros, el orden y la paginación se resuelven en la base de datos.
+La usan ``management.views.StockAlertsView``, ``StockAlertsAPIView`` (que
+responde 304 con ``get_alerts_etag`` si nada cambió) y el comando
+``check_stock_alerts``.
+
+Uso:
+
+    result = get_stock_alerts(request.GET)
+    result['statistics']['critical_alerts']
+    for alert in result['alerts']: ...
+"""
+import hashlib
+
+from django.core.paginator import Paginator
+from django.db.models import Case, CharField, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from . import catalog_cache
+from .forecasting import FORECAST_TAG
+from .models import Product, ProductStock
+
+LOW_STOCK_FACTOR = 2
+RESTOCK_FACTOR = 4
+PER_PAGE = 25
+
+ALERT_TYPES = ('out', 'critical', 'low')
+PRIORITIES = ('high', 'medium', 'low')
+
+SORT_OPTIONS = {
+    'priority': ('priority_rank', 'stock', 'name'),
+    'stock': ('stock', 'name'),
+    '-stock': ('-stock', 'name'),
+    'name': ('name',),
+    'category': ('category__name', 'name'),
+    'recommended': ('-recommended_order', 'name'),
+    'cover': (F('days_of_cover').asc(nulls_last=True), 'stock', 'name'),
+}
+DEFAULT_SORT = 'priority'
+
+# Las alertas cambian con los productos, sus categorías y los movimientos de
+# stock, que ya incrementan estas etiquetas (ver shop.signals), y con cada
+# recálculo del pronóstico
+ETAG_TAGS = (catalog_cache.CATALOG_TAG, catalog_cache.CATEGORIES_TAG, catalog_cache.PRODUCTS_TAG, FORECAST_TAG)
+
+
+def parse_filters(params):
+    """Filtros válidos desde los parámetros de la URL; los valores desconocidos se ignoran"""
+    category = params.get('category', '')
+    alert_type = params.get('alert_type', '')
+    priority = params.get('priority', '')
+    sort = params.get('sort', '')
+    return {
+        'category': category if category.isdigit() else '',
+        'alert_type': alert_type if alert_type in ALERT_TYPES else '',
+        'priority': priority if priority in PRIORITIES else '',
+        'sort': sort if sort in SORT_OPTIONS else DEFAULT_SORT,
+    }
+
+
+def get_alerts_queryset(category='', alert_type='', priority='', sort=DEFAULT_SORT, types=ALERT_TYPES):
+    """Productos con alerta, anotados con ``alert_type``, ``alert_priority``,
+    ``recommended_order``, ``days_of_cover``, los datos del pronóstico y
+    ``out_since`` (último movimiento que dejó el stock en 0)"""
+    minimum = F('min_stock_alert')
+    velocity = F('demand_forecast__daily_velocity')
+    target_stock = Greatest(
+        Coalesce('demand_forecast__target_stock', 0),
+        minimum * RESTOCK_FACTOR,
+        output_field=IntegerField(),
+    )
+    # Los registros de alerta de check_stock_alerts (cantidad 0) no cuentan como salida
+    last_out = (
+        ProductStock.objects
+        .filter(product=OuterRef('pk'), new_stock=0)
+        .exclude(quantity=0)
+        .order_by('-created_at')
+    )
+
+    queryset = (
+        Product.objects
+        .filter(available=True)
+        .filter(Q(stock__lte=minimum * LOW_STOCK_FACTOR) | Q(stock__lte=F('demand_forecast__reorder_point')))
+        .select_related('category')
+        .annotate(
+            daily_velocity=velocity,
+            lead_time_days=F('demand_forecast__lead_time_days'),
+            days_of_cover=Case(
+                When(demand_forecast__daily_velocity__gt=0, then=F('stock') / velocity),
+                output_field=FloatField(),
+            ),
+            alert_type=Case(
+                When(stock=0, then=Value('out')),
+                When(stock__lte=minimum, then=Value('critical')),
+                default=Value('low'),
+                output_field=CharField(),
+            ),
+            alert_priority=Case(
+                When(stock=0, then=Value('high')),
+                When(stock__lte=minimum / 2, then=Value('high')),
+                # Se agota antes de que llegue un pedido hecho hoy
+                When(days_of_cover__lt=F('lead_time_days'), then=Value('high')),
+                When(stock__lte=minimum, then=Value('medium')),
+                default=Value('low'),
+                output_field=CharField(),
+            ),
+            priority_rank=Case(
+                *[When(alert_priority=value, then=Value(rank)) for rank, value in enumerate(PRIORITIES)],
+                output_field=IntegerField(),
+            ),
+            recommended_order=Greatest(
+                target_stock - F('stock'),
+                Coalesce('demand_forecast__minimum_order_quantity', 1),
+                output_field=IntegerField(),
+            ),
+            out_since=Subquery(last_out.values('created_at')[:1]),
+        )
+    )
+
+    if category:
+        queryset = queryset.filter(category_id=category)
+    if alert_type:
+        queryset = queryset.filter(alert_type=alert_type)
+    elif set(types) != set(ALERT_TYPES):
+        queryset = queryset.filter(alert_type__in=types)
+    if priority:
+        queryset = queryset.filter(alert_priority=priority)
+
+    return queryset.order_by(*SORT_OPTIONS[sort])
+
+
+def get_alert_statistics(queryset):
+    """Contadores por tipo de alerta con una sola agregación condicional"""
+    return queryset.aggregate(
+        critical_alerts=Count('id', filter=Q(alert_type='critical')),
+        low_stock_alerts=Count('id', filter=Q(alert_type='low')),
+        out_of_stock=Count('id', filter=Q(alert_type='out')),
+        total_alerts=Count('id'),
+    )
+
+
+def build_alert(product, today=None):
+    """Diccionario de la alerta de un producto anotado por ``get_alerts_queryset``"""
+    days_out = 0
+    if product.alert_type == 'out' and product.out_since:
+        # Días calendario, para que el ETag (que incluye la fecha) cambie cuando cambian
+        days_out = ((today or timezone.localdate()) - timezone.localdate(product.out_since)).days
+    return {
+        'product': product,
+        'type': product.alert_type,
+        'priority': product.alert_priority,
+        'current_stock': product.stock,
+        'minimum_stock': product.min_stock_alert,
+        'recommended_order': product.recommended_order,
+        'days_out': days_out,
+        'daily_velocity': round(product.daily_velocity, 1) if product.daily_velocity is not None else None,
+        'days_of_cover': round(product.days_of_cover, 1) if product.days_of_cover is not None else None,
+        'lead_time_days': product.lead_time_days,
+    }
+
+
+def serialize_alert(alert):
+    """Versión JSON de una alerta, para la API"""
+    product = alert['product']
+    data = {key: value for key, value in alert.items() if key != 'product'}
+    data.update({
+        'id': product.id,
+        'name': product.name,
+        'sku': f'PRD-{product.id:04d}',
+        'category': product.category.name,
+        'image_url': product.image.url if product.image else None,
+        'last_updated': product.updated_at.isoformat(),
+    })
+    return data
+
+
+def get_stock_alerts(params, per_page=PER_PAGE):
+    """Página de alertas, contadores y filtros aplicados según los parámetros de la URL
+
+    Dos consultas: los contadores (que también dan el total para el paginador)
+    y la página de productos.
+    """
+    filters = parse_filters(params)
+    queryset = get_alerts_queryset(**filters)
+    statistics = get_alert_statistics(queryset)
+
+    paginator = Paginator(queryset, per_page)
+    paginator.count = statistics['total_alerts']
+    page_obj = paginator.get_page(params.get('page'))
+
+    today = timezone.localdate()
+    return {
+        'alerts': [build_alert(product, today) for product in page_obj],
+        'statistics': statistics,
+        'page_obj': page_obj,
+        'filters': filters,
+    }
+
+
+def get_alerts_etag(params):
+    """ETag de las alertas sin consultar la base de datos
+
+    Combina las versiones de las etiquetas del catálogo, el día (los días
+    sin stock avanzan solos) y los parámetros normalizados de la consulta.
+    """
+    versions = catalog_cache.get_versions(ETAG_TAGS)
+    filters = parse_filters(params)
+    parts = [str(versions[tag]) for tag in ETAG_TAGS]
+    parts.append(timezone.localdate().isoformat())
+    parts.extend(f'{key}={value}' for key, value in sorted(filters.items()))
+    parts.append(f"page={params.get('page', '')}")
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
@@ -1,3 +1,336 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from dulce_bias_project.cache import cache
+
+from orders.models import Order, OrderItem
+
+from . import catalog_cache, ratings, related, search, stock
+from .models import Category, Product, ProductRating, ProductStock, RelatedProduct, Review
+
+
+def create_product(category, name, **kwargs):
+    kwargs.setdefault('slug', name.lower().replace(' ', '-'))
+    kwargs.setdefault('description', '')
+    kwargs.setdefault('ingredients', '')
+    kwargs.setdefault('price', Decimal('1000'))
+    kwargs.setdefault('stock', 10)
+    kwargs.setdefault('image', 'products/test.jpg')
+    return Product.objects.create(category=category, name=name, **kwargs)
+
+
+def create_order(user, items):
+    """Pedido pendiente con sus items ([(producto, cantidad)]) y el stock aún sin reservar"""
+    subtotal = sum(product.price * quantity for product, quantity in items)
+    order = Order(
+        user=user, first_name='Ana', last_name='Pérez', email='ana@example.com', phone='912345678',
+        address='Calle 1', city='Santiago', region='rm', subtotal=subtotal, total=subtotal
+    )
+    order._defer_stock_reservation = True
+    order.save()
+    for product, quantity in items:
+        OrderItem.objects.create(order=order, product=product, price=product.price, quantity=quantity)
+    return order
+
+
+class StemTests(SimpleTestCase):
+
+    def test_singular_and_plural_share_a_stem(self):
+        for singular, plural in [
+            ('dulce', 'dulces'),
+            ('postre', 'postres'),
+            ('nuez', 'nueces'),
+            ('limon', 'limones'),
+            ('azucar', 'azucares'),
+            ('galleta', 'galletas'),
+            ('chocolate', 'chocolates'),
+            ('pan', 'panes'),
+        ]:
+            with self.subTest(singular=singular):
+                self.assertEqual(search.stem(singular), search.stem(plural))
+
+    def test_tokenize_normalizes_accents_and_stopwords(self):
+        self.assertEqual(search.tokenize('Galletas de Azúcar con Nueces'), ['galleta', 'azucar', 'nuec'])
+
+
+class SearchIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        search.create_index()
+        cls.category = Category.objects.create(name='Galletas', slug='galletas')
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.plural = create_product(cls.category, 'Dulces de leche', ingredients='nueces, azúcar')
+            cls.singular = create_product(cls.category, 'Postre de limón', ingredients='nuez')
+
+    def test_singular_query_matches_plural_product(self):
+        self.assertEqual(search.search_product_ids('dulce'), [self.plural.pk])
+
+    def test_plural_query_matches_singular_product(self):
+        self.assertEqual(search.search_product_ids('postres'), [self.singular.pk])
+        self.assertEqual(search.search_product_ids('limones'), [self.singular.pk])
+
+    def test_both_forms_match_both_products(self):
+        self.assertEqual(set(search.search_product_ids('nuez')), {self.plural.pk, self.singular.pk})
+        self.assertEqual(set(search.search_product_ids('nueces')), {self.plural.pk, self.singular.pk})
+
+    def test_index_follows_product_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plural.name = 'Alfajores'
+            self.plural.save()
+        self.assertEqual(search.search_product_ids('dulces'), [])
+        self.assertEqual(search.search_product_ids('alfajor'), [self.plural.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.plural.delete()
+        self.assertEqual(search.search_product_ids('alfajores'), [])
+
+
+class RelatedProductsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cookies = Category.objects.create(name='Galletas', slug='galletas')
+        cls.cakes = Category.objects.create(name='Tortas', slug='tortas')
+
+    def get_related_ids(self, product):
+        return list(
+            RelatedProduct.objects.filter(product=product).order_by('position').values_list('related_id', flat=True)
+        )
+
+    def test_ranks_by_category_and_shared_ingredients(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = create_product(self.cookies, 'Galleta avena', ingredients='avena, pasas, canela')
+            same_category = create_product(self.cookies, 'Galleta chocolate', ingredients='chocolate, harina')
+            both = create_product(self.cookies, 'Galleta canela', ingredients='avena, canela')
+            ingredients_only = create_product(self.cakes, 'Torta de avena', ingredients='avena, manzana')
+            create_product(self.cakes, 'Torta de limón', ingredients='limón, merengue')
+            create_product(self.cookies, 'Galleta agotada', ingredients='avena, canela', available=False)
+
+        self.assertEqual(self.get_related_ids(product), [both.pk, same_category.pk, ingredients_only.pk])
+
+    def test_recomputes_only_when_similarity_fields_change(self):
+        with mock.patch.object(related, 'update_related_products') as update:
+            with self.captureOnCommitCallbacks(execute=True):
+                product = create_product(self.cookies, 'Galleta avena', ingredients='avena')
+            self.assertEqual(update.call_count, 1)
+
+            product = Product.objects.get(pk=product.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                product.stock = 3
+                product.price = Decimal('1500')
+                product.save()
+            self.assertEqual(update.call_count, 1)
+
+            for field, value in [('ingredients', 'avena, miel'), ('available', False), ('category', self.cakes)]:
+                with self.subTest(field=field), self.captureOnCommitCallbacks(execute=True):
+                    setattr(product, field, value)
+                    product.save(update_fields=[field])
+            self.assertEqual(update.call_count, 4)
+
+
+class ProductRatingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Galletas', slug='galletas')
+        cls.product = create_product(category, 'Galleta avena')
+        cls.other = create_product(category, 'Galleta chocolate')
+        cls.users = [User.objects.create(username=f'cliente{i}') for i in range(3)]
+
+    def get_summary(self, product):
+        summary = ProductRating.objects.filter(product=product).values(
+            'review_count', 'rating_sum', 'average', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5'
+        ).first()
+        return summary and {name: summary[name] for name in summary}
+
+    def assertMatchesBackfill(self):
+        live = {product.pk: self.get_summary(product) for product in (self.product, self.other)}
+        ratings.backfill_product_ratings()
+        rebuilt = {product.pk: self.get_summary(product) for product in (self.product, self.other)}
+        self.assertEqual(live, rebuilt)
+
+    def test_summary_follows_review_changes(self):
+        first = Review.objects.create(product=self.product, user=self.users[0], rating=5, comment='')
+        Review.objects.create(product=self.product, user=self.users[1], rating=2, comment='')
+        summary = self.get_summary(self.product)
+        self.assertEqual((summary['review_count'], summary['average'], summary['stars_5']), (2, 3.5, 1))
+        self.assertMatchesBackfill()
+
+        first.rating = 4
+        first.save()
+        self.assertEqual(self.get_summary(self.product)['average'], 3.0)
+        self.assertMatchesBackfill()
+
+        # Una reseña que cambia de producto se descuenta del anterior
+        first = Review.objects.get(pk=first.pk)
+        first.product = self.other
+        first.save(update_fields=['product'])
+        self.assertEqual(self.get_summary(self.product)['review_count'], 1)
+        self.assertEqual(self.get_summary(self.other)['review_count'], 1)
+        self.assertMatchesBackfill()
+
+        first.delete()
+        self.assertEqual(self.get_summary(self.other)['review_count'], 0)
+        self.assertEqual(self.get_summary(self.other)['average'], 0)
+
+
+class StockTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='cliente')
+        category = Category.objects.create(name='Galletas', slug='galletas')
+        cls.product = create_product(category, 'Galleta avena', stock=5)
+        cls.other = create_product(category, 'Galleta chocolate', stock=10)
+
+    def get_stock(self, product):
+        return Product.objects.values_list('stock', flat=True).get(pk=product.pk)
+
+    def get_movements(self, order):
+        return list(
+            ProductStock.objects.filter(reference=order.order_number)
+            .order_by('id').values_list('product_id', 'movement_type', 'quantity')
+        )
+
+    def test_reserve_and_restore_follow_the_order_status(self):
+        order = create_order(self.user, [(self.product, 2), (self.other, 3)])
+
+        stock.reserve_stock_for_order(order)
+        self.assertEqual((self.get_stock(self.product), self.get_stock(self.other)), (3, 7))
+
+        order.status = 'cancelled'
+        order.save()
+        self.assertEqual((self.get_stock(self.product), self.get_stock(self.other)), (5, 10))
+
+        order.status = 'pending'
+        order.save()
+        self.assertEqual((self.get_stock(self.product), self.get_stock(self.other)), (3, 7))
+        self.assertEqual(self.get_movements(order), [
+            (self.product.pk, 'sale', -2), (self.other.pk, 'sale', -3),
+            (self.product.pk, 'return', 2), (self.other.pk, 'return', 3),
+            (self.product.pk, 'sale', -2), (self.other.pk, 'sale', -3),
+        ])
+
+    def test_orders_are_reserved_in_turn_until_stock_runs_out(self):
+        orders = [create_order(self.user, [(self.product, 2)]) for _ in range(3)]
+
+        with self.assertNumQueries(6):
+            # Cantidades, bloqueo de productos, un UPDATE y los movimientos (más el savepoint)
+            stock.apply_orders_stock(orders, stock.RESERVE)
+
+        self.assertEqual(self.get_stock(self.product), 1)
+        self.assertEqual(self.get_movements(orders[1]), [(self.product.pk, 'sale', -2)])
+        # El tercer pedido no alcanza: se registra una alerta y no se descuenta
+        self.assertEqual(self.get_movements(orders[2]), [(self.product.pk, 'adjustment', 0)])
+
+    def test_does_not_oversell_when_stock_changed_after_the_read(self):
+        order = create_order(self.user, [(self.product, 4)])
+        stale = list(Product.objects.filter(pk=self.product.pk))
+        # Otro proceso vendió entre la lectura y el UPDATE (SQLite no bloquea filas)
+        Product.objects.filter(pk=self.product.pk).update(stock=1)
+
+        with mock.patch.object(stock.Product.objects, 'select_for_update') as select_for_update:
+            select_for_update.return_value.filter.return_value.order_by.return_value = stale
+            stock.reserve_stock_for_order(order)
+
+        self.assertEqual(self.get_stock(self.product), 1)
+        self.assertEqual(self.get_movements(order), [(self.product.pk, 'adjustment', 0)])
+
+
+@override_settings(CATALOG_CACHE_ENABLED=True)
+class CatalogCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Galletas', slug='galletas')
+        cls.product = create_product(cls.category, 'Galleta avena', stock=5)
+        cls.other = create_product(cls.category, 'Galleta chocolate')
+        cls.user = User.objects.create(username='cliente')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.detail_url = reverse('shop:product_detail', args=[self.product.slug])
+        self.other_url = reverse('shop:product_detail', args=[self.other.slug])
+        self.list_url = reverse('shop:product_list')
+
+    def get_cache_status(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.get('X-Catalog-Cache')
+
+    def warm_up(self, *urls):
+        for url in urls:
+            self.assertEqual(self.get_cache_status(url), 'MISS')
+            self.assertEqual(self.get_cache_status(url), 'HIT')
+
+    def test_cached_page_fills_session_holes(self):
+        self.warm_up(self.detail_url)
+
+        response = self.client.get(self.detail_url)
+
+        for hole in catalog_cache.HOLES.values():
+            self.assertNotContains(response, hole)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+    def test_authenticated_users_are_not_cached(self):
+        self.client.force_login(self.user)
+
+        self.assertIsNone(self.get_cache_status(self.detail_url))
+        self.assertIsNone(self.get_cache_status(self.detail_url))
+
+    def test_product_change_invalidates_its_page_and_listings(self):
+        self.warm_up(self.detail_url, self.other_url, self.list_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('1200')
+            self.product.save()
+
+        self.assertEqual(self.get_cache_status(self.detail_url), 'MISS')
+        self.assertEqual(self.get_cache_status(self.list_url), 'MISS')
+        self.assertEqual(self.get_cache_status(self.other_url), 'HIT')
+
+    def test_slug_change_invalidates_the_previous_page(self):
+        versions = catalog_cache.get_versions([catalog_cache.product_tag(self.product.slug)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.slug = 'galleta-de-avena'
+            self.product.save()
+
+        self.assertNotEqual(catalog_cache.get_versions([catalog_cache.product_tag('galleta-avena')]), versions)
+
+    def test_stock_change_invalidates_the_product_page(self):
+        self.warm_up(self.detail_url, self.other_url)
+        order = create_order(self.user, [(self.product, 2)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.reserve_stock_for_order(order)
+
+        self.assertEqual(self.get_cache_status(self.detail_url), 'MISS')
+        self.assertEqual(self.get_cache_status(self.other_url), 'HIT')
+
+    def test_category_change_invalidates_every_page(self):
+        self.warm_up(self.detail_url, self.other_url, self.list_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Galletas artesanales'
+            self.category.save()
+
+        for url in (self.detail_url, self.other_url, self.list_url):
+            with self.subTest(url=url):
+                self.assertEqual(self.get_cache_status(url), 'MISS')
+
+    def test_invalidation_waits_for_the_commit(self):
+        self.warm_up(self.detail_url)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.price = Decimal('1200')
+            self.product.save()
+            self.assertEqual(self.get_cache_status(self.detail_url), 'HIT')
+
+        self.assertTrue(callbacks)
@@ -1,59 +1,68 @@
 from django.shortcuts import render, get_object_or_404
 from django.views.generic import ListView, DetailView
-from django.db.models import Q
-from .models import Product, Category
+from django.db.models import F, Q
+from .models import Product, Category, RelatedProduct
+from . import catalog_cache, search
+from .catalog_cache import CatalogCacheMixin
 
 
-class HomeView(ListView):
+class HomeView(CatalogCacheMixin, ListView):
     """Vista principal del sitio"""
     model = Product
     template_name = 'shop/home.html'
     context_object_name = 'featured_products'
     
     def get_queryset(self):
-        return Product.objects.filter(featured=True, available=True)[:6]
+        return Product.objects.filter(featured=True, available=True).select_related('rating_summary')[:6]
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['bestsellers'] = Product.objects.filter(
             product_type='bestseller', available=True
-        )[:4]
+        ).select_related('rating_summary')[:4]
         context['categories'] = Category.objects.all()[:4]
         return context
 
 
-class ProductListView(ListView):
+class ProductListView(CatalogCacheMixin, ListView):
     """Vista para listar productos"""
     model = Product
     template_name = 'shop/product_list.html'
     context_object_name = 'products'
     paginate_by = 12
+    cache_query_params = ('category', 'sort', 'page')
+    bypass_query_params = ('search', 'q')
     
     def get_queryset(self):
-        queryset = Product.objects.filter(available=True)
+        queryset = Product.objects.filter(available=True).select_related('category', 'rating_summary')
         
         # Filtro por categoría
         category = self.request.GET.get('category')
         if category:
             queryset = queryset.filter(product_type=category)
         
-        # Filtro por búsqueda
-        search = self.request.GET.get('search') or self.request.GET.get('q')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search) |
-                Q(ingredients__icontains=search)
-            )
+        # Filtro por búsqueda (índice de búsqueda; sin orden explícito se ordena por relevancia)
+        query = self.request.GET.get('search') or self.request.GET.get('q')
+        sort = self.request.GET.get('sort')
+        if query:
+            queryset = search.search_products(queryset, query, ranked=not sort)
+            if not sort:
+                return queryset
         
         # Ordenamiento
-        sort = self.request.GET.get('sort', '-created_at')
+        sort = sort or '-created_at'
         if sort == 'price_low':
             queryset = queryset.order_by('price')
         elif sort == 'price_high':
             queryset = queryset.order_by('-price')
         elif sort == 'name':
             queryset = queryset.order_by('name')
+        elif sort == 'rating':
+            queryset = queryset.order_by(
+                F('rating_summary__average').desc(nulls_last=True),
+                F('rating_summary__review_count').desc(nulls_last=True),
+                '-created_at'
+            )
         else:
             queryset = queryset.order_by('-created_at')
         
@@ -68,79 +77,64 @@ class ProductListView(ListView):
         return context
 
 
-class ProductDetailView(DetailView):
+class ProductDetailView(CatalogCacheMixin, DetailView):
     """Vista de detalle del producto"""
     model = Product
     template_name = 'shop/product_detail.html'
     context_object_name = 'product'
     
+    def get_cache_tags(self):
+        return [
+            catalog_cache.CATALOG_TAG,
+            catalog_cache.CATEGORIES_TAG,
+            catalog_cache.product_tag(self.kwargs['slug']),
+        ]
+    
+    def get_queryset(self):
+        return super().get_queryset().select_related('category', 'rating_summary')
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        product = self.get_object()
-        
-        # Productos relacionados por categoría
-        related_by_category = Product.objects.filter(
-            category=product.category, available=True
-        ).exclude(id=product.id)[:4]
-        
-        # Productos similares por ingredientes (si el producto actual no llena los 4 espacios)
-        similar_by_ingredients = Product.objects.none()
-        if len(related_by_category) < 4 and product.ingredients:
-            # Obtener palabras clave de los ingredientes
-            ingredient_words = product.ingredients.lower().split()
-            ingredient_queries = Q()
-            
-            for word in ingredient_words:
-                if len(word) > 3:  # Solo palabras significativas
-                    ingredient_queries |= Q(ingredients__icontains=word)
-            
-            similar_by_ingredients = Product.objects.filter(
-                ingredient_queries, available=True
-            ).exclude(
-                id=product.id
-            ).exclude(
-                id__in=related_by_category.values_list('id', flat=True)
-            )[:4-len(related_by_category)]
-        
-        # Combinar productos relacionados y similares
-        context['related_products'] = list(related_by_category) + list(similar_by_ingredients)
-        
-        # Productos alternativos (de otras categorías pero con características similares)
+        product = self.object
+        
+        # Productos relacionados precalculados (ver shop.related): una sola consulta
+        context['related_products'] = [
+            entry.related for entry in RelatedProduct.objects.filter(
+                product=product, related__available=True
+            ).select_related('related')[:4]
+        ]
+        
+        # Si el índice aún no tiene al producto, completar con su categoría
         if len(context['related_products']) < 4:
-            alternative_products = Product.objects.filter(
-                available=True
-            ).exclude(
-                id=product.id
-            ).exclude(
-                id__in=[p.id for p in context['related_products']]
-            ).order_by('?')[:4-len(context['related_products'])]
-            
-            context['related_products'].extend(list(alternative_products))
-        
-        # Reviews del producto
-        context['reviews'] = product.reviews.all()[:5]
-        context['reviews_count'] = product.reviews.count()
-        
-        # Promedio de rating
-        if context['reviews_count'] > 0:
-            total_rating = sum(review.rating for review in product.reviews.all())
-            context['average_rating'] = total_rating / context['reviews_count']
-        else:
-            context['average_rating'] = 0
+            context['related_products'].extend(
+                Product.objects.filter(
+                    category_id=product.category_id, available=True
+                ).exclude(
+                    id__in=[product.id] + [p.id for p in context['related_products']]
+                )[:4-len(context['related_products'])]
+            )
+        
+        # Reviews del producto (cantidad y promedio desde el resumen precalculado)
+        rating_summary = getattr(product, 'rating_summary', None)
+        context['rating_summary'] = rating_summary
+        context['reviews_count'] = rating_summary.review_count if rating_summary else 0
+        context['average_rating'] = rating_summary.average if rating_summary else 0
+        context['reviews'] = product.reviews.select_related('user')[:5] if context['reviews_count'] else []
         
         return context
 
 
-class CategoryDetailView(ListView):
+class CategoryDetailView(CatalogCacheMixin, ListView):
     """Vista de detalle de categoría"""
     model = Product
     template_name = 'shop/product_list.html'
     context_object_name = 'products'
     paginate_by = 12
+    cache_query_params = ('page',)
     
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        return Product.objects.filter(category=self.category, available=True)
+        return Product.objects.filter(category=self.category, available=True).select_related('category', 'rating_summary')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -159,13 +153,10 @@ class SearchView(ListView):
     def get_queryset(self):
         query = self.request.GET.get('q', '')
         if query:
-            # Búsqueda principal
-            return Product.objects.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(ingredients__icontains=query),
-                available=True
-            ).order_by('-created_at')
+            # Búsqueda principal (ordenada por relevancia)
+            return search.search_products(
+                Product.objects.filter(available=True).select_related('rating_summary'), query
+            )
         return Product.objects.none()
     
     def get_similar_products(self, query, exclude_ids=None):
@@ -173,14 +164,19 @@ class SearchView(ListView):
         if not query:
             return Product.objects.none()
         
-        # Palabras clave de la búsqueda
-        query_words = query.lower().split()
-        
         similar_products = Product.objects.filter(available=True)
         
         if exclude_ids:
             similar_products = similar_products.exclude(id__in=exclude_ids)
         
+        # Cualquiera de las palabras en el índice (incluye categoría e ingredientes)
+        product_ids = search.search_product_ids(query, any_term=True)
+        if product_ids is not None:
+            return search.order_by_ids(similar_products.filter(id__in=product_ids), product_ids)[:8]
+        
+        # Palabras clave de la búsqueda
+        query_words = query.lower().split()
+        
         # Buscar por categorías que contengan las palabras de búsqueda
         category_matches = Q()
         for word in query_words:
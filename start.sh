@@ -35,6 +35,17 @@ python manage.py collectstatic --noinput
 echo "🔍 Verificando configuración..."
 python manage.py check --deploy
 
+# Worker de la cola de notificaciones (NOTIFICATION_DISPATCH_MODE='queue'):
+# se reinicia si termina
+echo "📨 Iniciando worker de notificaciones..."
+(
+    while true; do
+        python manage.py process_notifications --loop
+        echo "⚠️ El worker de notificaciones terminó; reiniciando en 5s..."
+        sleep 5
+    done
+) &
+
 echo "✅ Configuración completada. Iniciando servidor..."
 
 # Iniciar servidor con Gunicorn